@@ -1,3 +1,7 @@
+from contextlib import contextmanager
+
+from src.core.beta import BetaModel, SimulatedReturnProvider, set_beta_model
+from src.core.trace import ConsoleRenderer, tracer
 from src.entity.strategy import CashInfo, StrategyTree, VirtualAccount
 
 
@@ -377,6 +381,30 @@ def get_strategy_allocations():
     }
 
 
+def print_unfilled_orders(unfilled_report):
+    """打印高级调仓的未成交订单"""
+    if not unfilled_report or not unfilled_report.orders:
+        return
+
+    print(f"\n未成交订单 ({len(unfilled_report.orders)}个):")
+    for order in unfilled_report.orders:
+        action = "未买入" if order.direction == "BUY" else "未卖出"
+        print(
+            f"  {order.strategy_name} {order.stock_code} {action}: "
+            f"{order.unfilled_shares:,.0f}股"
+        )
+
+
+@contextmanager
+def console_trace():
+    """模拟期间把追踪记录输出到控制台，结束后移除"""
+    sink = tracer.add_sink(ConsoleRenderer())
+    try:
+        yield sink
+    finally:
+        tracer.remove_sink(sink)
+
+
 def simulate_advanced_fund_operations():
     """模拟高级基金运作过程"""
 
@@ -459,7 +487,7 @@ def simulate_advanced_fund_operations():
     # 创建交易系统（80%成交率，0.1%滑点）
     trading_system = TradingSystem(execution_rate=0.8, slippage_rate=0.001)
 
-    fund.advanced_rebalance(market_signals, trading_system)
+    print_unfilled_orders(fund.advanced_rebalance(market_signals, trading_system))
 
     print("\n高级调仓后账户状态:")
     fund.print_account_details()
@@ -598,11 +626,15 @@ def test_weight_validation():
 
 
 if __name__ == "__main__":
+    # 演示使用模拟收益估计多合约对冲的 beta
+    set_beta_model(BetaModel(SimulatedReturnProvider()))
+
     print("🎯 高级策略树模拟系统")
     print("=" * 80)
 
-    # 运行模拟
-    simulate_advanced_fund_operations()
+    # 运行模拟，控制台显示各步骤的过程信息
+    with console_trace():
+        simulate_advanced_fund_operations()
 
     # 验证权重
     test_weight_validation()
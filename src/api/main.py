@@ -24,13 +24,13 @@ async def lifespan(app: FastAPI):
     使用context manager模式管理启动和关闭事件
     """
     # 启动时执行
-    from src.database.client import init_db  # noqa: PLC0415
+    from src.database.client import close_db, init_db  # noqa: PLC0415
 
     await init_db()
     yield
 
     # 关闭时执行
-    # 可以在这里添加清理逻辑，如关闭数据库连接等
+    await close_db()
 
 
 def create_app() -> FastAPI:
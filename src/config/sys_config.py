@@ -29,6 +29,56 @@ class SysConfig:
         """MySQL数据库连接URL"""
         return self._dyn_config.get("mysql_url", "")
 
+    @property
+    def mongo_url(self) -> str:
+        """MongoDB连接URL"""
+        return self._dyn_config.get("mongo_url", "mongodb://localhost:27017")
+
+    @property
+    def mongo_database(self) -> str:
+        """MongoDB数据库名"""
+        return self._dyn_config.get("mongo_database", "hbc_test")
+
+    @property
+    def mongo_max_pool_size(self) -> int:
+        """每个进程的最大连接数"""
+        return int(self._dyn_config.get("mongo_max_pool_size", 100))
+
+    @property
+    def mongo_min_pool_size(self) -> int:
+        """连接池保持的最小连接数，避免流量突增时临时建连"""
+        return int(self._dyn_config.get("mongo_min_pool_size", 10))
+
+    @property
+    def mongo_max_idle_time_ms(self) -> int:
+        """空闲连接回收时间（毫秒）"""
+        return int(self._dyn_config.get("mongo_max_idle_time_ms", 300_000))
+
+    @property
+    def mongo_connect_timeout_ms(self) -> int:
+        """建立连接超时（毫秒）"""
+        return int(self._dyn_config.get("mongo_connect_timeout_ms", 5_000))
+
+    @property
+    def mongo_server_selection_timeout_ms(self) -> int:
+        """选择可用节点超时（毫秒）"""
+        return int(self._dyn_config.get("mongo_server_selection_timeout_ms", 5_000))
+
+    @property
+    def mongo_socket_timeout_ms(self) -> int:
+        """单次读写超时（毫秒），0 表示不限制"""
+        return int(self._dyn_config.get("mongo_socket_timeout_ms", 30_000))
+
+    @property
+    def mongo_wait_queue_timeout_ms(self) -> int:
+        """连接池耗尽时等待空闲连接的超时（毫秒）"""
+        return int(self._dyn_config.get("mongo_wait_queue_timeout_ms", 10_000))
+
+    @property
+    def mongo_compressors(self) -> str:
+        """网络压缩算法，逗号分隔，按优先级排列"""
+        return self._dyn_config.get("mongo_compressors", "zlib")
+
 
 # 创建全局配置单例
 sys_config = SysConfig()
@@ -0,0 +1,151 @@
+"""
+产品层订单净额汇总（TradeOrder / TradeAllocation 流程）
+
+叶子节点的交易单在产品节点按股票净额合并为一个母单，买卖相抵的部分在内部对冲，
+只有净额部分移交外部交易系统。分配表按行记录 (股票行, 叶子下标, 带符号股数)，
+与输入的叶子订单一一对应，母单成交后据此把成交拆回各叶子。
+"""
+
+import numpy as np
+from pydantic import BaseModel, ConfigDict, Field
+
+from src.entity.trade import TradeDirection, TradeOrder
+
+# 净额小于该值视为完全对冲
+NET_SHARES_EPSILON = 1e-9
+
+
+class OrderAggregation(BaseModel):
+    """净额汇总结果"""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    codes: list[str] = Field(description="参与汇总的股票代码")
+    prices: np.ndarray = Field(description="各股票的订单均价")
+    buy_shares: np.ndarray = Field(description="各股票叶子买入总股数")
+    sell_shares: np.ndarray = Field(description="各股票叶子卖出总股数")
+    parent_orders: list[TradeOrder] = Field(description="产品层母单，只包含净额不为0的股票")
+    parent_rows: np.ndarray = Field(description="各股票对应的母单下标，无母单为-1")
+    # 分配表，与输入的叶子订单逐行对应
+    alloc_symbol: np.ndarray = Field(description="分配行对应的股票行")
+    alloc_leaf: np.ndarray = Field(description="分配行对应的叶子下标")
+    alloc_shares: np.ndarray = Field(description="带符号的叶子股数，买入为正")
+
+    @property
+    def net_shares(self) -> np.ndarray:
+        return self.buy_shares - self.sell_shares
+
+    @property
+    def crossed_shares(self) -> np.ndarray:
+        """各股票内部对冲股数"""
+        return np.minimum(self.buy_shares, self.sell_shares)
+
+    def split_fills(self) -> tuple[np.ndarray, np.ndarray]:
+        """
+        把母单成交拆回分配行
+        内部对冲部分按订单均价成交，外部成交按母单成交均价；同方向的叶子按股数等比例分摊
+        返回 (各行成交股数, 各行成交金额)，均为非负
+        """
+        size = len(self.codes)
+        external_shares = np.zeros(size)
+        external_value = np.zeros(size)
+        has_parent = self.parent_rows >= 0
+        for symbol in np.flatnonzero(has_parent).tolist():
+            parent = self.parent_orders[self.parent_rows[symbol]]
+            external_shares[symbol] = parent.executed_shares
+            external_value[symbol] = parent.executed_value
+
+        crossed = self.crossed_shares
+        net = self.net_shares
+        buy_filled = crossed + np.where(net > 0, external_shares, 0.0)
+        sell_filled = crossed + np.where(net < 0, external_shares, 0.0)
+        buy_value = crossed * self.prices + np.where(net > 0, external_value, 0.0)
+        sell_value = crossed * self.prices + np.where(net < 0, external_value, 0.0)
+
+        is_buy = self.alloc_shares > 0
+        symbol = self.alloc_symbol
+        side_total = np.where(is_buy, self.buy_shares[symbol], self.sell_shares[symbol])
+        ratio = np.divide(
+            np.abs(self.alloc_shares),
+            side_total,
+            out=np.zeros_like(side_total),
+            where=side_total > 0,
+        )
+        filled_shares = ratio * np.where(is_buy, buy_filled[symbol], sell_filled[symbol])
+        filled_value = ratio * np.where(is_buy, buy_value[symbol], sell_value[symbol])
+        return filled_shares, filled_value
+
+
+def aggregate_orders(
+    orders: list[TradeOrder], leaf_names: list[str], product_name: str
+) -> OrderAggregation:
+    """
+    按股票净额汇总叶子订单
+    orders: 叶子节点交易单，strategy_name 必须在 leaf_names 中
+    leaf_names: 叶子节点名称，下标即分配表中的叶子下标
+    product_name: 母单的 strategy_name
+    """
+    leaf_rows = {name: row for row, name in enumerate(leaf_names)}
+    symbol_rows: dict[str, int] = {}
+    size = len(orders)
+    alloc_symbol = np.empty(size, dtype=np.int64)
+    alloc_leaf = np.empty(size, dtype=np.int64)
+    alloc_shares = np.empty(size)
+    order_prices = np.empty(size)
+    priorities: dict[int, int] = {}
+
+    for i, order in enumerate(orders):
+        symbol = symbol_rows.setdefault(order.stock_code, len(symbol_rows))
+        alloc_symbol[i] = symbol
+        alloc_leaf[i] = leaf_rows[order.strategy_name]
+        shares = order.remaining_shares
+        alloc_shares[i] = shares if order.direction == TradeDirection.BUY else -shares
+        order_prices[i] = order.price
+        priorities[symbol] = min(priorities.get(symbol, order.priority), order.priority)
+
+    symbol_count = len(symbol_rows)
+    buy_shares = np.bincount(
+        alloc_symbol, weights=np.maximum(alloc_shares, 0.0), minlength=symbol_count
+    )
+    sell_shares = np.bincount(
+        alloc_symbol, weights=np.maximum(-alloc_shares, 0.0), minlength=symbol_count
+    )
+    gross_shares = buy_shares + sell_shares
+    gross_value = np.bincount(
+        alloc_symbol, weights=np.abs(alloc_shares) * order_prices, minlength=symbol_count
+    )
+    prices = np.divide(
+        gross_value, gross_shares, out=np.zeros(symbol_count), where=gross_shares > 0
+    )
+
+    codes = list(symbol_rows)
+    net_shares = buy_shares - sell_shares
+    parent_rows = np.full(symbol_count, -1, dtype=np.int64)
+    parent_orders: list[TradeOrder] = []
+    for symbol in np.flatnonzero(np.abs(net_shares) > NET_SHARES_EPSILON).tolist():
+        net = float(net_shares[symbol])
+        price = float(prices[symbol])
+        parent_rows[symbol] = len(parent_orders)
+        parent_orders.append(
+            TradeOrder(
+                strategy_name=product_name,
+                stock_code=codes[symbol],
+                direction=TradeDirection.BUY if net > 0 else TradeDirection.SELL,
+                target_shares=abs(net),
+                target_value=abs(net) * price,
+                price=price,
+                priority=priorities[symbol],
+            )
+        )
+
+    return OrderAggregation(
+        codes=codes,
+        prices=prices,
+        buy_shares=buy_shares,
+        sell_shares=sell_shares,
+        parent_orders=parent_orders,
+        parent_rows=parent_rows,
+        alloc_symbol=alloc_symbol,
+        alloc_leaf=alloc_leaf,
+        alloc_shares=alloc_shares,
+    )
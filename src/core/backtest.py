@@ -0,0 +1,368 @@
+"""
+逐日回测
+
+BacktestEngine 按交易日历逐日推进策略树：
+1. 待申购金额转为叶子可用现金
+2. 每个股票叶子按 strategy_info["model"] 读取当天 alpha，取 alpha 最高的 top_n 只等权作为目标权重
+3. 叶子以（股票市值 + 可用现金）为权益，一次算出 目标股数 - 当前股数 的调仓数组批量成交
+4. 期货合约按当天收盘时刻刷新价格，空头逐日结算盈亏，再按对冲求解器统一调整
+5. 整树估值，记录各节点净值（含期货保证金）
+持仓使用列式持仓簿，估值使用 ValuationEngine；当天价格只取一次，缓存后供调仓、对冲、估值共用。
+设置 checkpoint_path 后定期把策略树和净值历史写入 JSON，run 时从检查点的下一个交易日续跑。
+"""
+
+import json
+from abc import ABC, abstractmethod
+from collections.abc import Sequence
+from datetime import date
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import numpy as np
+from pydantic import BaseModel, ConfigDict, Field
+
+from src.entity.position import symbol_index
+
+from .futures import get_futures_registry
+from .hedging import HedgeSolver
+from .price import CachedPriceProvider, PriceProvider, QuoteCache, get_price_provider
+from .trace import tracer
+from .trading_calendar import TradingCalendar, get_trading_calendar
+from .valuation import ValuationEngine
+
+if TYPE_CHECKING:
+    from src.entity.strategy import StrategyTree, TradingSystem
+
+CLOSE_TIME = "15:00:00"
+
+
+class AlphaSource(ABC):
+    """alpha 来源接口"""
+
+    @abstractmethod
+    def get_alpha(self, model: str, trade_date: str) -> tuple[list[str], np.ndarray]:
+        """某模型某交易日的 alpha，返回 (股票代码, alpha 数组)；没有数据时返回空"""
+
+
+class ProxyAlphaSource(AlphaSource):
+    """
+    通过 src.proxy.alpha.get_alpha 读取 alpha 表
+    alpha_time: alpha 分区时间；code_column/value_column: 表中的代码列和 alpha 列
+    """
+
+    def __init__(
+        self,
+        alpha_time: str = "14:30",
+        code_column: str = "code",
+        value_column: str = "alpha",
+        intraday: bool = False,
+    ) -> None:
+        self.alpha_time = alpha_time
+        self.code_column = code_column
+        self.value_column = value_column
+        self.intraday = intraday
+
+    def get_alpha(self, model: str, trade_date: str) -> tuple[list[str], np.ndarray]:
+        from src.proxy.alpha import get_alpha  # noqa: PLC0415
+
+        frame = get_alpha(
+            model,
+            self.alpha_time,
+            date=date.fromisoformat(trade_date),
+            intraday=self.intraday,
+        )
+        if frame is None or len(frame) == 0:
+            return [], np.empty(0)
+        return (
+            frame[self.code_column].astype(str).tolist(),
+            frame[self.value_column].to_numpy(dtype=np.float64),
+        )
+
+
+class ParquetAlphaSource(AlphaSource):
+    """
+    本地 alpha 回放
+    文件为 parquet 或 csv，包含 model, trade_date, code, alpha 四列，代码列名可由 code_column 指定
+    """
+
+    def __init__(self, path: str | Path, code_column: str = "code") -> None:
+        import polars as pl  # noqa: PLC0415
+
+        path = Path(path)
+        frame = pl.read_parquet(path) if path.suffix == ".parquet" else pl.read_csv(path)
+        frame = frame.select(
+            pl.col("model").cast(pl.Utf8),
+            pl.col("trade_date").cast(pl.Utf8).str.slice(0, 10),
+            pl.col(code_column).cast(pl.Utf8).alias("code"),
+            pl.col("alpha").cast(pl.Float64),
+        )
+        self._alpha: dict[tuple[str, str], tuple[list[str], np.ndarray]] = {}
+        for (model, trade_date), group in frame.group_by(
+            ["model", "trade_date"], maintain_order=True
+        ):
+            self._alpha[(model, trade_date)] = (group["code"].to_list(), group["alpha"].to_numpy())
+
+    def get_alpha(self, model: str, trade_date: str) -> tuple[list[str], np.ndarray]:
+        return self._alpha.get((model, trade_date), ([], np.empty(0)))
+
+
+def top_alpha_weights(
+    codes: Sequence[str], alpha: np.ndarray, top_n: int
+) -> tuple[list[str], np.ndarray]:
+    """alpha 为正且最高的 top_n 只股票等权，返回 (股票代码, 权重)"""
+    alpha = np.asarray(alpha, dtype=np.float64)
+    candidates = np.flatnonzero(np.isfinite(alpha) & (alpha > 0))
+    if len(candidates) > top_n:
+        candidates = candidates[np.argpartition(-alpha[candidates], top_n - 1)[:top_n]]
+    if not len(candidates):
+        return [], np.empty(0)
+    return [codes[i] for i in candidates.tolist()], np.full(len(candidates), 1.0 / len(candidates))
+
+
+class DailyPriceProvider(PriceProvider):
+    """回测当天的价格：未指定时间的取价固定到当天收盘时刻，同一天内报价缓存复用"""
+
+    def __init__(self, source: PriceProvider) -> None:
+        self.source = CachedPriceProvider(source, QuoteCache(ttl=float("inf")))
+        self.timestamp: str | None = None
+
+    def set_timestamp(self, timestamp: str) -> None:
+        """切换到新的报价时刻，并丢弃之前的缓存"""
+        self.timestamp = timestamp
+        self.source.cache.clear()
+
+    def get_prices(self, codes: Sequence[str], timestamp: str | None = None) -> np.ndarray:
+        return self.source.get_prices(codes, timestamp or self.timestamp)
+
+
+class BacktestResult(BaseModel):
+    """回测净值，矩阵行为交易日、列为先序节点"""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    dates: list[str] = Field(description="交易日")
+    node_names: list[str] = Field(description="节点名称，先序排列，第一个为根节点")
+    node_values: np.ndarray = Field(description="交易日 × 节点 的总资产（含期货保证金）")
+    turnover: np.ndarray = Field(description="每个交易日股票成交金额")
+
+    @property
+    def nav(self) -> np.ndarray:
+        """根节点总资产"""
+        return self.node_values[:, 0]
+
+    @property
+    def returns(self) -> np.ndarray:
+        """根节点日收益率"""
+        nav = self.nav
+        return nav[1:] / nav[:-1] - 1 if len(nav) > 1 else np.empty(0)
+
+
+class BacktestEngine:
+    """
+    逐日回测引擎
+    top_n: 每个叶子持有的股票数
+    trading_system: 设置后按其成交模型撮合调仓，否则按收盘价全部成交
+    hedge: 是否每天调整期货对冲；solver 的 trade_date 会被设为当天
+    min_trade_value: 小于该金额的调仓忽略
+    checkpoint_every: 每隔多少个交易日写一次检查点，结束时总会写一次
+    """
+
+    def __init__(  # noqa: PLR0913
+        self,
+        tree: "StrategyTree",
+        alpha_source: AlphaSource,
+        price_provider: PriceProvider | None = None,
+        calendar: TradingCalendar | None = None,
+        *,
+        top_n: int = 50,
+        trading_system: "TradingSystem | None" = None,
+        hedge: bool = True,
+        solver: HedgeSolver | None = None,
+        close_time: str = CLOSE_TIME,
+        min_trade_value: float = 1.0,
+        checkpoint_path: str | Path | None = None,
+        checkpoint_every: int = 20,
+    ) -> None:
+        if top_n <= 0:
+            raise ValueError(f"持股数必须为正: {top_n}")
+        self.alpha_source = alpha_source
+        self.prices = DailyPriceProvider(price_provider or get_price_provider())
+        self.calendar = calendar or get_trading_calendar()
+        self.top_n = top_n
+        self.trading_system = trading_system
+        self.hedge = hedge
+        self.solver = solver or HedgeSolver()
+        self.close_time = close_time
+        self.min_trade_value = min_trade_value
+        self.checkpoint_path = Path(checkpoint_path) if checkpoint_path is not None else None
+        self.checkpoint_every = checkpoint_every
+
+        self.dates: list[str] = []
+        self._node_values: list[np.ndarray] = []
+        self._turnover: list[float] = []
+        self._attach(tree)
+
+    def _attach(self, tree: "StrategyTree") -> None:
+        """接管策略树：切换为列式持仓，价格来源改为回测当天价格"""
+        self.tree = tree.use_compact_positions().use_price_provider(self.prices)
+        self.valuation = ValuationEngine(self.tree)
+        nodes = self.valuation.nodes
+        self.stock_leaves = [
+            node
+            for node in nodes
+            if not node.children
+            and not node._is_futures_strategy()
+            and node.strategy_info.get("model")
+        ]
+
+    # ---------------------------------------------------------------- 运行
+    def run(self, start: str, end: str, resume: bool = True) -> BacktestResult:
+        """
+        回测 [start, end] 内的交易日
+        resume: 检查点存在时从其最后一个交易日之后续跑
+        """
+        if resume and self.checkpoint_path is not None and self.checkpoint_path.exists():
+            self.load_checkpoint(self.checkpoint_path)
+
+        days = [str(day) for day in self.calendar.trading_days(start, end).tolist()]
+        if self.dates:
+            days = [day for day in days if day > self.dates[-1]]
+
+        for i, day in enumerate(days, 1):
+            self.step(day)
+            if self.checkpoint_path is not None and i % self.checkpoint_every == 0:
+                self.save_checkpoint(self.checkpoint_path)
+        if self.checkpoint_path is not None and days:
+            self.save_checkpoint(self.checkpoint_path)
+        return self.result()
+
+    def step(self, trade_date: str) -> np.ndarray:
+        """推进一个交易日，返回各节点总资产"""
+        timestamp = f"{trade_date} {self.close_time}"
+        self.prices.set_timestamp(timestamp)
+        self._mark_futures(timestamp)
+        if self.tree.virtual_account.cash_info.pending_purchase_amount > 0:
+            self.tree.build_positions_from_pending(None)
+
+        turnover = 0.0
+        for leaf in self.stock_leaves:
+            codes, alpha = self.alpha_source.get_alpha(leaf.strategy_info["model"], trade_date)
+            if not codes:
+                continue
+            target_codes, target_weights = top_alpha_weights(codes, alpha, self.top_n)
+            turnover += self._rebalance_leaf(leaf, target_codes, target_weights, trade_date)
+
+        if self.hedge:
+            self.solver.trade_date = trade_date
+            self.tree.rebalance_futures_positions(self.solver)
+
+        self.valuation.refresh_accounts()
+        valuation = self.valuation.valuate(self.prices.get_prices(self.valuation.codes))
+        values = valuation.total_value + valuation.futures_margin
+        self.dates.append(trade_date)
+        self._node_values.append(values)
+        self._turnover.append(turnover)
+        tracer.emit(
+            "backtest.day",
+            "{trade_date}: 净值 {nav:,.2f} 元，成交 {turnover:,.2f} 元",
+            trade_date=trade_date,
+            nav=float(values[0]),
+            turnover=turnover,
+        )
+        return values
+
+    def _mark_futures(self, timestamp: str) -> None:
+        """按合约行情来源刷新当天期货价格，并结算已有空头的逐日盈亏"""
+        registry = get_futures_registry()
+        registry.refresh_marks(timestamp)
+        if self.solver.registry not in (None, registry):
+            self.solver.registry.refresh_marks(timestamp)
+        self.tree.settle_futures()
+
+    def _rebalance_leaf(
+        self,
+        leaf: "StrategyTree",
+        target_codes: list[str],
+        target_weights: np.ndarray,
+        trade_date: str,
+    ) -> float:
+        """叶子调仓到目标权重，返回成交金额"""
+        account = leaf.virtual_account
+        held_codes, held = account.get_stock_arrays()
+        codes = list(dict.fromkeys([*held_codes, *target_codes]))
+        if not codes:
+            return 0.0
+
+        # 按全局股票索引对齐当前持仓和目标权重
+        ids = symbol_index.indices(codes)
+        column = np.full(len(symbol_index), -1, dtype=np.int64)
+        column[ids] = np.arange(len(codes))
+        current = np.bincount(
+            column[symbol_index.indices(held_codes)], weights=held, minlength=len(codes)
+        )
+        weights = np.zeros(len(codes))
+        weights[column[symbol_index.indices(target_codes)]] = target_weights
+        prices = self.prices.get_prices(codes)
+
+        cash = account.cash_info.available_cash
+        equity = float(current @ prices) + cash
+        target = np.divide(equity * weights, prices, out=np.zeros(len(codes)), where=prices > 0)
+        trades = target - current
+        rows = np.flatnonzero(np.abs(trades * prices) >= self.min_trade_value)
+        if not len(rows):
+            return 0.0
+
+        trade_codes = [codes[i] for i in rows.tolist()]
+        trades, prices = trades[rows], prices[rows]
+        if self.trading_system is None:
+            filled, fill_prices = trades, prices
+            cash -= float(trades @ prices)
+        else:
+            # 卖单排在前面先回笼现金
+            order = np.argsort(trades > 0, kind="stable")
+            trade_codes = [trade_codes[i] for i in order.tolist()]
+            trades, prices = trades[order], prices[order]
+            result = self.trading_system.execute_book(
+                trade_codes, trades, prices, cash, f"{trade_date} {self.close_time}"
+            )
+            filled = np.sign(trades) * result.filled_shares
+            fill_prices = result.fill_prices
+            cash = result.remaining_cash
+
+        account.apply_stock_trades(trade_codes, filled, fill_prices)
+        account.cash_info.available_cash = cash
+        leaf._account_changed()
+        return float(np.abs(filled * fill_prices).sum())
+
+    def result(self) -> BacktestResult:
+        size = len(self.valuation.nodes)
+        return BacktestResult(
+            dates=list(self.dates),
+            node_names=[node.name for node in self.valuation.nodes],
+            node_values=np.array(self._node_values).reshape(-1, size),
+            turnover=np.array(self._turnover),
+        )
+
+    # ---------------------------------------------------------------- 检查点
+    def save_checkpoint(self, path: str | Path) -> None:
+        """写入策略树和净值历史，先写临时文件再替换，中断时不会留下半个检查点"""
+        path = Path(path)
+        state = {
+            "dates": self.dates,
+            "node_values": [values.tolist() for values in self._node_values],
+            "turnover": self._turnover,
+            "tree": self.tree.model_dump(mode="json"),
+        }
+        temp = path.with_name(path.name + ".tmp")
+        temp.write_text(json.dumps(state, ensure_ascii=False), encoding="utf-8")
+        temp.replace(path)
+
+    def load_checkpoint(self, path: str | Path) -> None:
+        """从检查点恢复策略树和净值历史"""
+        from src.entity.strategy import StrategyTree  # noqa: PLC0415
+
+        state = json.loads(Path(path).read_text(encoding="utf-8"))
+        self.dates = list(state["dates"])
+        self._node_values = [np.array(values) for values in state["node_values"]]
+        self._turnover = list(state["turnover"])
+        self._attach(StrategyTree.model_validate(state["tree"]))
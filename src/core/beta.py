@@ -0,0 +1,247 @@
+"""
+股票对股指的 beta 估计
+
+收益来源 ReturnProvider 提供截至交易日的日收益矩阵（股票和指数同一接口，指数用期货代码）。
+BetaModel 用同一窗口估计股票对各指数的多元回归 beta 和指数协方差矩阵：
+    beta = Σ_sf · Σ_ff⁻¹
+同一交易日内的估计结果缓存复用，新增代码时按并集重新估计一次。
+历史不足的股票使用 fallback_beta（默认对第一个指数 beta 为 1）。
+"""
+
+import time
+import zlib
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from collections.abc import Sequence
+from pathlib import Path
+
+import numpy as np
+from pydantic import BaseModel, ConfigDict, Field
+
+DEFAULT_INDEX_CODES: tuple[str, ...] = ("IC", "IC500", "IM")
+
+# 模拟收益用的指数归属，与模拟价格表一致
+DEFAULT_STOCK_INDEX: dict[str, str] = {
+    **dict.fromkeys(
+        ["000001.SZ", "000002.SZ", "000858.SZ", "600519.SH", "600036.SH", "000066.SZ", "600276.SH"],
+        "IC",
+    ),
+    **dict.fromkeys(
+        ["002415.SZ", "002594.SZ", "300059.SZ", "300750.SZ", "002230.SZ", "300888.SZ"], "IC500"
+    ),
+    **dict.fromkeys(
+        ["688111.SH", "688599.SH", "300347.SZ", "300015.SZ", "300253.SZ", "300142.SZ"], "IM"
+    ),
+}
+
+
+class ReturnProvider(ABC):
+    """日收益来源接口"""
+
+    @abstractmethod
+    def get_returns(self, codes: Sequence[str], trade_date: str, window: int) -> np.ndarray:
+        """
+        截至 trade_date（含）最近 window 个交易日的日收益
+        返回 window × len(codes) 的矩阵，缺失为 nan
+        """
+
+
+class FileReturnProvider(ReturnProvider):
+    """
+    本地日收益文件
+    文件为 parquet 或 csv，包含 code, trade_date, ret 三列，代码列名可由 code_column 指定
+    """
+
+    def __init__(self, path: str | Path, code_column: str = "code") -> None:
+        import polars as pl  # noqa: PLC0415
+
+        path = Path(path)
+        frame = pl.read_parquet(path) if path.suffix == ".parquet" else pl.read_csv(path)
+        frame = frame.select(
+            pl.col(code_column).cast(pl.Utf8).alias("code"),
+            pl.col("trade_date").cast(pl.Utf8),
+            pl.col("ret").cast(pl.Float64),
+        )
+        self.trade_dates = sorted(set(frame["trade_date"].to_list()))
+        self.codes = sorted(set(frame["code"].to_list()))
+        date_rows = {trade_date: row for row, trade_date in enumerate(self.trade_dates)}
+        self._code_columns = {code: column for column, code in enumerate(self.codes)}
+
+        self._returns = np.full((len(self.trade_dates), len(self.codes)), np.nan)
+        rows = np.fromiter((date_rows[d] for d in frame["trade_date"]), np.int64, len(frame))
+        columns = np.fromiter((self._code_columns[c] for c in frame["code"]), np.int64, len(frame))
+        self._returns[rows, columns] = frame["ret"].to_numpy()
+
+    def get_returns(self, codes: Sequence[str], trade_date: str, window: int) -> np.ndarray:
+        end = int(np.searchsorted(self.trade_dates, trade_date, side="right"))
+        block = self._returns[max(end - window, 0) : end]
+        result = np.full((len(block), len(codes)), np.nan)
+        for i, code in enumerate(codes):
+            column = self._code_columns.get(code)
+            if column is not None:
+                result[:, i] = block[:, column]
+        return result
+
+
+class SimulatedReturnProvider(ReturnProvider):
+    """
+    模拟日收益：指数收益按固定波动率和相关系数生成，
+    股票收益 = 所属指数收益 × 载荷 + 特质收益，不在 stock_index 中的代码返回 nan
+    """
+
+    def __init__(
+        self,
+        stock_index: dict[str, str] | None = None,
+        index_codes: Sequence[str] = DEFAULT_INDEX_CODES,
+        index_vols: Sequence[float] = (0.012, 0.014, 0.016),
+        index_corr: float = 0.85,
+        idio_vol: float = 0.015,
+        seed: int = 0,
+    ) -> None:
+        self.stock_index = dict(DEFAULT_STOCK_INDEX if stock_index is None else stock_index)
+        self.index_codes = list(index_codes)
+        vols = np.asarray(index_vols, dtype=float)
+        corr = np.full((len(vols), len(vols)), index_corr)
+        np.fill_diagonal(corr, 1.0)
+        self._index_chol = np.linalg.cholesky(corr * np.outer(vols, vols))
+        self.idio_vol = idio_vol
+        self.seed = seed
+
+    def get_returns(self, codes: Sequence[str], trade_date: str, window: int) -> np.ndarray:
+        rng = np.random.default_rng([self.seed, zlib.crc32(trade_date.encode())])
+        index_returns = rng.standard_normal((window, len(self.index_codes))) @ self._index_chol.T
+        index_columns = {code: column for column, code in enumerate(self.index_codes)}
+
+        result = np.full((window, len(codes)), np.nan)
+        for i, code in enumerate(codes):
+            if code in index_columns:
+                result[:, i] = index_returns[:, index_columns[code]]
+                continue
+            index_code = self.stock_index.get(code)
+            if index_code not in index_columns:
+                continue
+            # 载荷和特质收益按代码固定种子，同一交易日结果可复现
+            code_rng = np.random.default_rng([self.seed, zlib.crc32(code.encode()), window])
+            loading = 0.8 + 0.4 * code_rng.random()
+            idio = code_rng.standard_normal(window) * self.idio_vol
+            result[:, i] = index_returns[:, index_columns[index_code]] * loading + idio
+        return result
+
+
+class BetaEstimate(BaseModel):
+    """一个交易日的 beta 估计"""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    trade_date: str = Field(description="交易日")
+    codes: list[str] = Field(description="股票代码")
+    index_codes: list[str] = Field(description="指数（期货）代码")
+    betas: np.ndarray = Field(description="股票 × 指数的 beta 矩阵")
+    factor_cov: np.ndarray = Field(description="指数日收益协方差矩阵")
+
+    def betas_for(self, codes: Sequence[str]) -> np.ndarray:
+        """按 codes 顺序取 beta 行，codes 须在本次估计内"""
+        rows = {code: row for row, code in enumerate(self.codes)}
+        return self.betas[[rows[code] for code in codes]]
+
+
+class BetaModel:
+    """
+    按交易日缓存的 beta 估计
+    provider: 日收益来源，模拟收益 SimulatedReturnProvider 只用于测试和演示
+    window: 估计窗口（交易日数）
+    min_periods: 有效收益少于该数的股票使用 fallback_beta
+    max_days: 缓存保留的交易日数
+    """
+
+    def __init__(
+        self,
+        provider: ReturnProvider,
+        index_codes: Sequence[str] = DEFAULT_INDEX_CODES,
+        window: int = 120,
+        min_periods: int = 20,
+        fallback_beta: Sequence[float] | None = None,
+        max_days: int = 5,
+    ) -> None:
+        self.provider = provider
+        self.index_codes = list(index_codes)
+        self.window = window
+        self.min_periods = min_periods
+        if fallback_beta is None:
+            fallback_beta = [1.0] + [0.0] * (len(self.index_codes) - 1)
+        self.fallback_beta = np.asarray(fallback_beta, dtype=float)
+        if self.fallback_beta.shape != (len(self.index_codes),):
+            raise ValueError(f"fallback_beta 长度须与指数数量一致: {len(self.index_codes)}")
+        self.max_days = max_days
+        self._cache: OrderedDict[str, BetaEstimate] = OrderedDict()
+
+    def estimate(self, codes: Sequence[str], trade_date: str | None = None) -> BetaEstimate:
+        """codes 的 beta 估计，同一交易日已覆盖这些代码时直接复用"""
+        if trade_date is None:
+            trade_date = time.strftime("%Y-%m-%d")
+
+        cached = self._cache.get(trade_date)
+        if cached is not None:
+            self._cache.move_to_end(trade_date)
+            known = set(cached.codes)
+            if all(code in known for code in codes):
+                return cached
+            codes = cached.codes + [code for code in dict.fromkeys(codes) if code not in known]
+
+        estimate = self._estimate(list(dict.fromkeys(codes)), trade_date)
+        self._cache[trade_date] = estimate
+        while len(self._cache) > self.max_days:
+            self._cache.popitem(last=False)
+        return estimate
+
+    def _estimate(self, codes: list[str], trade_date: str) -> BetaEstimate:
+        num_index = len(self.index_codes)
+        returns = self.provider.get_returns(self.index_codes + codes, trade_date, self.window)
+        index_returns, stock_returns = returns[:, :num_index], returns[:, num_index:]
+
+        # 只用指数收益齐全的交易日，股票缺失收益按均值填充（不贡献协方差）
+        valid_days = ~np.isnan(index_returns).any(axis=1)
+        index_returns, stock_returns = index_returns[valid_days], stock_returns[valid_days]
+        observed = ~np.isnan(stock_returns)
+        betas = np.tile(self.fallback_beta, (len(codes), 1))
+        factor_cov = np.zeros((num_index, num_index))
+
+        if len(index_returns) >= 2:  # noqa: PLR2004
+            index_demeaned = index_returns - index_returns.mean(axis=0)
+            factor_cov = index_demeaned.T @ index_demeaned / (len(index_returns) - 1)
+            counts = observed.sum(axis=0)
+            enough = counts >= self.min_periods
+            if enough.any():
+                sample = stock_returns[:, enough]
+                sample_observed = observed[:, enough]
+                means = np.nanmean(sample, axis=0)
+                demeaned = np.where(sample_observed, sample - means, 0.0)
+                cross_cov = demeaned.T @ index_demeaned / (counts[enough, None] - 1)
+                betas[enough] = np.linalg.lstsq(factor_cov, cross_cov.T, rcond=None)[0].T
+
+        return BetaEstimate(
+            trade_date=trade_date,
+            codes=codes,
+            index_codes=list(self.index_codes),
+            betas=betas,
+            factor_cov=factor_cov,
+        )
+
+
+# 全局默认 beta 模型
+_beta_model: BetaModel | None = None
+
+
+def get_beta_model() -> BetaModel:
+    """全局 beta 模型，须在启动时用 set_beta_model 配置真实收益来源"""
+    if _beta_model is None:
+        raise ValueError("未配置全局 beta 模型，请在启动时调用 set_beta_model")
+    return _beta_model
+
+
+def set_beta_model(model: BetaModel | None) -> BetaModel | None:
+    """替换全局 beta 模型，返回原来的模型便于恢复；None 表示清除配置"""
+    global _beta_model  # noqa: PLW0603
+    previous = _beta_model
+    _beta_model = model
+    return previous
@@ -0,0 +1,118 @@
+"""
+内部自成交（交叉撮合）
+
+先按 stock_code 一次遍历建立买卖队列索引，每个股票可交叉数量为
+min(买方剩余, 卖方剩余)，再按分配方式把交叉数量分给各订单，整体复杂度与订单数线性相关。
+"""
+
+from enum import Enum
+
+from pydantic import BaseModel, Field
+
+from src.entity.trade import TradeDirection, TradeOrder
+
+
+class CrossAllocationEnum(str, Enum):
+    """交叉数量在同方向订单间的分配方式"""
+
+    # 按剩余数量等比例分配
+    PRO_RATA = "PRO_RATA"
+    # 按优先级（数字小优先）、再按下单顺序依次满足
+    PRIORITY = "PRIORITY"
+
+
+class CrossReport(BaseModel):
+    """自成交结果"""
+
+    crossed_shares: dict[str, float] = Field(default_factory=dict, description="各股票交叉股数")
+    crossed_value: dict[str, float] = Field(default_factory=dict, description="各股票交叉金额")
+    crossed_orders: int = Field(default=0, description="参与交叉的订单数")
+
+    @property
+    def total_shares(self) -> float:
+        return sum(self.crossed_shares.values())
+
+    @property
+    def total_value(self) -> float:
+        return sum(self.crossed_value.values())
+
+
+def build_order_index(
+    orders: list[TradeOrder],
+) -> dict[str, tuple[list[TradeOrder], list[TradeOrder]]]:
+    """按股票代码建立 (买单队列, 卖单队列) 索引，只包含有剩余数量的订单"""
+    index: dict[str, tuple[list[TradeOrder], list[TradeOrder]]] = {}
+    for order in orders:
+        if order.remaining_shares <= 0:
+            continue
+        queues = index.get(order.stock_code)
+        if queues is None:
+            queues = index[order.stock_code] = ([], [])
+        queues[0 if order.direction == TradeDirection.BUY else 1].append(order)
+    return index
+
+
+def _average_price(orders: list[TradeOrder], total_shares: float) -> float:
+    return sum(o.price * o.remaining_shares for o in orders) / total_shares
+
+
+def _allocate(
+    orders: list[TradeOrder],
+    total_shares: float,
+    cross_shares: float,
+    cross_price: float,
+    allocation: CrossAllocationEnum,
+) -> int:
+    """把交叉数量分配到同方向订单，返回实际参与的订单数"""
+    if allocation == CrossAllocationEnum.PRO_RATA:
+        ratio = cross_shares / total_shares
+        for order in orders:
+            filled = order.remaining_shares * ratio
+            order.executed_shares += filled
+            order.executed_value += filled * cross_price
+        return len(orders)
+
+    filled_count = 0
+    remaining = cross_shares
+    for order in sorted(orders, key=lambda o: o.priority):
+        if remaining <= 0:
+            break
+        filled = min(order.remaining_shares, remaining)
+        order.executed_shares += filled
+        order.executed_value += filled * cross_price
+        remaining -= filled
+        filled_count += 1
+    return filled_count
+
+
+def cross_orders(
+    orders: list[TradeOrder],
+    allocation: CrossAllocationEnum = CrossAllocationEnum.PRIORITY,
+) -> CrossReport:
+    """
+    内部自成交：同一股票的买卖单直接对冲，成交价为买卖双方均价的中间价
+    订单的 executed_shares / executed_value 会被就地更新
+    """
+    report = CrossReport()
+
+    for stock_code, (buy_orders, sell_orders) in build_order_index(orders).items():
+        if not buy_orders or not sell_orders:
+            continue
+
+        total_buy = sum(o.remaining_shares for o in buy_orders)
+        total_sell = sum(o.remaining_shares for o in sell_orders)
+        cross_shares = min(total_buy, total_sell)
+        cross_price = (
+            _average_price(buy_orders, total_buy) + _average_price(sell_orders, total_sell)
+        ) / 2
+
+        report.crossed_orders += _allocate(
+            buy_orders, total_buy, cross_shares, cross_price, allocation
+        )
+        report.crossed_orders += _allocate(
+            sell_orders, total_sell, cross_shares, cross_price, allocation
+        )
+        report.crossed_shares[stock_code] = cross_shares
+        report.crossed_value[stock_code] = cross_shares * cross_price
+
+    return report
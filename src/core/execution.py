@@ -0,0 +1,291 @@
+"""
+成交模拟
+
+整本订单簿以数组形式一次撮合：订单为 (股票代码, 带符号股数, 价格)，买入为正。
+成交模型 FillModel 按股票汇总同一股票的订单量，给出每笔订单的可成交股数和价格冲击：
+- FixedRateFillModel: 固定成交率和滑点（原 TradingSystem 的行为）
+- VolumeParticipationFillModel: 按快照成交量的参与率限制成交量
+- SquareRootImpactFillModel: 平方根市场冲击，冲击 = 系数 × 日波动率 × √(订单量 / 成交量)
+卖单先成交回笼现金，买单按顺序受现金约束，结果以数组返回。
+"""
+
+import time
+from abc import ABC, abstractmethod
+from collections.abc import Sequence
+
+import numpy as np
+from pydantic import BaseModel, ConfigDict, Field
+
+DEFAULT_VOLUME = 1_000_000.0
+
+
+class VolumeProvider(ABC):
+    """成交量来源接口"""
+
+    @abstractmethod
+    def get_volumes(self, codes: Sequence[str], timestamp: str | None = None) -> np.ndarray:
+        """批量取成交量（股），返回与 codes 一一对应的数组"""
+
+
+class StaticVolumeProvider(VolumeProvider):
+    """固定成交量表，未知代码返回默认成交量"""
+
+    def __init__(
+        self, volumes: dict[str, float] | None = None, default_volume: float = DEFAULT_VOLUME
+    ) -> None:
+        self.volumes = dict(volumes or {})
+        self.default_volume = default_volume
+
+    def get_volumes(self, codes: Sequence[str], timestamp: str | None = None) -> np.ndarray:  # noqa: ARG002
+        lookup = self.volumes.get
+        default = self.default_volume
+        return np.fromiter((lookup(code, default) for code in codes), np.float64, len(codes))
+
+
+class SnapshotVolumeProvider(VolumeProvider):
+    """
+    通过 virgo 行情快照批量取成交量
+    代码按 batch_size 分批请求，缺失代码使用默认成交量
+    """
+
+    def __init__(
+        self,
+        batch_size: int = 1000,
+        code_column: str = "code",
+        volume_column: str = "volume",
+        default_volume: float = DEFAULT_VOLUME,
+    ) -> None:
+        self.batch_size = batch_size
+        self.code_column = code_column
+        self.volume_column = volume_column
+        self.default_volume = default_volume
+
+    def get_volumes(self, codes: Sequence[str], timestamp: str | None = None) -> np.ndarray:
+        from src.proxy.alpha import get_stock_snapshots  # noqa: PLC0415
+
+        if timestamp is None:
+            timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
+        date, snapshot_time = timestamp.split(" ")
+
+        volumes: dict[str, float] = {}
+        for start in range(0, len(codes), self.batch_size):
+            batch = list(codes[start : start + self.batch_size])
+            frame = get_stock_snapshots(batch, date=date, snapshot_time=snapshot_time)
+            volumes.update(
+                zip(
+                    frame[self.code_column].tolist(),
+                    frame[self.volume_column].tolist(),
+                    strict=True,
+                )
+            )
+
+        default = self.default_volume
+        return np.fromiter((volumes.get(code, default) for code in codes), np.float64, len(codes))
+
+
+class FillModel(ABC):
+    """成交模型"""
+
+    # 是否需要成交量
+    uses_volume: bool = False
+
+    @abstractmethod
+    def fill(
+        self,
+        codes: list[str],
+        symbols: np.ndarray,
+        shares: np.ndarray,
+        volumes: np.ndarray | None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        codes: 订单涉及的股票代码（去重）
+        symbols: 订单对应的股票下标
+        shares: 订单目标股数，非负
+        volumes: 按股票下标排列的成交量，uses_volume 为 False 时为 None
+        返回 (可成交股数, 价格冲击比例)，买入按 price × (1 + 冲击) 成交，卖出按 price × (1 - 冲击)
+        """
+
+
+class FixedRateFillModel(FillModel):
+    """固定成交率和滑点"""
+
+    def __init__(self, execution_rate: float = 0.8, slippage_rate: float = 0.001) -> None:
+        self.execution_rate = execution_rate
+        self.slippage_rate = slippage_rate
+
+    def fill(
+        self,
+        codes: list[str],  # noqa: ARG002
+        symbols: np.ndarray,  # noqa: ARG002
+        shares: np.ndarray,
+        volumes: np.ndarray | None,  # noqa: ARG002
+    ) -> tuple[np.ndarray, np.ndarray]:
+        return shares * min(self.execution_rate, 1.0), np.full(len(shares), self.slippage_rate)
+
+
+def _participation_ratio(
+    symbols: np.ndarray, shares: np.ndarray, capacity: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    """同一股票的订单按比例分享容量，返回 (各订单成交比例, 各股票订单总量)"""
+    demand = np.bincount(symbols, weights=shares, minlength=len(capacity))
+    ratio = np.divide(
+        np.minimum(demand, capacity), demand, out=np.zeros_like(demand), where=demand > 0
+    )
+    return ratio[symbols], demand
+
+
+class VolumeParticipationFillModel(FillModel):
+    """按成交量参与率限制成交，同一股票的买卖订单共享容量"""
+
+    uses_volume = True
+
+    def __init__(self, participation_rate: float = 0.1, slippage_rate: float = 0.001) -> None:
+        if not 0 < participation_rate <= 1:
+            raise ValueError(f"参与率必须在 (0, 1] 之间: {participation_rate}")
+        self.participation_rate = participation_rate
+        self.slippage_rate = slippage_rate
+
+    def fill(
+        self,
+        codes: list[str],  # noqa: ARG002
+        symbols: np.ndarray,
+        shares: np.ndarray,
+        volumes: np.ndarray | None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        ratio, _ = _participation_ratio(symbols, shares, volumes * self.participation_rate)
+        return shares * ratio, np.full(len(shares), self.slippage_rate)
+
+
+class SquareRootImpactFillModel(FillModel):
+    """
+    平方根市场冲击
+    impact_coefficient: 冲击系数
+    volatility: 日波动率，按股票代码或统一值
+    participation_rate: 成交量参与率上限，None 表示不限制
+    """
+
+    uses_volume = True
+
+    def __init__(
+        self,
+        impact_coefficient: float = 0.1,
+        volatility: float | dict[str, float] = 0.02,
+        participation_rate: float | None = None,
+    ) -> None:
+        self.impact_coefficient = impact_coefficient
+        self.volatility = volatility
+        self.participation_rate = participation_rate
+
+    def fill(
+        self,
+        codes: list[str],
+        symbols: np.ndarray,
+        shares: np.ndarray,
+        volumes: np.ndarray | None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        capacity = volumes if self.participation_rate is None else volumes * self.participation_rate
+        ratio, demand = _participation_ratio(symbols, shares, capacity)
+
+        if isinstance(self.volatility, dict):
+            volatility = np.fromiter(
+                (self.volatility.get(code, 0.0) for code in codes), np.float64, len(codes)
+            )
+        else:
+            volatility = np.full(len(volumes), self.volatility)
+        # 冲击按股票的成交总量计算，同一股票的订单承担相同冲击
+        traded = np.minimum(demand, capacity)
+        impact = (
+            self.impact_coefficient
+            * volatility
+            * np.sqrt(np.divide(traded, volumes, out=np.zeros_like(traded), where=volumes > 0))
+        )
+        return shares * ratio, impact[symbols]
+
+
+class ExecutionResult(BaseModel):
+    """一次撮合的结果，数组与订单一一对应"""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    filled_shares: np.ndarray = Field(description="成交股数，非负")
+    fill_prices: np.ndarray = Field(description="含冲击的成交价")
+    filled_value: np.ndarray = Field(description="成交金额，非负")
+    impact: np.ndarray = Field(description="价格冲击比例")
+    remaining_cash: float = Field(description="剩余现金")
+
+    @property
+    def traded(self) -> np.ndarray:
+        """有成交的订单下标"""
+        return np.flatnonzero(self.filled_shares > 0)
+
+
+class ExecutionSimulator:
+    """
+    订单簿成交模拟
+    min_buy_shares: 买单成交股数不超过该值时视为未成交，与原逐单执行一致
+    """
+
+    def __init__(
+        self,
+        fill_model: FillModel | None = None,
+        volume_provider: VolumeProvider | None = None,
+        min_buy_shares: float = 0.01,
+    ) -> None:
+        self.fill_model = fill_model or FixedRateFillModel()
+        self.volume_provider = volume_provider or StaticVolumeProvider()
+        self.min_buy_shares = min_buy_shares
+
+    def execute(
+        self,
+        codes: Sequence[str],
+        shares: np.ndarray,
+        prices: np.ndarray,
+        available_cash: float,
+        timestamp: str | None = None,
+    ) -> ExecutionResult:
+        """
+        撮合订单簿
+        codes: 订单股票代码
+        shares: 带符号目标股数，买入为正
+        prices: 订单价格
+        """
+        shares = np.asarray(shares, dtype=float)
+        prices = np.asarray(prices, dtype=float)
+        unique_codes, symbols = np.unique(np.asarray(codes, dtype=object), return_inverse=True)
+        unique_codes = unique_codes.tolist()
+        volumes = None
+        if self.fill_model.uses_volume:
+            volumes = self.volume_provider.get_volumes(unique_codes, timestamp)
+
+        fillable, impact = self.fill_model.fill(unique_codes, symbols, np.abs(shares), volumes)
+        is_buy = shares > 0
+        fill_prices = prices * np.where(is_buy, 1 + impact, 1 - impact)
+
+        # 卖单全部先成交
+        filled_shares = np.where(is_buy, 0.0, fillable)
+        cash = available_cash + float((filled_shares * fill_prices).sum())
+
+        # 买单按顺序用现金，最后一笔可部分成交
+        buy_rows = np.flatnonzero(is_buy)
+        buy_cost = fillable[buy_rows] * fill_prices[buy_rows]
+        spent_before = np.cumsum(buy_cost) - buy_cost
+        affordable = np.clip(cash - spent_before, 0.0, buy_cost)
+        buy_shares = np.divide(
+            affordable,
+            fill_prices[buy_rows],
+            out=np.zeros_like(affordable),
+            where=fill_prices[buy_rows] > 0,
+        )
+        buy_shares = np.where(affordable < buy_cost, buy_shares, fillable[buy_rows])
+        buy_shares[buy_shares <= self.min_buy_shares] = 0.0
+        filled_shares[buy_rows] = buy_shares
+
+        filled_value = filled_shares * fill_prices
+        remaining_cash = cash - float(filled_value[buy_rows].sum())
+        return ExecutionResult(
+            filled_shares=filled_shares,
+            fill_prices=fill_prices,
+            filled_value=filled_value,
+            impact=impact,
+            remaining_cash=remaining_cash,
+        )
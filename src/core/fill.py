@@ -0,0 +1,131 @@
+"""
+成交分发
+
+根据母单成交和分配表，用数组运算一次算出每个分配行的成交股数、成交金额、
+未成交余量以及每个叶子的现金变动，再按叶子分段一次性写回持仓。
+"""
+
+from typing import TYPE_CHECKING
+
+import numpy as np
+from pydantic import BaseModel, ConfigDict, Field
+
+from src.entity.trade import TradeDirection
+
+from .aggregation import OrderAggregation
+
+if TYPE_CHECKING:
+    from src.entity.strategy import VirtualAccount
+
+
+class UnfilledOrder(BaseModel):
+    """叶子未成交明细"""
+
+    strategy_name: str = Field(description="策略名称")
+    stock_code: str = Field(description="股票代码")
+    direction: TradeDirection = Field(description="交易方向")
+    target_shares: float = Field(description="目标股数")
+    unfilled_shares: float = Field(description="未成交股数")
+
+
+class UnfilledReport(BaseModel):
+    """未成交报告"""
+
+    orders: list[UnfilledOrder] = Field(default_factory=list, description="未成交明细")
+
+    @property
+    def total_unfilled_shares(self) -> float:
+        return sum(order.unfilled_shares for order in self.orders)
+
+    def by_stock(self) -> dict[str, float]:
+        """各股票未成交股数（买卖方向带符号，买入为正）"""
+        result: dict[str, float] = {}
+        for order in self.orders:
+            sign = 1 if order.direction == TradeDirection.BUY else -1
+            unfilled = sign * order.unfilled_shares
+            result[order.stock_code] = result.get(order.stock_code, 0) + unfilled
+        return result
+
+
+class FillDistribution(BaseModel):
+    """成交分发结果，分配行与叶子订单一一对应"""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    codes: list[str]
+    alloc_symbol: np.ndarray
+    alloc_leaf: np.ndarray
+    alloc_shares: np.ndarray = Field(description="带符号的目标股数，买入为正")
+    filled_shares: np.ndarray = Field(description="成交股数，非负")
+    filled_value: np.ndarray = Field(description="成交金额，非负")
+    leaf_cash_delta: np.ndarray = Field(description="各叶子现金变动")
+
+    @property
+    def unfilled_shares(self) -> np.ndarray:
+        return np.abs(self.alloc_shares) - self.filled_shares
+
+    @property
+    def signed_filled_shares(self) -> np.ndarray:
+        return np.sign(self.alloc_shares) * self.filled_shares
+
+    def unfilled_report(self, leaf_names: list[str], min_shares: float = 0.01) -> UnfilledReport:
+        """未成交余量超过 min_shares 的分配行"""
+        unfilled = self.unfilled_shares
+        rows = np.flatnonzero(unfilled > min_shares).tolist()
+        return UnfilledReport(
+            orders=[
+                UnfilledOrder(
+                    strategy_name=leaf_names[self.alloc_leaf[row]],
+                    stock_code=self.codes[self.alloc_symbol[row]],
+                    direction=(
+                        TradeDirection.BUY if self.alloc_shares[row] > 0 else TradeDirection.SELL
+                    ),
+                    target_shares=float(abs(self.alloc_shares[row])),
+                    unfilled_shares=float(unfilled[row]),
+                )
+                for row in rows
+            ]
+        )
+
+    def apply(self, accounts: list["VirtualAccount"]) -> None:
+        """按叶子分段写回持仓和现金，每个叶子账户只处理一次"""
+        traded = np.flatnonzero(self.filled_shares > 0)
+        signed_shares = self.signed_filled_shares
+        fill_prices = np.divide(
+            self.filled_value,
+            self.filled_shares,
+            out=np.zeros_like(self.filled_value),
+            where=self.filled_shares > 0,
+        )
+
+        if len(traded):
+            order_rows = traded[np.argsort(self.alloc_leaf[traded], kind="stable")]
+            leaves = self.alloc_leaf[order_rows]
+            boundaries = np.flatnonzero(np.diff(leaves)) + 1
+            for rows in np.split(order_rows, boundaries):
+                accounts[self.alloc_leaf[rows[0]]].apply_stock_trades(
+                    [self.codes[symbol] for symbol in self.alloc_symbol[rows].tolist()],
+                    signed_shares[rows],
+                    fill_prices[rows],
+                )
+
+        for leaf in np.flatnonzero(self.leaf_cash_delta).tolist():
+            accounts[leaf].cash_info.available_cash += float(self.leaf_cash_delta[leaf])
+
+
+def distribute_fills(aggregation: OrderAggregation, leaf_count: int) -> FillDistribution:
+    """根据母单成交计算各分配行成交与各叶子现金变动"""
+    filled_shares, filled_value = aggregation.split_fills()
+    # 买入支出现金，卖出收回现金
+    cash_flow = np.where(aggregation.alloc_shares > 0, -filled_value, filled_value)
+    leaf_cash_delta = np.bincount(aggregation.alloc_leaf, weights=cash_flow, minlength=leaf_count)
+
+    return FillDistribution(
+        codes=aggregation.codes,
+        alloc_symbol=aggregation.alloc_symbol,
+        alloc_leaf=aggregation.alloc_leaf,
+        alloc_shares=aggregation.alloc_shares,
+        filled_shares=filled_shares,
+        filled_value=filled_value,
+        leaf_cash_delta=leaf_cash_delta,
+    )
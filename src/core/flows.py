@@ -0,0 +1,102 @@
+"""
+批量申购赎回
+
+日终把多只产品的申购赎回指令 (产品ID, 带符号金额) 一次处理：先按产品净额汇总，
+再用各产品扁平索引中预先算好的叶子路径权重一次算出所有叶子的分配金额，
+最后批量写入根节点和叶子节点的待申购金额。负数表示待赎回。
+过程中不打印，结果以结构化形式返回。
+"""
+
+from typing import TYPE_CHECKING
+
+import numpy as np
+from pydantic import BaseModel, ConfigDict, Field
+
+if TYPE_CHECKING:
+    from src.entity.strategy import StrategyTree
+
+
+class FundFlowResult(BaseModel):
+    """批量申购赎回结果"""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    fund_ids: np.ndarray = Field(description="涉及的产品ID，升序")
+    subscriptions: np.ndarray = Field(description="各产品申购总额")
+    redemptions: np.ndarray = Field(description="各产品赎回总额，为正数")
+    leaf_fund_ids: np.ndarray = Field(description="叶子分配行对应的产品ID")
+    leaf_names: list[str] = Field(description="叶子分配行对应的策略名称")
+    leaf_amounts: np.ndarray = Field(description="叶子分配金额，负数为待赎回")
+
+    @property
+    def net_amounts(self) -> np.ndarray:
+        """各产品净申购金额"""
+        return self.subscriptions - self.redemptions
+
+    def fund_allocations(self, fund_id: int) -> dict[str, float]:
+        """单个产品的叶子分配 {策略名称: 金额}"""
+        rows = np.flatnonzero(self.leaf_fund_ids == fund_id).tolist()
+        return {self.leaf_names[row]: float(self.leaf_amounts[row]) for row in rows}
+
+
+def process_fund_flows(
+    funds: list["StrategyTree"],
+    fund_ids: list[int] | np.ndarray,
+    amounts: list[float] | np.ndarray,
+) -> FundFlowResult:
+    """
+    批量处理申购赎回
+    funds: 各产品的根节点，按 fund_id 匹配
+    fund_ids, amounts: 指令表，金额正数为申购、负数为赎回
+    """
+    fund_ids = np.asarray(fund_ids, dtype=np.int64)
+    amounts = np.asarray(amounts, dtype=float)
+    if fund_ids.shape != amounts.shape:
+        raise ValueError(f"产品ID与金额数量不一致: {fund_ids.shape} != {amounts.shape}")
+
+    roots = {fund.fund_id: fund for fund in funds}
+    for fund in funds:
+        if fund.weight != 1.0:
+            raise ValueError(f"申购赎回只能在根节点执行: {fund.name}")
+
+    unique_ids, inverse = np.unique(fund_ids, return_inverse=True)
+    missing = [fund_id for fund_id in unique_ids.tolist() if fund_id not in roots]
+    if missing:
+        raise ValueError(f"未知的产品ID: {missing}")
+
+    size = len(unique_ids)
+    subscriptions = np.bincount(inverse, weights=np.maximum(amounts, 0.0), minlength=size)
+    redemptions = np.bincount(inverse, weights=np.maximum(-amounts, 0.0), minlength=size)
+    net_amounts = subscriptions - redemptions
+
+    # 拼接各产品叶子的路径权重，一次乘出所有叶子的分配金额
+    leaf_nodes: list[StrategyTree] = []
+    leaf_weights: list[np.ndarray] = [np.empty(0)]
+    leaf_funds: list[np.ndarray] = [np.empty(0, dtype=np.int64)]
+    for position, fund_id in enumerate(unique_ids.tolist()):
+        index = roots[fund_id].tree_index
+        leaf_nodes.extend(index.leaves())
+        leaf_weights.append(index.path_weight[index.leaf_rows])
+        leaf_funds.append(np.full(len(index.leaf_rows), position, dtype=np.int64))
+
+    leaf_positions = np.concatenate(leaf_funds)
+    leaf_amounts = net_amounts[leaf_positions] * np.concatenate(leaf_weights)
+
+    for fund_id, net in zip(unique_ids.tolist(), net_amounts.tolist(), strict=True):
+        root = roots[fund_id]
+        # 根节点本身是叶子时只按叶子记一次
+        if root.children:
+            root.virtual_account.cash_info.pending_purchase_amount += net
+            root._account_changed()
+    for node, amount in zip(leaf_nodes, leaf_amounts.tolist(), strict=True):
+        node.virtual_account.cash_info.pending_purchase_amount += amount
+        node._account_changed()
+
+    return FundFlowResult(
+        fund_ids=unique_ids,
+        subscriptions=subscriptions,
+        redemptions=redemptions,
+        leaf_fund_ids=unique_ids[leaf_positions],
+        leaf_names=[node.name for node in leaf_nodes],
+        leaf_amounts=leaf_amounts,
+    )
@@ -0,0 +1,221 @@
+"""
+期货合约注册表
+
+合约规格（乘数、保证金率、到期日、标的指数）只加载一次，按策略配置中的合约名
+（如 "IC期货"）或持仓中的期货代码（如 "IC"）O(1) 查找。最新价来自可替换的行情来源
+（任意 PriceProvider，包括本地文件回放），refresh_marks 一次批量刷新所有合约。
+整只产品的保证金用 margins 按数组一次算出，不再逐持仓重建配置。
+多合约对冲的策略（MULTI_CONTRACTS）持有多个期货代码，保证金按持仓的期货代码查找规格。
+"""
+
+from collections.abc import Sequence
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+from pydantic import BaseModel, Field
+
+from .price import PriceProvider, StaticPriceProvider
+
+
+class FuturesContractSpec(BaseModel):
+    """期货合约规格"""
+
+    contract: str = Field(description="合约名称，对应策略配置中的 contract，如 IC期货")
+    name: str = Field(description="合约全称")
+    index_code: str = Field(description="期货代码，对应持仓中的 futures_code")
+    underlying: str = Field(description="标的指数")
+    multiplier: float = Field(description="合约乘数，每点金额")
+    margin_rate: float = Field(description="保证金率")
+    expiry: date | None = Field(default=None, description="到期日，None 表示连续合约")
+
+
+DEFAULT_CONTRACT_SPECS: list[FuturesContractSpec] = [
+    FuturesContractSpec(
+        contract="IC期货",
+        name="沪深300股指期货",
+        index_code="IC",
+        underlying="沪深300",
+        multiplier=300,
+        margin_rate=0.12,
+    ),
+    FuturesContractSpec(
+        contract="IC500期货",
+        name="中证500股指期货",
+        index_code="IC500",
+        underlying="中证500",
+        multiplier=200,
+        margin_rate=0.15,
+    ),
+    FuturesContractSpec(
+        contract="IM期货",
+        name="中证1000股指期货",
+        index_code="IM",
+        underlying="中证1000",
+        multiplier=200,
+        margin_rate=0.15,
+    ),
+]
+
+# 模拟点位，按期货代码
+DEFAULT_FUTURES_MARKS: dict[str, float] = {
+    "IC": 4000,
+    "IC500": 6500,
+    "IM": 7000,
+}
+
+DEFAULT_CONTRACT = "IC期货"
+
+# 多合约对冲：合约名对应的候选合约，由对冲求解按 beta 优化各合约手数
+MULTI_CONTRACTS: dict[str, list[str]] = {
+    "IC/IC500期货": ["IC期货", "IC500期货"],
+    "多合约": ["IC期货", "IC500期货", "IM期货"],
+}
+
+
+def load_contract_specs(path: str | Path) -> list[FuturesContractSpec]:
+    """从 parquet 或 csv 加载合约规格，列名与 FuturesContractSpec 字段一致"""
+    import polars as pl  # noqa: PLC0415
+
+    path = Path(path)
+    frame = pl.read_parquet(path) if path.suffix == ".parquet" else pl.read_csv(path)
+    return [FuturesContractSpec.model_validate(row) for row in frame.to_dicts()]
+
+
+class ContractRegistry:
+    """
+    期货合约注册表
+    未知合约名回落到 default_contract，与原来的配置查找行为一致
+    """
+
+    def __init__(
+        self,
+        specs: Sequence[FuturesContractSpec] = DEFAULT_CONTRACT_SPECS,
+        feed: PriceProvider | None = None,
+        default_contract: str = DEFAULT_CONTRACT,
+    ) -> None:
+        self.specs = list(specs)
+        self.feed = feed or StaticPriceProvider(DEFAULT_FUTURES_MARKS, default_price=0.0)
+        self._rows = {spec.contract: row for row, spec in enumerate(self.specs)}
+        self._code_rows = {spec.index_code: row for row, spec in enumerate(self.specs)}
+        if default_contract not in self._rows:
+            raise ValueError(f"默认合约不在注册表中: {default_contract}")
+        self._default_row = self._rows[default_contract]
+
+        self.index_codes = [spec.index_code for spec in self.specs]
+        self.multipliers = np.array([spec.multiplier for spec in self.specs], dtype=float)
+        self.margin_rates = np.array([spec.margin_rate for spec in self.specs], dtype=float)
+        self.marks = np.zeros(len(self.specs))
+        self.mark_timestamp: str | None = None
+        self._infos: list[dict] = []
+        self.refresh_marks()
+
+    def __len__(self) -> int:
+        return len(self.specs)
+
+    def __contains__(self, contract: str) -> bool:
+        return contract in self._rows
+
+    def row(self, contract: str) -> int:
+        return self._rows.get(contract, self._default_row)
+
+    def rows(self, contracts: Sequence[str]) -> np.ndarray:
+        lookup = self._rows.get
+        default = self._default_row
+        return np.fromiter(
+            (lookup(contract, default) for contract in contracts), np.int64, len(contracts)
+        )
+
+    def code_rows(self, index_codes: Sequence[str], contracts: Sequence[str]) -> np.ndarray:
+        """持仓期货代码对应的行，未知代码按所在策略的合约名查找"""
+        code_lookup = self._code_rows.get
+        return np.fromiter(
+            (
+                row if (row := code_lookup(code)) is not None else self.row(contract)
+                for code, contract in zip(index_codes, contracts, strict=True)
+            ),
+            np.int64,
+            len(index_codes),
+        )
+
+    def get(self, contract: str) -> FuturesContractSpec:
+        return self.specs[self.row(contract)]
+
+    def by_index_code(self, index_code: str) -> FuturesContractSpec | None:
+        row = self._code_rows.get(index_code)
+        return self.specs[row] if row is not None else None
+
+    def refresh_marks(self, timestamp: str | None = None) -> np.ndarray:
+        """从行情来源批量刷新所有合约的最新价"""
+        self.marks = self.feed.get_prices(self.index_codes, timestamp)
+        self.mark_timestamp = timestamp
+        self._infos = [
+            {
+                "name": spec.name,
+                "multiplier": spec.multiplier,
+                "margin_rate": spec.margin_rate,
+                "index_code": spec.index_code,
+                "current_price": mark,
+            }
+            for spec, mark in zip(self.specs, self.marks.tolist(), strict=True)
+        ]
+        return self.marks
+
+    def mark_price(self, contract: str) -> float:
+        return float(self.marks[self.row(contract)])
+
+    def contract_info(self, contract: str) -> dict:
+        """原 _get_futures_contract_info 结构的合约信息，刷新价格前复用同一份"""
+        return self._infos[self.row(contract)]
+
+    def code_info(self, index_code: str, contract: str = "") -> dict:
+        """按持仓期货代码取合约信息，未知代码按合约名查找"""
+        row = self._code_rows.get(index_code)
+        return self._infos[row if row is not None else self.row(contract)]
+
+    def contract_values(self, contracts: Sequence[str]) -> np.ndarray:
+        """每手合约价值"""
+        rows = self.rows(contracts)
+        return self.marks[rows] * self.multipliers[rows]
+
+    def margins(self, contracts: Sequence[str], lots: np.ndarray) -> np.ndarray:
+        """按当前价计算各行持仓占用的保证金"""
+        rows = self.rows(contracts)
+        contract_values = self.marks[rows] * self.multipliers[rows]
+        return np.asarray(lots) * contract_values * self.margin_rates[rows]
+
+    def position_margins(
+        self, index_codes: Sequence[str], lots: np.ndarray, contracts: Sequence[str]
+    ) -> np.ndarray:
+        """按持仓期货代码计算各持仓占用的保证金，contracts 为持仓所在策略的合约名"""
+        rows = self.code_rows(index_codes, contracts)
+        return (
+            np.asarray(lots) * self.marks[rows] * self.multipliers[rows] * self.margin_rates[rows]
+        )
+
+    def multi_contracts(self, contract: str) -> list[str] | None:
+        """多合约对冲的候选合约，单合约返回 None"""
+        candidates = MULTI_CONTRACTS.get(contract)
+        if candidates is None:
+            return None
+        return [candidate for candidate in candidates if candidate in self._rows]
+
+
+# 全局默认合约注册表
+_registry: ContractRegistry | None = None
+
+
+def get_futures_registry() -> ContractRegistry:
+    """全局合约注册表，首次使用时按默认规格创建"""
+    global _registry  # noqa: PLW0603
+    if _registry is None:
+        _registry = ContractRegistry()
+    return _registry
+
+
+def set_futures_registry(registry: ContractRegistry | None) -> ContractRegistry | None:
+    """替换全局合约注册表，返回原来的注册表便于恢复；None 表示恢复默认"""
+    global _registry  # noqa: PLW0603
+    previous = _registry
+    _registry = registry
+    return previous
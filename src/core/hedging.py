@@ -0,0 +1,438 @@
+"""
+期货对冲求解
+
+读取一次扁平索引和整树估值，为所有期货叶子同时求解目标手数：
+1. 每个期货叶子的对冲组合为最近的设置了 target_exposure 的祖先，都没有时取父节点；
+2. 组合股票市值为组合子树内非期货叶子的市值之和（一次子树前缀和）；
+3. 目标空头敞口 = 股票市值 × (1 - target_exposure)，同一组合有多个期货叶子时按权重分摊；
+4. 目标手数按整手取整，加仓受叶子可用现金对应的保证金上限约束。
+多合约对冲的叶子（如 "IC/IC500期货"）每个候选合约一行：先用 BetaModel 把组合股票持仓
+汇总为对各指数的 beta 暴露，再由 solve_contract_mix 求残余 beta 与保证金最小的合约组合。
+结果为对冲指令批次，由 StrategyTree.apply_hedge_plan 统一执行，求解过程不修改账户。
+"""
+
+from collections.abc import Sequence
+from enum import Enum
+from itertools import combinations
+from typing import TYPE_CHECKING
+
+import numpy as np
+from pydantic import BaseModel, ConfigDict, Field
+
+from .beta import BetaModel, get_beta_model
+from .futures import ContractRegistry, get_futures_registry
+from .tree_index import TreeIndex
+from .valuation import ValuationEngine
+
+if TYPE_CHECKING:
+    from src.entity.strategy import StrategyTree
+
+
+class HedgeActionEnum(str, Enum):
+    """对冲指令方向"""
+
+    OPEN_SHORT = "开空"
+    CLOSE_SHORT = "平空"
+
+
+class HedgeOrder(BaseModel):
+    """对冲指令"""
+
+    strategy_name: str = Field(description="期货策略名称")
+    line: int = Field(description="对冲行下标")
+    node_row: int = Field(description="期货叶子在扁平索引中的先序位置")
+    contract: str = Field(description="合约名称")
+    futures_code: str = Field(description="期货代码")
+    action: HedgeActionEnum = Field(description="开空或平空")
+    lots: float = Field(description="手数")
+    price: float = Field(description="成交点位")
+    margin: float = Field(description="占用或释放的保证金")
+    capped: bool = Field(default=False, description="是否因现金不足被截断")
+
+
+class HedgePlan(BaseModel):
+    """
+    一次对冲求解的结果
+    leaf_* 数组按对冲行排列：期货叶子按先序，多合约叶子每个候选合约一行
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    group_rows: np.ndarray = Field(description="对冲组合的先序位置")
+    group_stock_value: np.ndarray = Field(description="各对冲组合的股票市值")
+    group_target_exposure: np.ndarray = Field(description="各对冲组合的目标敞口")
+    group_futures_count: np.ndarray = Field(description="各对冲组合的期货叶子数")
+    leaf_rows: np.ndarray = Field(description="对冲行所属期货叶子的先序位置")
+    leaf_group: np.ndarray = Field(description="期货叶子所属对冲组合下标")
+    leaf_contracts: list[str] = Field(description="期货叶子的合约名称")
+    contract_values: np.ndarray = Field(description="每手合约价值")
+    target_exposure_value: np.ndarray = Field(description="目标期货敞口金额，空头为负")
+    target_lots: np.ndarray = Field(description="目标手数")
+    current_lots: np.ndarray = Field(description="当前手数")
+    orders: list[HedgeOrder] = Field(default_factory=list, description="对冲指令")
+    beta_index_codes: list[str] = Field(default_factory=list, description="beta 暴露对应的指数代码")
+    group_beta: np.ndarray | None = Field(
+        default=None, description="各对冲组合单位股票市值的 beta 暴露，无多合约叶子时为 None"
+    )
+
+    @property
+    def order_lots(self) -> np.ndarray:
+        """各对冲行的带符号调整手数，正数为加空"""
+        lots = np.zeros(len(self.leaf_rows))
+        for order in self.orders:
+            sign = 1.0 if order.action == HedgeActionEnum.OPEN_SHORT else -1.0
+            lots[order.line] += sign * order.lots
+        return lots
+
+
+def solve_contract_mix(
+    exposures: np.ndarray,
+    factor_cov: np.ndarray,
+    columns: Sequence[int],
+    margin_rates: np.ndarray,
+    margin_penalty: float = 0.0,
+) -> np.ndarray:
+    """
+    批量求解多合约对冲比例：对每行 beta 暴露 b 求 w ≥ 0，最小化
+        (b - E·w)ᵀ Σ (b - E·w) + margin_penalty · mᵀw
+    E 把候选合约映射到 columns 对应的指数列。候选合约很少，逐个枚举非负约束的有效集，
+    每个有效集对所有行一次求解，取可行解中目标最小者。
+    返回 行数 × 合约数 的对冲比例（单位股票市值对应的合约名义金额）
+    """
+    exposures = np.atleast_2d(np.asarray(exposures, dtype=float))
+    columns = np.asarray(columns, dtype=np.int64)
+    num_contracts = len(columns)
+    # 目标去掉常数项后为 wᵀ Σ_cc w - 2 wᵀ rhs，有效集 S 上的驻点满足 Σ_SS w_S = rhs_S
+    sigma = factor_cov[np.ix_(columns, columns)]
+    rhs = exposures @ factor_cov[:, columns] - margin_penalty * np.asarray(margin_rates) / 2
+
+    best = np.zeros((len(exposures), num_contracts))
+    best_objective = np.zeros(len(exposures))
+    for size in range(1, num_contracts + 1):
+        for subset in combinations(range(num_contracts), size):
+            active = list(subset)
+            weights = rhs[:, active] @ np.linalg.pinv(sigma[np.ix_(active, active)])
+            objective = -(weights * rhs[:, active]).sum(axis=1)
+            better = (weights >= 0).all(axis=1) & (objective < best_objective - 1e-15)
+            if better.any():
+                best[better] = 0.0
+                best[np.ix_(better, active)] = weights[better]
+                best_objective[better] = objective[better]
+    return best
+
+
+class HedgeSolver:
+    """
+    期货对冲求解器
+    round_lots: 是否按整手取整；不取整时调整量小于 min_lots 的忽略
+    beta_model, trade_date: 多合约对冲用的 beta 模型和估计交易日，缺省为全局模型（须已配置）和当天
+    margin_penalty: 多合约对冲中保证金相对残余 beta 方差的权重
+    """
+
+    def __init__(
+        self,
+        registry: ContractRegistry | None = None,
+        round_lots: bool = True,
+        min_lots: float = 0.1,
+        beta_model: BetaModel | None = None,
+        trade_date: str | None = None,
+        margin_penalty: float = 1e-6,
+    ) -> None:
+        self.registry = registry
+        self.round_lots = round_lots
+        self.min_lots = min_lots
+        self.beta_model = beta_model
+        self.trade_date = trade_date
+        self.margin_penalty = margin_penalty
+
+    def solve(self, root: "StrategyTree") -> HedgePlan:
+        registry = self.registry or get_futures_registry()
+        engine = ValuationEngine(root)
+        index = engine.index
+        nodes = index.nodes
+        prices = root._get_stock_prices(engine.codes)
+        own_stock = engine.valuate(prices).own_stock_value
+
+        is_futures = np.fromiter(
+            (not node.children and node._is_futures_strategy() for node in nodes),
+            dtype=bool,
+            count=len(nodes),
+        )
+        stock_leaf = index.is_leaf & ~is_futures
+        subtree_stock = index.subtree_sum(np.where(stock_leaf, own_stock, 0.0))
+
+        futures_rows = np.flatnonzero(is_futures)
+        group_rows, futures_group = np.unique(
+            _hedge_group_rows(index, futures_rows), return_inverse=True
+        )
+        group_stock_value = np.where(group_rows >= 0, subtree_stock[np.maximum(group_rows, 0)], 0.0)
+        group_target_exposure = np.array(
+            [
+                float(nodes[row].strategy_info.get("target_exposure", 0.0)) if row >= 0 else 0.0
+                for row in group_rows.tolist()
+            ]
+        )
+        group_futures_count = np.bincount(futures_group, minlength=len(group_rows))
+
+        # 同一组合的期货叶子按权重分摊敞口，权重全为0时平均分摊
+        leaf_weights = np.array([nodes[row].weight for row in futures_rows.tolist()], dtype=float)
+        group_weight = np.bincount(futures_group, weights=leaf_weights, minlength=len(group_rows))
+        share = np.where(
+            group_weight[futures_group] > 0,
+            leaf_weights / np.where(group_weight > 0, group_weight, 1.0)[futures_group],
+            1.0 / group_futures_count[futures_group],
+        )
+        hedge_value = (
+            group_stock_value[futures_group] * (group_target_exposure[futures_group] - 1.0) * share
+        )
+
+        # 股票叶子各持仓市值，按节点先序排列
+        position_value = engine.pos_amount * prices[engine.pos_col] * stock_leaf[engine.pos_node]
+        line_leaf, line_contracts, line_ratio, group_beta, beta_index_codes = self._hedge_lines(
+            registry,
+            engine,
+            position_value,
+            group_rows,
+            group_stock_value,
+            futures_group,
+            [nodes[row].strategy_info.get("contract", "") for row in futures_rows.tolist()],
+        )
+        contract_rows = registry.rows(line_contracts)
+        contract_values = registry.marks[contract_rows] * registry.multipliers[contract_rows]
+        target_exposure_value = hedge_value[line_leaf] * line_ratio
+        target_lots = np.divide(
+            np.abs(target_exposure_value),
+            contract_values,
+            out=np.zeros_like(contract_values),
+            where=contract_values > 0,
+        )
+        if self.round_lots:
+            target_lots = np.rint(target_lots)
+
+        leaf_rows = futures_rows[line_leaf]
+        current_lots, available_cash = _leaf_accounts(
+            [nodes[row] for row in leaf_rows.tolist()],
+            [registry.index_codes[row] for row in contract_rows.tolist()],
+        )
+        plan = HedgePlan(
+            group_rows=group_rows,
+            group_stock_value=group_stock_value,
+            group_target_exposure=group_target_exposure,
+            group_futures_count=group_futures_count,
+            leaf_rows=leaf_rows,
+            leaf_group=futures_group[line_leaf],
+            leaf_contracts=line_contracts,
+            contract_values=contract_values,
+            target_exposure_value=target_exposure_value,
+            target_lots=target_lots,
+            current_lots=current_lots,
+            beta_index_codes=beta_index_codes,
+            group_beta=group_beta,
+        )
+        plan.orders = self._build_orders(plan, registry, contract_rows, available_cash, nodes)
+        return plan
+
+    def _hedge_lines(
+        self,
+        registry: ContractRegistry,
+        engine: ValuationEngine,
+        position_value: np.ndarray,
+        group_rows: np.ndarray,
+        group_stock_value: np.ndarray,
+        futures_group: np.ndarray,
+        contracts: list[str],
+    ) -> tuple[np.ndarray, list[str], np.ndarray, np.ndarray | None, list[str]]:
+        """
+        展开对冲行：单合约叶子一行，比例为 1；多合约叶子每个候选合约一行，比例由 beta 优化得到
+        返回 (所属期货叶子下标, 合约名, 比例, 组合 beta 暴露, beta 指数代码)
+        """
+        candidates = [registry.multi_contracts(contract) for contract in contracts]
+        group_beta = None
+        beta_index_codes: list[str] = []
+        mix: dict[int, np.ndarray] = {}
+        if any(candidates):
+            group_beta, beta_index_codes, mix = self._contract_mix(
+                registry,
+                engine,
+                position_value,
+                group_rows,
+                group_stock_value,
+                futures_group,
+                candidates,
+            )
+
+        line_leaf: list[int] = []
+        line_contracts: list[str] = []
+        line_ratio: list[float] = []
+        for i, contract in enumerate(contracts):
+            leaf_contracts = candidates[i] or [contract]
+            line_leaf.extend([i] * len(leaf_contracts))
+            line_contracts.extend(leaf_contracts)
+            line_ratio.extend(mix[i].tolist() if candidates[i] else [1.0])
+        return (
+            np.array(line_leaf, dtype=np.int64),
+            line_contracts,
+            np.array(line_ratio),
+            group_beta,
+            beta_index_codes,
+        )
+
+    def _contract_mix(
+        self,
+        registry: ContractRegistry,
+        engine: ValuationEngine,
+        position_value: np.ndarray,
+        group_rows: np.ndarray,
+        group_stock_value: np.ndarray,
+        futures_group: np.ndarray,
+        candidates: list[list[str] | None],
+    ) -> tuple[np.ndarray, list[str], dict[int, np.ndarray]]:
+        """
+        多合约叶子的合约比例
+        组合 beta 暴露 = 组合子树内股票叶子的 Σ 持仓市值 × beta / 组合股票市值，
+        持仓按节点先序排列，一次前缀和按先序区间汇总所有组合
+        """
+        model = self.beta_model or get_beta_model()
+        estimate = model.estimate(engine.codes, self.trade_date)
+        betas = estimate.betas_for(engine.codes)
+
+        cumulative = np.zeros((len(position_value) + 1, len(estimate.index_codes)))
+        np.cumsum(position_value[:, None] * betas[engine.pos_col], axis=0, out=cumulative[1:])
+        anchors = np.maximum(group_rows, 0)
+        starts = np.searchsorted(engine.pos_node, anchors)
+        ends = np.searchsorted(engine.pos_node, engine.index.subtree_end[anchors])
+        group_beta = np.divide(
+            cumulative[ends] - cumulative[starts],
+            group_stock_value[:, None],
+            out=np.zeros((len(group_rows), len(estimate.index_codes))),
+            where=(group_rows >= 0)[:, None] & (group_stock_value > 0)[:, None],
+        )
+
+        # 候选合约相同的叶子一起求解
+        by_candidates: dict[tuple[str, ...], list[int]] = {}
+        for i, contracts in enumerate(candidates):
+            if contracts:
+                by_candidates.setdefault(tuple(contracts), []).append(i)
+
+        mix: dict[int, np.ndarray] = {}
+        for contracts, leaves in by_candidates.items():
+            columns = []
+            for contract in contracts:
+                index_code = registry.get(contract).index_code
+                if index_code not in estimate.index_codes:
+                    raise ValueError(
+                        f"合约 {contract} 的期货代码不在 beta 模型的指数中: {index_code}"
+                    )
+                columns.append(estimate.index_codes.index(index_code))
+            ratios = solve_contract_mix(
+                group_beta[futures_group[leaves]],
+                estimate.factor_cov,
+                columns,
+                registry.margin_rates[registry.rows(contracts)],
+                self.margin_penalty,
+            )
+            mix.update(zip(leaves, ratios, strict=True))
+        return group_beta, list(estimate.index_codes), mix
+
+    def _build_orders(
+        self,
+        plan: HedgePlan,
+        registry: ContractRegistry,
+        contract_rows: np.ndarray,
+        available_cash: np.ndarray,
+        nodes: list["StrategyTree"],
+    ) -> list[HedgeOrder]:
+        """
+        按目标手数与当前手数之差生成指令，加仓受可用现金对应的保证金上限约束；
+        多合约叶子的可用现金按各行所需保证金的比例分给各行
+        """
+        margin_per_lot = plan.contract_values * registry.margin_rates[contract_rows]
+        diff = plan.target_lots - plan.current_lots
+        wanted = np.maximum(diff, 0.0)
+
+        _, line_leaf = np.unique(plan.leaf_rows, return_inverse=True)
+        required = wanted * margin_per_lot
+        leaf_required = np.bincount(line_leaf, weights=required)[line_leaf]
+        cash_share = np.divide(
+            required, leaf_required, out=np.ones_like(required), where=leaf_required > 0
+        )
+        max_open = np.divide(
+            np.maximum(available_cash, 0.0) * cash_share,
+            margin_per_lot,
+            out=np.zeros_like(margin_per_lot),
+            where=margin_per_lot > 0,
+        )
+        if self.round_lots:
+            max_open = np.floor(max_open)
+
+        open_lots = np.minimum(wanted, max_open)
+        close_lots = np.maximum(-diff, 0.0)
+        # 组合无股票持仓的期货叶子不调仓
+        active = plan.group_stock_value[plan.leaf_group] > 0
+        threshold = 0.5 if self.round_lots else self.min_lots
+
+        orders: list[HedgeOrder] = []
+        for i, row in enumerate(plan.leaf_rows.tolist()):
+            if not active[i]:
+                continue
+            if open_lots[i] > threshold:
+                action, lots = HedgeActionEnum.OPEN_SHORT, float(open_lots[i])
+            elif close_lots[i] > threshold:
+                action, lots = HedgeActionEnum.CLOSE_SHORT, float(close_lots[i])
+            else:
+                continue
+
+            contract_row = int(contract_rows[i])
+            spec = registry.specs[contract_row]
+            orders.append(
+                HedgeOrder(
+                    strategy_name=nodes[row].name,
+                    line=i,
+                    node_row=row,
+                    contract=spec.contract,
+                    futures_code=spec.index_code,
+                    action=action,
+                    lots=lots,
+                    price=float(registry.marks[contract_row]),
+                    margin=lots * float(margin_per_lot[i]),
+                    capped=bool(action == HedgeActionEnum.OPEN_SHORT and open_lots[i] < diff[i]),
+                )
+            )
+        return orders
+
+
+def _hedge_group_rows(index: TreeIndex, leaf_rows: np.ndarray) -> np.ndarray:
+    """期货叶子所属对冲组合的先序位置：最近的设置了 target_exposure 的祖先，都没有时取父节点"""
+    nodes = index.nodes
+    # 一次先序遍历：每个节点最近的设置了 target_exposure 的祖先（含自身）
+    anchor = np.full(len(nodes), -1, dtype=np.int64)
+    for row, node in enumerate(nodes):
+        if node.strategy_info.get("target_exposure") is not None:
+            anchor[row] = row
+        elif row > 0:
+            anchor[row] = anchor[index.parent[row]]
+
+    parents = index.parent[leaf_rows].astype(np.int64)
+    parent_anchor = np.where(parents >= 0, anchor[np.maximum(parents, 0)], -1)
+    return np.where(parent_anchor >= 0, parent_anchor, parents)
+
+
+def _leaf_accounts(
+    leaves: list["StrategyTree"], futures_codes: list[str]
+) -> tuple[np.ndarray, np.ndarray]:
+    """对冲行的当前手数（同一期货代码的空头合计）和所属叶子的可用现金"""
+    current_lots = np.array(
+        [
+            sum(
+                position.futures_amount
+                for position in leaf.virtual_account.futures_short_info
+                if position.futures_code == futures_code
+            )
+            for leaf, futures_code in zip(leaves, futures_codes, strict=True)
+        ],
+        dtype=float,
+    )
+    available_cash = np.array(
+        [leaf.virtual_account.cash_info.available_cash for leaf in leaves], dtype=float
+    )
+    return current_lots, available_cash
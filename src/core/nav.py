@@ -0,0 +1,194 @@
+"""
+增量净值账本
+
+在 ValuationEngine 展开的先序结构上，为每个节点缓存自身账户值和子树叶子汇总值
+（股票市值、可用现金、待申购、期货保证金）。持仓、现金、价格事件只更新发生节点
+自身的值，叶子节点的差额记入脏节点表；读取摘要前按先序逆序把差额逐层推给祖先，
+每个脏祖先只刷新一次。根节点摘要为 O(1)，一次价格变动的代价为 O(持有节点数 × 深度)。
+"""
+
+import heapq
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from .valuation import ValuationEngine, account_summary, futures_margin
+
+if TYPE_CHECKING:
+    from src.entity.strategy import StrategyTree
+
+# 缓存值的列
+STOCK, CASH, PENDING, MARGIN = range(4)
+
+
+class NavLedger:
+    """
+    增量净值账本
+    树结构变化（增删节点）后需要重新 rebuild；账户整体变化用 sync_account 事件同步
+    """
+
+    def __init__(self, root: "StrategyTree") -> None:
+        self.root = root
+        self.rebuild()
+
+    def rebuild(self) -> None:
+        """从当前账户和价格来源全量重建缓存，同时消除累积的浮点误差"""
+        engine = ValuationEngine(self.root)
+        prices = self.root._get_stock_prices(engine.codes)
+        valuation = engine.valuate(prices)
+
+        self.nodes = engine.nodes
+        self.rows = engine.rows
+        self.parent: list[int] = engine.parent.tolist()
+        self.is_leaf: list[bool] = engine.is_leaf.tolist()
+        self.prices: dict[str, float] = dict(zip(engine.codes, prices.tolist(), strict=True))
+        self.position_counts: list[int] = engine.stock_positions.tolist()
+        self.own = np.column_stack(
+            (
+                valuation.own_stock_value,
+                valuation.own_available_cash,
+                valuation.own_pending_amount,
+                valuation.own_futures_margin,
+            )
+        )
+        self.aggregate = np.column_stack(
+            (
+                valuation.stock_value,
+                valuation.available_cash,
+                valuation.pending_amount,
+                valuation.futures_margin,
+            )
+        )
+
+        # 各节点持仓和股票 -> 持有节点索引，价格事件据此只触达持有节点
+        self.positions: list[dict[str, float]] = [{} for _ in self.nodes]
+        self.holders: dict[str, set[int]] = {}
+        for row, col, amount in zip(
+            engine.pos_node.tolist(),
+            engine.pos_col.tolist(),
+            engine.pos_amount.tolist(),
+            strict=True,
+        ):
+            code = engine.codes[col]
+            self.positions[row][code] = self.positions[row].get(code, 0.0) + amount
+            self.holders.setdefault(code, set()).add(row)
+
+        self._dirty: dict[int, np.ndarray] = {}
+        self.version = 0
+
+    def _record(self, row: int, delta: np.ndarray) -> None:
+        """记录一个节点自身值的变化，叶子节点的差额留待 flush 推给祖先"""
+        self.own[row] += delta
+        self.version += 1
+        if not self.is_leaf[row]:
+            return
+        pending = self._dirty.get(row)
+        if pending is None:
+            self._dirty[row] = delta.copy()
+        else:
+            pending += delta
+
+    def on_position(
+        self, node: "StrategyTree", stock_code: str, amount: float, price: float | None = None
+    ) -> None:
+        """
+        持仓事件：node 的 stock_code 持仓变化 amount 股（买入为正）
+        price 用于更新账本中的最新价，缺省时沿用账本价格或从价格来源获取
+        """
+        row = self.rows[id(node)]
+        if price is not None:
+            self.on_prices([stock_code], [price])
+        elif stock_code not in self.prices:
+            self.prices[stock_code] = node._get_stock_price(stock_code)
+
+        positions = self.positions[row]
+        before = positions.get(stock_code, 0.0)
+        after = before + amount
+        if after > 0:
+            positions[stock_code] = after
+            self.holders.setdefault(stock_code, set()).add(row)
+        else:
+            positions.pop(stock_code, None)
+            self.holders.get(stock_code, set()).discard(row)
+        self.position_counts[row] += (after > 0) - (before > 0)
+
+        delta = np.zeros(4)
+        delta[STOCK] = (max(after, 0.0) - before) * self.prices[stock_code]
+        self._record(row, delta)
+
+    def on_cash(self, node: "StrategyTree", available: float = 0.0, pending: float = 0.0) -> None:
+        """现金事件：可用现金和待申购金额的变化量"""
+        delta = np.zeros(4)
+        delta[CASH] = available
+        delta[PENDING] = pending
+        self._record(self.rows[id(node)], delta)
+
+    def on_prices(self, stock_codes: list[str], prices: list[float] | np.ndarray) -> None:
+        """价格事件：只重估持有这些股票的节点"""
+        for stock_code, price in zip(stock_codes, np.asarray(prices).tolist(), strict=True):
+            change = price - self.prices.get(stock_code, price)
+            self.prices[stock_code] = price
+            if change == 0:
+                continue
+            for row in self.holders.get(stock_code, ()):
+                delta = np.zeros(4)
+                delta[STOCK] = self.positions[row][stock_code] * change
+                self._record(row, delta)
+
+    def sync_account(self, node: "StrategyTree") -> None:
+        """账户事件：重新读取单个节点的账户，按差额更新缓存"""
+        row = self.rows[id(node)]
+        account = node.virtual_account
+        codes, amounts = account.get_stock_arrays()
+
+        missing = [code for code in dict.fromkeys(codes) if code not in self.prices]
+        if missing:
+            self.prices.update(zip(missing, node._get_stock_prices(missing).tolist(), strict=True))
+
+        for code in self.positions[row]:
+            self.holders[code].discard(row)
+        positions: dict[str, float] = {}
+        for code, amount in zip(codes, amounts.tolist(), strict=True):
+            positions[code] = positions.get(code, 0.0) + amount
+            self.holders.setdefault(code, set()).add(row)
+        self.positions[row] = positions
+        self.position_counts[row] = len(account.stock_long_info)
+
+        current = np.array(
+            [
+                sum(amount * self.prices[code] for code, amount in positions.items()),
+                account.cash_info.available_cash,
+                account.cash_info.pending_purchase_amount,
+                futures_margin(node),
+            ]
+        )
+        self._record(row, current - self.own[row])
+
+    def flush(self) -> None:
+        """把脏叶子的差额推给祖先，先序号大的先处理，保证每个祖先只刷新一次"""
+        heap = [-row for row in self._dirty]
+        heapq.heapify(heap)
+        while heap:
+            row = -heapq.heappop(heap)
+            delta = self._dirty.pop(row)
+            self.aggregate[row] += delta
+            parent = self.parent[row]
+            if parent < 0:
+                continue
+            pending = self._dirty.get(parent)
+            if pending is None:
+                self._dirty[parent] = delta
+                heapq.heappush(heap, -parent)
+            else:
+                pending += delta
+
+    def summary(self, node: "StrategyTree") -> dict:
+        """与 StrategyTree.get_account_summary 相同结构的摘要"""
+        if self._dirty:
+            self.flush()
+        row = self.rows[id(node)]
+        is_root = node.weight == 1.0 and bool(node.children)
+        stock, cash, pending, margin = (self.aggregate if is_root else self.own)[row].tolist()
+        return account_summary(
+            node.name, self.position_counts[row], stock, cash, pending, margin, is_root
+        )
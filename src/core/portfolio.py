@@ -0,0 +1,524 @@
+"""
+组合构建
+
+按 BaseAlphaStrategy 的约束求解目标权重：
+    min  ½·λ·(w - b)ᵀΣ(w - b) - αᵀw
+    s.t. Σw = 1
+         max(0, b + bias_low) ≤ w ≤ min(max_weight, b + bias_high)，股票池外上限为 0
+         industry_down ≤ H(w - b) ≤ industry_up
+b 为基准权重，Σ 取特质波动率的对角阵，H 为行业哑变量，λ 为 risk_aversion。
+用 ADMM（OSQP 的迭代格式）求解：约束矩阵 A = [I; 1ᵀ; H]，
+线性方程组 λΣ + σI + ρAᵀA = 对角阵 + 低秩（全 1 向量和行业哑变量），用 Woodbury 公式求解，
+分解只依赖行情数据和 λ，按 (交易日, λ) 缓存，同一基准的叶子共用。
+换手约束在求解后处理：超过 turnover_rate 时在上一期权重和新解之间按比例插值，
+两者都满足其余约束时插值结果仍然可行；上一期权重不满足约束时不插值，约束优先于换手。
+各叶子的上一期解作为下一次求解的初值（warm start）。
+"""
+
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from collections.abc import Sequence
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import numpy as np
+from pydantic import BaseModel, ConfigDict, Field
+
+from src.entity.alpha import BaseAlphaStrategy, ConstraintModel, UniverseEnum
+
+if TYPE_CHECKING:
+    from src.entity.strategy import StrategyTree
+
+# 上一期权重可行性检查的容差，求解结果经预算投影后行业暴露的残差在这一量级
+FEASIBILITY_TOL = 1e-4
+
+# 板块类股票池按代码前缀过滤
+BOARD_PREFIXES: dict[str, tuple[str, ...]] = {
+    "科创板": ("688",),
+    "创业板": ("300", "301"),
+}
+
+
+class MarketData(BaseModel):
+    """一个交易日的股票行情数据：全体可投资股票及其行业、波动率、各指数成分权重"""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    codes: list[str] = Field(description="股票代码")
+    industries: list[str] = Field(description="行业，与 codes 对应")
+    volatility: np.ndarray = Field(description="日特质波动率")
+    index_weights: dict[str, np.ndarray] = Field(
+        default_factory=dict, description="指数代码 -> 与 codes 对齐的成分权重"
+    )
+
+    @cached_property
+    def industry_ids(self) -> tuple[np.ndarray, list[str]]:
+        """(各股票的行业下标, 行业名称)"""
+        names, ids = np.unique(np.asarray(self.industries, dtype=object), return_inverse=True)
+        return ids, names.tolist()
+
+    @cached_property
+    def rows(self) -> dict[str, int]:
+        return {code: row for row, code in enumerate(self.codes)}
+
+    def benchmark_weights(self, index_code: str) -> np.ndarray:
+        weights = self.index_weights.get(index_code)
+        if weights is None:
+            raise ValueError(f"行情数据中没有基准指数: {index_code}")
+        return weights / weights.sum()
+
+    def universe_mask(self, universe: UniverseEnum) -> np.ndarray:
+        """股票池内的股票；空股票池表示全部股票"""
+        if not universe.value:
+            return np.ones(len(self.codes), dtype=bool)
+
+        codes = np.asarray(self.codes, dtype=str)
+        mask = np.zeros(len(self.codes), dtype=bool)
+        for name in universe.value:
+            excluded = name.startswith("非") and name[1:] in BOARD_PREFIXES
+            board = name[1:] if excluded else name
+            if board in BOARD_PREFIXES:
+                on_board = np.char.startswith(codes[:, None], BOARD_PREFIXES[board]).any(axis=1)
+                mask |= ~on_board if excluded else on_board
+            elif name in self.index_weights:
+                mask |= self.index_weights[name] > 0
+            else:
+                raise ValueError(f"行情数据中没有股票池: {name}")
+        return mask
+
+
+class MarketDataProvider(ABC):
+    """行情数据来源接口"""
+
+    @abstractmethod
+    def get_market_data(self, trade_date: str) -> MarketData:
+        """某交易日的行情数据"""
+
+
+class StaticMarketDataProvider(MarketDataProvider):
+    """固定行情数据，所有交易日相同"""
+
+    def __init__(self, data: MarketData) -> None:
+        self.data = data
+
+    def get_market_data(self, trade_date: str) -> MarketData:  # noqa: ARG002
+        return self.data
+
+
+class FileMarketDataProvider(MarketDataProvider):
+    """
+    本地行情数据文件
+    文件为 parquet 或 csv，包含 trade_date, code, industry, volatility, index_code, weight 六列，
+    每行为一只股票在一个指数中的成分权重；不属于任何指数的股票 index_code 为空
+    """
+
+    def __init__(self, path: str | Path) -> None:
+        import polars as pl  # noqa: PLC0415
+
+        path = Path(path)
+        frame = pl.read_parquet(path) if path.suffix == ".parquet" else pl.read_csv(path)
+        self._frames = {
+            trade_date: group
+            for (trade_date,), group in frame.with_columns(
+                pl.col("trade_date").cast(pl.Utf8).str.slice(0, 10),
+                pl.col("index_code").cast(pl.Utf8).fill_null(""),
+            ).group_by("trade_date")
+        }
+
+    def get_market_data(self, trade_date: str) -> MarketData:
+        import polars as pl  # noqa: PLC0415
+
+        frame = self._frames.get(trade_date)
+        if frame is None:
+            raise ValueError(f"行情数据文件中没有交易日: {trade_date}")
+        stocks = frame.group_by("code", maintain_order=True).agg(
+            pl.col("industry").first(), pl.col("volatility").first()
+        )
+        codes = stocks["code"].to_list()
+        rows = {code: row for row, code in enumerate(codes)}
+        index_weights: dict[str, np.ndarray] = {}
+        for (index_code,), group in frame.filter(pl.col("index_code") != "").group_by("index_code"):
+            weights = np.zeros(len(codes))
+            weights[[rows[code] for code in group["code"]]] = group["weight"].to_numpy()
+            index_weights[index_code] = weights
+        return MarketData(
+            codes=codes,
+            industries=stocks["industry"].cast(pl.Utf8).to_list(),
+            volatility=stocks["volatility"].to_numpy().astype(np.float64),
+            index_weights=index_weights,
+        )
+
+
+class PortfolioSolution(BaseModel):
+    """一个策略的目标权重"""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    codes: list[str] = Field(description="股票代码，与行情数据一致")
+    weights: np.ndarray = Field(description="目标权重")
+    iterations: int = Field(description="迭代次数")
+    converged: bool = Field(description="是否在容差内收敛")
+    turnover: float = Field(description="相对上一期权重的单边换手")
+
+    def to_dict(self, threshold: float = 1e-6) -> dict[str, float]:
+        """权重大于阈值的股票，重新归一化"""
+        held = np.flatnonzero(self.weights > threshold)
+        weights = self.weights[held] / self.weights[held].sum()
+        return dict(zip([self.codes[i] for i in held], weights.tolist(), strict=True))
+
+
+class PortfolioProblem(BaseModel):
+    """一个待求解的策略"""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    key: str = Field(description="warm start 的键，通常为叶子名称")
+    strategy: BaseAlphaStrategy = Field(description="alpha 策略及约束")
+    codes: list[str] = Field(description="alpha 的股票代码")
+    alpha: np.ndarray = Field(description="alpha 值")
+    previous: dict[str, float] | None = Field(
+        default=None, description="当前持仓权重，缺省使用该键上一次的解"
+    )
+
+
+def _project_budget(x: np.ndarray, lower: np.ndarray, upper: np.ndarray) -> np.ndarray:
+    """投影到 {lower ≤ w ≤ upper, Σw = 1}：二分平移量 τ 使 clip(x - τ) 之和为 1"""
+    low, high = float((x - upper).min()), float((x - lower).max())
+    for _ in range(100):
+        shift = 0.5 * (low + high)
+        if np.clip(x - shift, lower, upper).sum() > 1.0:
+            low = shift
+        else:
+            high = shift
+    return np.clip(x - 0.5 * (low + high), lower, upper)
+
+
+class _KktFactor:
+    """
+    线性方程组 λΣ + σI + ρAᵀA = D + ρUUᵀ 的 Woodbury 分解
+    D 为对角阵，U = [1, H]；行业哑变量互斥，UᵀD⁻¹U 为箭头矩阵
+    """
+
+    def __init__(
+        self, diagonal: np.ndarray, industry_ids: np.ndarray, num_industries: int, rho: float
+    ) -> None:
+        self.industry_ids = industry_ids
+        self.num_industries = num_industries
+        self.inv_diagonal = 1.0 / diagonal
+        groups = np.bincount(industry_ids, self.inv_diagonal, num_industries)
+        capacitance = np.diag(np.concatenate([[self.inv_diagonal.sum()], groups]))
+        capacitance[0, 1:] = capacitance[1:, 0] = groups
+        self.inv_capacitance = np.linalg.inv(capacitance + np.eye(num_industries + 1) / rho)
+
+    def solve(self, rhs: np.ndarray) -> np.ndarray:
+        scaled = rhs * self.inv_diagonal
+        coefficients = self.inv_capacitance @ np.concatenate(
+            [[scaled.sum()], np.bincount(self.industry_ids, scaled, self.num_industries)]
+        )
+        return scaled - self.inv_diagonal * (coefficients[0] + coefficients[1:][self.industry_ids])
+
+
+class PortfolioOptimizer:
+    """
+    约束下的目标权重求解
+    rho, sigma, relaxation: ADMM 步长、正则项和松弛系数
+    tol: 约束残差容差；dual_tol: 相对对偶残差容差
+    max_workers: solve_many 的线程数
+    max_days: 行情数据和分解缓存保留的交易日数
+    """
+
+    def __init__(  # noqa: PLR0913
+        self,
+        provider: MarketDataProvider,
+        *,
+        rho: float = 0.1,
+        sigma: float = 1e-6,
+        relaxation: float = 1.6,
+        max_iter: int = 4000,
+        tol: float = 1e-6,
+        dual_tol: float = 1e-3,
+        max_workers: int | None = None,
+        max_days: int = 5,
+    ) -> None:
+        self.provider = provider
+        self.rho = rho
+        self.sigma = sigma
+        self.relaxation = relaxation
+        self.max_iter = max_iter
+        self.tol = tol
+        self.dual_tol = dual_tol
+        self.max_workers = max_workers
+        self.max_days = max_days
+        self._lock = threading.Lock()
+        self._data: OrderedDict[str, MarketData] = OrderedDict()
+        self._factors: dict[tuple[str, float], _KktFactor] = {}
+        # 键 -> (股票代码, ADMM 状态 x, y, 上一次的目标权重)
+        self._warm: dict[str, tuple[list[str], np.ndarray, np.ndarray, np.ndarray]] = {}
+
+    def market_data(self, trade_date: str) -> MarketData:
+        """按交易日缓存的行情数据"""
+        with self._lock:
+            data = self._data.get(trade_date)
+            if data is None:
+                data = self._data[trade_date] = self.provider.get_market_data(trade_date)
+                while len(self._data) > self.max_days:
+                    expired, _ = self._data.popitem(last=False)
+                    self._factors = {k: v for k, v in self._factors.items() if k[0] != expired}
+            self._data.move_to_end(trade_date)
+            return data
+
+    def _factor(
+        self, trade_date: str, data: MarketData, risk: np.ndarray, risk_aversion: float
+    ) -> _KktFactor:
+        with self._lock:
+            factor = self._factors.get((trade_date, risk_aversion))
+            if factor is None:
+                industry_ids, names = data.industry_ids
+                factor = _KktFactor(
+                    risk + self.sigma + self.rho, industry_ids, len(names), self.rho
+                )
+                self._factors[(trade_date, risk_aversion)] = factor
+            return factor
+
+    def solve(
+        self,
+        strategy: BaseAlphaStrategy,
+        codes: Sequence[str],
+        alpha: np.ndarray,
+        trade_date: str,
+        previous: dict[str, float] | None = None,
+        key: str | None = None,
+    ) -> PortfolioSolution:
+        """
+        求解一个策略的目标权重
+        codes, alpha: 当天 alpha，不在行情数据中的代码忽略
+        previous: 当前持仓权重，用于换手约束；缺省使用 key 上一次的解
+        """
+        key = key or strategy.alpha_name
+        data = self.market_data(trade_date)
+        constraints = strategy.constraints
+        rows = data.rows
+        industry_ids, industry_names = data.industry_ids
+        num_industries = len(industry_names)
+
+        alpha_vector = np.zeros(len(data.codes))
+        known = [
+            (rows[code], value)
+            for code, value in zip(codes, np.asarray(alpha).tolist(), strict=True)
+            if code in rows
+        ]
+        if known:
+            index, values = zip(*known, strict=True)
+            alpha_vector[list(index)] = np.nan_to_num(values)
+
+        benchmark = data.benchmark_weights(constraints.benchmark.value)
+        lower, upper = self._bounds(data, constraints, benchmark)
+        exposure = np.bincount(industry_ids, benchmark, num_industries)
+        low = np.concatenate([lower, [1.0], exposure + constraints.industry_down_limit])
+        high = np.concatenate([upper, [1.0], exposure + constraints.industry_up_limit])
+
+        risk = constraints.risk_aversion * data.volatility**2
+        factor = self._factor(trade_date, data, risk, constraints.risk_aversion)
+        q = -alpha_vector - risk * benchmark
+
+        warm = self._warm.get(key)
+        x, y = self._initial_state(data, warm, benchmark, lower, upper)
+        x, y, iterations, converged = self._admm(factor, risk, q, low, high, x, y)
+        weights = _project_budget(x, lower, upper)
+
+        if previous is not None:
+            last = np.zeros(len(data.codes))
+            for code, weight in previous.items():
+                if code in rows:
+                    last[rows[code]] = weight
+        elif warm is not None:
+            last = self._align(data, warm[0], warm[3])
+        else:
+            last = None
+
+        turnover = 0.0
+        if last is not None and last.sum() > 0:
+            last = last / last.sum()
+            turnover = 0.5 * float(np.abs(weights - last).sum())
+            if turnover > constraints.turnover_rate and self._feasible(last, low, high, data):
+                weights = last + (weights - last) * (constraints.turnover_rate / turnover)
+                turnover = constraints.turnover_rate
+
+        self._warm[key] = (data.codes, x, y, weights)
+        return PortfolioSolution(
+            codes=data.codes,
+            weights=weights,
+            iterations=iterations,
+            converged=converged,
+            turnover=turnover,
+        )
+
+    @staticmethod
+    def _bounds(
+        data: MarketData, constraints: ConstraintModel, benchmark: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """单股权重上下限：[0, max_weight] 与基准偏离范围取交集，股票池外为 0"""
+        lower = np.zeros(len(data.codes))
+        upper = np.full(len(data.codes), constraints.max_weight)
+        if constraints.weight_bias:
+            bias_low, bias_high = constraints.weight_bias
+            lower = np.maximum(lower, benchmark + bias_low)
+            upper = np.minimum(upper, benchmark + bias_high)
+        upper[~data.universe_mask(constraints.universe)] = 0.0
+        return np.minimum(lower, upper), upper
+
+    @staticmethod
+    def _feasible(weights: np.ndarray, low: np.ndarray, high: np.ndarray, data: MarketData) -> bool:
+        """权重是否在容差内满足单股上下限、预算和行业暴露约束"""
+        industry_ids, names = data.industry_ids
+        values = np.concatenate(
+            [weights, [weights.sum()], np.bincount(industry_ids, weights, len(names))]
+        )
+        return bool(
+            np.all(values >= low - FEASIBILITY_TOL) and np.all(values <= high + FEASIBILITY_TOL)
+        )
+
+    @staticmethod
+    def _align(data: MarketData, codes: list[str], values: np.ndarray) -> np.ndarray:
+        """把按 codes 排列的向量对齐到当天的行情数据"""
+        if codes is data.codes:
+            return values
+        aligned = np.zeros(len(data.codes))
+        rows = data.rows
+        for code, value in zip(codes, values.tolist(), strict=True):
+            if code in rows:
+                aligned[rows[code]] = value
+        return aligned
+
+    def _initial_state(
+        self,
+        data: MarketData,
+        warm: tuple[list[str], np.ndarray, np.ndarray, np.ndarray] | None,
+        benchmark: np.ndarray,
+        lower: np.ndarray,
+        upper: np.ndarray,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """上一次的解作为初值；股票集合相同时连同对偶变量一起复用"""
+        if warm is None:
+            return np.clip(benchmark, lower, upper), np.zeros(
+                len(data.codes) + 1 + len(data.industry_ids[1])
+            )
+        codes, x, y, _ = warm
+        if codes is data.codes:
+            return x.copy(), y.copy()
+        return self._align(data, codes, x), np.zeros(
+            len(data.codes) + 1 + len(data.industry_ids[1])
+        )
+
+    def _admm(
+        self,
+        factor: _KktFactor,
+        risk: np.ndarray,
+        q: np.ndarray,
+        low: np.ndarray,
+        high: np.ndarray,
+        x: np.ndarray,
+        y: np.ndarray,
+    ) -> tuple[np.ndarray, np.ndarray, int, bool]:
+        """ADMM 迭代，返回 (x, y, 迭代次数, 是否收敛)"""
+        industry_ids, num_industries = factor.industry_ids, factor.num_industries
+        size = len(x)
+
+        def constrain(values: np.ndarray) -> np.ndarray:
+            # A·values，A = [I; 1ᵀ; H]
+            return np.concatenate(
+                [values, [values.sum()], np.bincount(industry_ids, values, num_industries)]
+            )
+
+        def transpose(values: np.ndarray) -> np.ndarray:
+            # Aᵀ·values
+            return values[:size] + values[size] + values[size + 1 :][industry_ids]
+
+        rho, sigma, relaxation = self.rho, self.sigma, self.relaxation
+        z = np.clip(constrain(x), low, high)
+        iteration = 0
+        for iteration in range(1, self.max_iter + 1):
+            x_tilde = factor.solve(sigma * x - q + transpose(rho * z - y))
+            z_relaxed = relaxation * constrain(x_tilde) + (1 - relaxation) * z
+            x = relaxation * x_tilde + (1 - relaxation) * x
+            z_next = np.clip(z_relaxed + y / rho, low, high)
+            y = y + rho * (z_relaxed - z_next)
+            z = z_next
+
+            if iteration % 10 == 0:
+                primal = np.abs(constrain(x) - z).max()
+                gradient = risk * x + q
+                dual_term = transpose(y)
+                dual = np.abs(gradient + dual_term).max()
+                scale = max(np.abs(gradient).max(), np.abs(dual_term).max(), 1e-12)
+                if primal <= self.tol and dual <= self.dual_tol * scale:
+                    return x, y, iteration, True
+        return x, y, iteration, False
+
+    def solve_many(
+        self, problems: Sequence[PortfolioProblem], trade_date: str
+    ) -> list[PortfolioSolution]:
+        """多个策略并行求解，行情数据和分解在线程间共享"""
+        self.market_data(trade_date)
+        with ThreadPoolExecutor(self.max_workers) as pool:
+            return list(
+                pool.map(
+                    lambda problem: self.solve(
+                        problem.strategy,
+                        problem.codes,
+                        problem.alpha,
+                        trade_date,
+                        problem.previous,
+                        problem.key,
+                    ),
+                    problems,
+                )
+            )
+
+    def solve_tree(
+        self,
+        root: "StrategyTree",
+        alphas: dict[str, tuple[list[str], np.ndarray]],
+        trade_date: str,
+        strategies: dict[str, BaseAlphaStrategy] | None = None,
+    ) -> dict[str, dict[str, float]]:
+        """
+        求解整棵树所有 alpha 叶子的目标权重，返回可直接用于 rebalance_positions 的配置
+        alphas: alpha_name -> (股票代码, alpha 值)
+        strategies: 叶子名称 -> 策略，缺省读取叶子 strategy_info["alpha_strategy"]
+        当前持有但不在目标中的股票权重为 0，调仓时卖出
+        """
+        strategies = strategies or {}
+        leaves: list[StrategyTree] = []
+        problems: list[PortfolioProblem] = []
+        for leaf in root.tree_index.leaves(root):
+            strategy = strategies.get(leaf.name) or leaf.strategy_info.get("alpha_strategy")
+            if strategy is None:
+                continue
+            strategy = BaseAlphaStrategy.model_validate(strategy)
+            if strategy.alpha_name not in alphas:
+                continue
+            codes, alpha = alphas[strategy.alpha_name]
+            leaves.append(leaf)
+            problems.append(
+                PortfolioProblem(
+                    key=leaf.name,
+                    strategy=strategy,
+                    codes=list(codes),
+                    alpha=np.asarray(alpha, dtype=np.float64),
+                    previous=leaf._calculate_current_allocations(),
+                )
+            )
+
+        allocations: dict[str, dict[str, float]] = {}
+        for leaf, problem, solution in zip(
+            leaves, problems, self.solve_many(problems, trade_date), strict=True
+        ):
+            allocations[leaf.name] = {
+                **dict.fromkeys(problem.previous or {}, 0.0),
+                **solution.to_dict(),
+            }
+        return allocations
@@ -0,0 +1,254 @@
+"""
+股票价格来源
+
+PriceProvider 统一提供批量取价接口 get_prices(codes, timestamp)，
+策略树、交易优化器和交易系统都通过它取价：
+- StaticPriceProvider: 固定价格表（默认，兼容原有模拟价格）
+- FilePriceProvider: 本地快照文件回放，用于测试和复盘
+- SnapshotPriceProvider: 通过 virgo 快照批量取价
+- CachedPriceProvider: 为任意来源加上按 (code, timestamp) 缓存的 LRU/TTL 报价缓存
+"""
+
+import bisect
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from collections.abc import Callable, Sequence
+from pathlib import Path
+
+import numpy as np
+
+# 模拟价格表
+DEFAULT_STOCK_PRICES: dict[str, float] = {
+    # 沪深300成分股
+    "000001.SZ": 15.20,  # 平安银行
+    "000002.SZ": 8.45,  # 万科A
+    "000858.SZ": 185.60,  # 五粮液
+    "600519.SH": 1580.00,  # 贵州茅台
+    "600036.SH": 42.80,  # 招商银行
+    "000066.SZ": 12.30,  # 中国长城
+    "600276.SH": 58.90,  # 恒瑞医药
+    # 中证500成分股
+    "002415.SZ": 28.50,  # 海康威视
+    "002594.SZ": 245.80,  # 比亚迪
+    "300059.SZ": 13.45,  # 东方财富
+    "300750.SZ": 185.20,  # 宁德时代
+    "002230.SZ": 45.60,  # 科大讯飞
+    "300888.SZ": 125.40,  # 康希诺
+    # 中证1000成分股
+    "688111.SH": 280.50,  # 金山办公
+    "688599.SH": 45.80,  # 天合光能
+    "300347.SZ": 58.90,  # 泰格医药
+    "300015.SZ": 22.40,  # 爱尔眼科
+    "300253.SZ": 18.70,  # 卫宁健康
+    "300142.SZ": 35.20,  # 沃森生物
+}
+
+DEFAULT_PRICE = 50.0
+
+
+class PriceProvider(ABC):
+    """价格来源接口"""
+
+    @abstractmethod
+    def get_prices(self, codes: Sequence[str], timestamp: str | None = None) -> np.ndarray:
+        """
+        批量取价
+        codes: 股票代码
+        timestamp: 报价时间 "YYYY-MM-DD HH:MM:SS"，None 表示最新
+        返回与 codes 一一对应的价格数组
+        """
+
+    def get_price(self, code: str, timestamp: str | None = None) -> float:
+        return float(self.get_prices([code], timestamp)[0])
+
+
+class StaticPriceProvider(PriceProvider):
+    """固定价格表，未知代码返回默认价格"""
+
+    def __init__(
+        self, prices: dict[str, float] | None = None, default_price: float = DEFAULT_PRICE
+    ) -> None:
+        self.prices = dict(DEFAULT_STOCK_PRICES if prices is None else prices)
+        self.default_price = default_price
+
+    def get_prices(self, codes: Sequence[str], timestamp: str | None = None) -> np.ndarray:  # noqa: ARG002
+        lookup = self.prices.get
+        default = self.default_price
+        return np.fromiter((lookup(code, default) for code in codes), np.float64, len(codes))
+
+
+class FilePriceProvider(PriceProvider):
+    """
+    本地快照回放
+    文件为 parquet 或 csv，包含 stock_code, timestamp, price 三列，代码列名可由 code_column 指定；
+    取价时使用不晚于 timestamp 的最近一次快照
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        default_price: float = DEFAULT_PRICE,
+        code_column: str = "stock_code",
+    ) -> None:
+        import polars as pl  # noqa: PLC0415
+
+        path = Path(path)
+        frame = pl.read_parquet(path) if path.suffix == ".parquet" else pl.read_csv(path)
+        frame = frame.select(
+            pl.col(code_column).cast(pl.Utf8).alias("stock_code"),
+            pl.col("timestamp").cast(pl.Utf8),
+            pl.col("price").cast(pl.Float64),
+        ).sort("timestamp")
+
+        self.default_price = default_price
+        self._snapshots: dict[str, dict[str, float]] = {}
+        for (timestamp,), group in frame.group_by("timestamp", maintain_order=True):
+            self._snapshots[timestamp] = dict(
+                zip(group["stock_code"].to_list(), group["price"].to_list(), strict=True)
+            )
+        self._timestamps = list(self._snapshots)
+
+    @property
+    def timestamps(self) -> list[str]:
+        return list(self._timestamps)
+
+    def _snapshot_at(self, timestamp: str | None) -> dict[str, float]:
+        if not self._timestamps:
+            return {}
+        if timestamp is None:
+            return self._snapshots[self._timestamps[-1]]
+
+        pos = bisect.bisect_right(self._timestamps, timestamp)
+        return self._snapshots[self._timestamps[pos - 1]] if pos else {}
+
+    def get_prices(self, codes: Sequence[str], timestamp: str | None = None) -> np.ndarray:
+        snapshot = self._snapshot_at(timestamp)
+        default = self.default_price
+        return np.fromiter((snapshot.get(code, default) for code in codes), np.float64, len(codes))
+
+
+class SnapshotPriceProvider(PriceProvider):
+    """
+    通过 virgo 行情快照批量取价
+    代码按 batch_size 分批请求，缺失代码使用默认价格
+    """
+
+    def __init__(
+        self,
+        batch_size: int = 1000,
+        code_column: str = "code",
+        price_column: str = "last_price",
+        default_price: float = DEFAULT_PRICE,
+    ) -> None:
+        self.batch_size = batch_size
+        self.code_column = code_column
+        self.price_column = price_column
+        self.default_price = default_price
+
+    def get_prices(self, codes: Sequence[str], timestamp: str | None = None) -> np.ndarray:
+        # virgo 在导入时初始化连接，延迟到首次取价
+        from src.proxy.alpha import get_stock_snapshots  # noqa: PLC0415
+
+        if timestamp is None:
+            timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
+        date, snapshot_time = timestamp.split(" ")
+
+        quotes: dict[str, float] = {}
+        for start in range(0, len(codes), self.batch_size):
+            batch = list(codes[start : start + self.batch_size])
+            frame = get_stock_snapshots(batch, date=date, snapshot_time=snapshot_time)
+            quotes.update(
+                zip(
+                    frame[self.code_column].tolist(),
+                    frame[self.price_column].tolist(),
+                    strict=True,
+                )
+            )
+
+        default = self.default_price
+        return np.fromiter((quotes.get(code, default) for code in codes), np.float64, len(codes))
+
+
+class QuoteCache:
+    """按 (code, timestamp) 缓存报价，超过 ttl 秒过期，超过 maxsize 按 LRU 淘汰"""
+
+    def __init__(
+        self,
+        maxsize: int = 100_000,
+        ttl: float = 60.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._entries: OrderedDict[tuple[str, str | None], tuple[float, float]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_many(self, codes: Sequence[str], timestamp: str | None) -> tuple[np.ndarray, list[int]]:
+        """返回 (价格数组, 未命中的下标)，未命中位置价格为 nan"""
+        now = self._clock()
+        prices = np.full(len(codes), np.nan)
+        missing: list[int] = []
+
+        for i, code in enumerate(codes):
+            key = (code, timestamp)
+            entry = self._entries.get(key)
+            if entry is None or now - entry[1] > self.ttl:
+                if entry is not None:
+                    del self._entries[key]
+                missing.append(i)
+                continue
+
+            self._entries.move_to_end(key)
+            prices[i] = entry[0]
+
+        return prices, missing
+
+    def put_many(self, codes: Sequence[str], timestamp: str | None, prices: np.ndarray) -> None:
+        now = self._clock()
+        for code, price in zip(codes, prices.tolist(), strict=True):
+            key = (code, timestamp)
+            self._entries[key] = (price, now)
+            self._entries.move_to_end(key)
+
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+class CachedPriceProvider(PriceProvider):
+    """为价格来源加上报价缓存，未命中的代码合并为一次批量请求"""
+
+    def __init__(self, source: PriceProvider, cache: QuoteCache | None = None) -> None:
+        self.source = source
+        self.cache = cache or QuoteCache()
+
+    def get_prices(self, codes: Sequence[str], timestamp: str | None = None) -> np.ndarray:
+        prices, missing = self.cache.get_many(codes, timestamp)
+        if missing:
+            missing_codes = [codes[i] for i in missing]
+            fetched = self.source.get_prices(missing_codes, timestamp)
+            prices[missing] = fetched
+            self.cache.put_many(missing_codes, timestamp, fetched)
+        return prices
+
+
+# 全局默认价格来源
+_price_provider: PriceProvider = StaticPriceProvider()
+
+
+def get_price_provider() -> PriceProvider:
+    return _price_provider
+
+
+def set_price_provider(provider: PriceProvider) -> PriceProvider:
+    """替换全局价格来源，返回原来的来源便于恢复"""
+    global _price_provider  # noqa: PLW0603
+    previous = _price_provider
+    _price_provider = provider
+    return previous
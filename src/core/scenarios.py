@@ -0,0 +1,274 @@
+"""
+多情景并行模拟
+
+一组情景 = TradingSystem 参数（成交率、滑点）× 策略树权重变体，每个情景跑一次逐日回测。
+基础策略树只序列化一次，作为进程池初始化参数发给每个工作进程；
+价格面板（交易日 × 股票）放进共享内存，工作进程直接映射，不随任务复制。
+各情景的净值路径汇总为一个 交易日 × 情景 的列式结果。
+"""
+
+import bisect
+import itertools
+import multiprocessing
+import os
+from collections.abc import Sequence
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import TYPE_CHECKING, Any
+
+import numpy as np
+from pydantic import BaseModel, ConfigDict, Field
+
+from .backtest import CLOSE_TIME, AlphaSource, BacktestEngine
+from .price import DEFAULT_PRICE, PriceProvider
+from .trading_calendar import TradingCalendar, get_trading_calendar
+
+if TYPE_CHECKING:
+    import polars as pl
+
+    from src.entity.strategy import StrategyTree
+
+
+class PanelPriceProvider(PriceProvider):
+    """
+    日收盘价面板
+    prices 为 交易日 × 股票 的矩阵；取价时使用不晚于 timestamp 所在日的最近一行，
+    未知代码返回默认价格
+    """
+
+    def __init__(
+        self,
+        dates: Sequence[str],
+        codes: Sequence[str],
+        prices: np.ndarray,
+        default_price: float = DEFAULT_PRICE,
+    ) -> None:
+        self.dates = list(dates)
+        self.codes = list(codes)
+        self.prices = prices
+        if prices.shape != (len(self.dates), len(self.codes)):
+            raise ValueError(
+                f"价格矩阵形状须为 {(len(self.dates), len(self.codes))}: {prices.shape}"
+            )
+        self.default_price = default_price
+        self._columns = {code: column for column, code in enumerate(self.codes)}
+
+    @classmethod
+    def from_provider(
+        cls,
+        source: PriceProvider,
+        codes: Sequence[str],
+        dates: Sequence[str],
+        close_time: str = CLOSE_TIME,
+    ) -> "PanelPriceProvider":
+        """从任意价格来源逐日取收盘价构建面板"""
+        codes = list(codes)
+        prices = np.array([source.get_prices(codes, f"{day} {close_time}") for day in dates])
+        return cls(dates, codes, prices.reshape(len(dates), len(codes)))
+
+    def get_prices(self, codes: Sequence[str], timestamp: str | None = None) -> np.ndarray:
+        if timestamp is None:
+            row = len(self.dates) - 1
+        else:
+            row = bisect.bisect_right(self.dates, timestamp[:10]) - 1
+        if row < 0:
+            return np.full(len(codes), self.default_price)
+
+        columns = np.fromiter((self._columns.get(code, -1) for code in codes), np.int64, len(codes))
+        return np.where(columns >= 0, self.prices[row, columns], self.default_price)
+
+
+class Scenario(BaseModel):
+    """一个模拟情景"""
+
+    name: str = Field(description="情景名称")
+    execution_rate: float = Field(default=0.8, description="平均成交率")
+    slippage_rate: float = Field(default=0.001, description="滑点率")
+    weights: dict[str, float] = Field(
+        default_factory=dict, description="节点名称 -> 覆盖的权重，为空表示使用基础策略树"
+    )
+
+
+def scenario_grid(
+    execution_rates: Sequence[float],
+    slippage_rates: Sequence[float],
+    weight_variants: dict[str, dict[str, float]] | None = None,
+) -> list[Scenario]:
+    """成交率 × 滑点 × 权重变体 的全组合"""
+    variants = weight_variants or {"base": {}}
+    return [
+        Scenario(
+            name=f"{variant}|exec={execution_rate}|slip={slippage_rate}",
+            execution_rate=execution_rate,
+            slippage_rate=slippage_rate,
+            weights=weights,
+        )
+        for (variant, weights), execution_rate, slippage_rate in itertools.product(
+            variants.items(), execution_rates, slippage_rates
+        )
+    ]
+
+
+class ScenarioResult(BaseModel):
+    """多情景净值，矩阵行为交易日、列为情景"""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    dates: list[str] = Field(description="交易日")
+    names: list[str] = Field(description="情景名称")
+    nav: np.ndarray = Field(description="交易日 × 情景 的根节点总资产")
+    turnover: np.ndarray = Field(description="交易日 × 情景 的股票成交金额")
+
+    def to_frame(self) -> "pl.DataFrame":
+        """宽表：trade_date 列加每个情景一列净值"""
+        import polars as pl  # noqa: PLC0415
+
+        return pl.DataFrame(
+            {"trade_date": self.dates, **dict(zip(self.names, self.nav.T, strict=True))}
+        )
+
+
+class _ScenarioWorker:
+    """在工作进程内反序列化基础策略树并逐个运行情景"""
+
+    def __init__(self, payload: dict[str, Any], prices: PanelPriceProvider) -> None:
+        self.payload = payload
+        self.prices = prices
+        self.calendar = TradingCalendar(payload["holidays"])
+
+    def run(self, scenario: Scenario) -> tuple[np.ndarray, np.ndarray]:
+        from src.entity.strategy import StrategyTree, TradingSystem  # noqa: PLC0415
+
+        payload = self.payload
+        tree = StrategyTree.model_validate_json(payload["tree"])
+        if scenario.weights:
+            nodes = tree.tree_index.by_name
+            for name, weight in scenario.weights.items():
+                if name not in nodes:
+                    raise ValueError(f"情景 {scenario.name} 中的节点不存在: {name}")
+                nodes[name].weight = weight
+            tree.validate_weights()
+        if payload["initial_capital"]:
+            tree.process_subscription(payload["initial_capital"])
+
+        engine = BacktestEngine(
+            tree,
+            payload["alpha_source"],
+            self.prices,
+            self.calendar,
+            trading_system=TradingSystem(
+                execution_rate=scenario.execution_rate, slippage_rate=scenario.slippage_rate
+            ),
+            **payload["options"],
+        )
+        result = engine.run(payload["start"], payload["end"], resume=False)
+        return result.nav, result.turnover
+
+
+# 各情景会并发写同一个检查点文件，情景运行中不允许设置
+_CHECKPOINT_OPTIONS = {"checkpoint_path", "checkpoint_every"}
+
+# 工作进程内的状态，由进程池初始化函数设置
+_worker: _ScenarioWorker | None = None
+_worker_memory: shared_memory.SharedMemory | None = None
+
+
+def _init_worker(payload: dict[str, Any], memory_name: str, shape: tuple[int, int]) -> None:
+    """映射共享内存中的价格面板，保留引用直到进程退出"""
+    global _worker, _worker_memory  # noqa: PLW0603
+    _worker_memory = shared_memory.SharedMemory(name=memory_name)
+    prices = np.ndarray(shape, dtype=np.float64, buffer=_worker_memory.buf)
+    panel = PanelPriceProvider(payload["dates"], payload["codes"], prices, payload["default_price"])
+    _worker = _ScenarioWorker(payload, panel)
+
+
+def _run_in_worker(scenario: Scenario) -> tuple[np.ndarray, np.ndarray]:
+    return _worker.run(scenario)
+
+
+class ScenarioRunner:
+    """
+    多情景并行运行器
+    initial_capital: 每个情景在应用权重变体后向根节点申购的金额，基础策略树应为空仓
+    max_workers: 进程数，1 表示在当前进程内顺序运行
+    backtest_options: 传给 BacktestEngine 的其他参数（top_n、hedge、close_time 等）；
+    各情景并发运行且不续跑，不支持检查点参数
+    """
+
+    def __init__(
+        self,
+        tree: "StrategyTree",
+        alpha_source: AlphaSource,
+        prices: PanelPriceProvider,
+        calendar: TradingCalendar | None = None,
+        initial_capital: float = 0.0,
+        max_workers: int | None = None,
+        **backtest_options: Any,
+    ) -> None:
+        unsupported = sorted(set(backtest_options) & _CHECKPOINT_OPTIONS)
+        if unsupported:
+            raise ValueError(f"情景运行不支持检查点参数: {', '.join(unsupported)}")
+        self.tree_json = tree.model_dump_json()
+        self.alpha_source = alpha_source
+        self.prices = prices
+        self.calendar = calendar or get_trading_calendar()
+        self.initial_capital = initial_capital
+        self.max_workers = max_workers
+        self.backtest_options = backtest_options
+
+    def run(self, scenarios: Sequence[Scenario], start: str, end: str) -> ScenarioResult:
+        names = [scenario.name for scenario in scenarios]
+        if len(set(names)) != len(names):
+            raise ValueError("情景名称不能重复")
+
+        payload = {
+            "tree": self.tree_json,
+            "alpha_source": self.alpha_source,
+            "holidays": [str(day) for day in self.calendar.holidays.tolist()],
+            "initial_capital": self.initial_capital,
+            "options": self.backtest_options,
+            "start": start,
+            "end": end,
+            "dates": self.prices.dates,
+            "codes": self.prices.codes,
+            "default_price": self.prices.default_price,
+        }
+        dates = [str(day) for day in self.calendar.trading_days(start, end).tolist()]
+        if not scenarios:
+            empty = np.empty((len(dates), 0))
+            return ScenarioResult(dates=dates, names=[], nav=empty, turnover=empty.copy())
+
+        if self.max_workers == 1:
+            worker = _ScenarioWorker(payload, self.prices)
+            paths = [worker.run(scenario) for scenario in scenarios]
+        else:
+            paths = self._run_pool(payload, scenarios)
+
+        return ScenarioResult(
+            dates=dates,
+            names=names,
+            nav=np.array([nav for nav, _ in paths]).reshape(len(paths), len(dates)).T,
+            turnover=np.array([turnover for _, turnover in paths]).reshape(len(paths), -1).T,
+        )
+
+    def _run_pool(
+        self, payload: dict[str, Any], scenarios: Sequence[Scenario]
+    ) -> list[tuple[np.ndarray, np.ndarray]]:
+        """价格面板复制到共享内存一次，情景分块分发到进程池"""
+        workers = self.max_workers or os.cpu_count() or 1
+        source = np.ascontiguousarray(self.prices.prices, dtype=np.float64)
+        memory = shared_memory.SharedMemory(create=True, size=max(source.nbytes, 1))
+        try:
+            np.ndarray(source.shape, dtype=np.float64, buffer=memory.buf)[:] = source
+            with ProcessPoolExecutor(
+                self.max_workers,
+                # 父进程可能已有 polars 线程池，用 spawn 避免 fork 后死锁
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(payload, memory.name, source.shape),
+            ) as pool:
+                chunksize = max(1, len(scenarios) // (workers * 4))
+                return list(pool.map(_run_in_worker, scenarios, chunksize=chunksize))
+        finally:
+            memory.close()
+            memory.unlink()
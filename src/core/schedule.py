@@ -0,0 +1,199 @@
+"""
+日内拆单调度
+
+把母单按 TWAP 或 VWAP 曲线拆成交易时段内的时间片：
+时间片为从开盘起每 slice_minutes 个交易分钟一个（午休不计，14:57 截止），
+交易分钟序号与 "HH:MM:SS" 之间用交易日历一次换算。
+所有母单的拆分比例一次算成 母单 × 时间片 的矩阵；回放时按时间顺序逐个时间片撮合，
+同一时间片的子单作为一本订单簿交给 TradingSystem，未成交部分顺延到该母单的下一个时间片。
+"""
+
+from enum import Enum
+from typing import TYPE_CHECKING
+
+import numpy as np
+from pydantic import BaseModel, ConfigDict, Field
+
+from src.entity.trade import TradeDirection, TradeOrder
+
+from .trading_calendar import SESSION_MINUTES, format_times, index_times, minute_index, parse_times
+
+if TYPE_CHECKING:
+    from src.entity.strategy import TradingSystem
+
+SESSION_OPEN = "09:30:00"
+
+# 每半小时成交量占比（A 股日内 U 型分布），VWAP 默认曲线
+DEFAULT_VOLUME_PROFILE: tuple[float, ...] = (0.15, 0.11, 0.09, 0.08, 0.10, 0.10, 0.12, 0.25)
+
+
+class SliceCurveEnum(str, Enum):
+    """拆单曲线"""
+
+    TWAP = "twap"
+    VWAP = "vwap"
+
+
+def volume_curve(profile: tuple[float, ...] = DEFAULT_VOLUME_PROFILE) -> np.ndarray:
+    """按半小时占比展开为每个交易分钟的成交量权重"""
+    minutes = np.arange(SESSION_MINUTES)
+    bucket = np.minimum(minutes // 30, len(profile) - 1)
+    bucket_minutes = np.bincount(bucket, minlength=len(profile))
+    return np.asarray(profile)[bucket] / bucket_minutes[bucket]
+
+
+class SliceSchedule(BaseModel):
+    """拆单计划，矩阵行为母单、列为时间片"""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    parent_orders: list[TradeOrder] = Field(description="母单")
+    slice_minutes: np.ndarray = Field(description="各时间片开始的交易分钟序号")
+    slice_times: list[str] = Field(description="各时间片开始时间")
+    weights: np.ndarray = Field(description="母单 × 时间片 的拆分比例，每行和为1")
+    trade_date: str | None = Field(default=None, description="交易日，用于按时间取价")
+
+    @property
+    def slice_shares(self) -> np.ndarray:
+        """母单 × 时间片 的计划股数"""
+        target = np.array([order.target_shares for order in self.parent_orders])
+        return target[:, None] * self.weights
+
+
+class ScheduleReplay(BaseModel):
+    """回放结果"""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    filled_shares: np.ndarray = Field(description="母单 × 时间片 的成交股数")
+    filled_value: np.ndarray = Field(description="母单 × 时间片 的成交金额")
+    remaining_cash: float = Field(description="剩余现金")
+
+    @property
+    def order_filled_shares(self) -> np.ndarray:
+        return self.filled_shares.sum(axis=1)
+
+
+class ExecutionScheduler:
+    """
+    TWAP/VWAP 拆单调度器
+    slice_minutes: 每个时间片的交易分钟数
+    curve: 拆单曲线；VWAP 使用 profile（每交易分钟的成交量权重，缺省为 U 型分布）
+    """
+
+    def __init__(
+        self,
+        slice_minutes: int = 10,
+        curve: SliceCurveEnum = SliceCurveEnum.TWAP,
+        profile: np.ndarray | None = None,
+    ) -> None:
+        if slice_minutes <= 0:
+            raise ValueError(f"时间片分钟数必须为正: {slice_minutes}")
+        self.slice_minutes = slice_minutes
+        self.curve = curve
+        self.profile = volume_curve() if profile is None else np.asarray(profile, dtype=float)
+        if len(self.profile) != SESSION_MINUTES:
+            raise ValueError(f"成交量曲线长度须为 {SESSION_MINUTES}: {len(self.profile)}")
+
+    def schedule(
+        self,
+        orders: list[TradeOrder],
+        start_times: list[str] | str = SESSION_OPEN,
+        end_time: str = "14:57:00",
+        trade_date: str | None = None,
+    ) -> SliceSchedule:
+        """
+        生成拆单计划
+        start_times: 统一或逐母单的开始时间，母单从不早于开始时间的第一个时间片参与；
+        开始时间之后已没有时间片的母单报错，不会被静默丢弃
+        """
+        end = int(minute_index(parse_times(end_time))[0])
+        if isinstance(start_times, str):
+            starts = np.full(len(orders), minute_index(parse_times(start_times))[0])
+        else:
+            starts = minute_index(parse_times(start_times))
+        first = int(starts.min()) if len(orders) else 0
+        if first >= end:
+            raise ValueError(f"开始时间不早于结束时间: {end_time}")
+
+        slice_minutes = np.arange(first, end, self.slice_minutes)
+        # 每个时间片覆盖的交易分钟的权重之和
+        if self.curve == SliceCurveEnum.VWAP:
+            minute_weights = self.profile
+        else:
+            minute_weights = np.ones(SESSION_MINUTES)
+        cumulative = np.concatenate([[0.0], np.cumsum(minute_weights)])
+        slice_ends = np.minimum(slice_minutes + self.slice_minutes, end)
+        slice_weights = cumulative[slice_ends] - cumulative[slice_minutes]
+
+        # 开始时间之后的时间片才参与，按行归一化
+        weights = np.where(slice_minutes[None, :] >= starts[:, None], slice_weights[None, :], 0.0)
+        totals = weights.sum(axis=1, keepdims=True)
+        unscheduled = np.flatnonzero(totals[:, 0] <= 0)
+        if len(unscheduled):
+            codes = ", ".join(orders[row].stock_code for row in unscheduled.tolist())
+            raise ValueError(f"母单开始时间之后没有时间片（结束时间 {end_time}）: {codes}")
+        weights /= totals
+
+        return SliceSchedule(
+            parent_orders=orders,
+            slice_minutes=slice_minutes,
+            slice_times=format_times(index_times(slice_minutes)),
+            weights=weights,
+            trade_date=trade_date,
+        )
+
+    def replay(
+        self,
+        schedule: SliceSchedule,
+        trading_system: "TradingSystem",
+        available_cash: float,
+        carry_over: bool = True,
+    ) -> ScheduleReplay:
+        """
+        按时间顺序回放拆单计划，结果累加回母单的已成交股数和金额
+        carry_over: 子单未成交部分是否顺延到下一个时间片
+        """
+        orders = schedule.parent_orders
+        planned = schedule.slice_shares
+        num_slices = planned.shape[1]
+        filled_shares = np.zeros_like(planned)
+        filled_value = np.zeros_like(planned)
+        signs = np.array([1.0 if o.direction == TradeDirection.BUY else -1.0 for o in orders])
+        codes = np.array([order.stock_code for order in orders], dtype=object)
+        prices = np.array([order.price for order in orders])
+        # 同一时间片内按母单优先级排列订单簿，优先级高的买单先用现金
+        by_priority = np.argsort([order.priority for order in orders], kind="stable")
+
+        # 时间片已按时间排列，逐个读取含顺延量的计划股数
+        cash = available_cash
+        for column in range(num_slices):
+            rows = by_priority[planned[by_priority, column] > 0]
+            if not len(rows):
+                continue
+            wanted = planned[rows, column]
+
+            timestamp = None
+            if schedule.trade_date is not None:
+                timestamp = f"{schedule.trade_date} {schedule.slice_times[column]}"
+            result = trading_system.execute_book(
+                codes[rows].tolist(), signs[rows] * wanted, prices[rows], cash, timestamp
+            )
+            cash = result.remaining_cash
+            filled_shares[rows, column] = result.filled_shares
+            filled_value[rows, column] = result.filled_value
+            if carry_over and column + 1 < num_slices:
+                planned[rows, column + 1] += wanted - result.filled_shares
+
+        for order, shares, value in zip(
+            orders,
+            filled_shares.sum(axis=1).tolist(),
+            filled_value.sum(axis=1).tolist(),
+            strict=True,
+        ):
+            order.executed_shares += shares
+            order.executed_value += value
+
+        return ScheduleReplay(
+            filled_shares=filled_shares, filled_value=filled_value, remaining_cash=cash
+        )
@@ -0,0 +1,155 @@
+"""
+结构化追踪
+
+热路径上只产生结构化记录（事件名、字段、文本模板），不做字符串格式化和 I/O。
+追踪默认关闭：没有 sink 时 emit 直接返回。每个 sink 可以单独设置采样比例，
+记录可以写入环形缓冲、JSON Lines 文件，或由控制台渲染器按模板还原成原来的打印文本。
+
+    from src.core.trace import ConsoleRenderer, tracer
+
+    tracer.add_sink(ConsoleRenderer())  # 恢复控制台输出
+"""
+
+import json
+import random
+import sys
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from pathlib import Path
+from typing import Any, TextIO
+
+
+class TraceRecord:
+    """一条追踪记录，文本只在渲染时才格式化"""
+
+    __slots__ = ("event", "fields", "template", "timestamp")
+
+    def __init__(self, event: str, template: str, fields: dict[str, Any]) -> None:
+        self.event = event
+        self.template = template
+        self.fields = fields
+        self.timestamp = time.time()
+
+    @property
+    def message(self) -> str:
+        """按模板渲染的文本"""
+        return self.template.format(**self.fields) if self.template else self.event
+
+    def to_dict(self) -> dict[str, Any]:
+        return {"timestamp": self.timestamp, "event": self.event, **self.fields}
+
+
+class TraceSink(ABC):
+    """追踪记录的去向"""
+
+    def __init__(self, sample_rate: float = 1.0) -> None:
+        if not 0 < sample_rate <= 1:
+            raise ValueError(f"采样比例必须在 (0, 1] 之间: {sample_rate}")
+        self.sample_rate = sample_rate
+
+    @abstractmethod
+    def write(self, record: TraceRecord) -> None:
+        """写入一条记录"""
+
+    def close(self) -> None:
+        """释放资源"""
+
+
+class RingBufferSink(TraceSink):
+    """环形缓冲，只保留最近 capacity 条记录"""
+
+    def __init__(self, capacity: int = 10000, sample_rate: float = 1.0) -> None:
+        super().__init__(sample_rate)
+        self._records: deque[TraceRecord] = deque(maxlen=capacity)
+
+    def write(self, record: TraceRecord) -> None:
+        self._records.append(record)
+
+    @property
+    def records(self) -> list[TraceRecord]:
+        return list(self._records)
+
+    def events(self, event: str) -> list[TraceRecord]:
+        """指定事件名的记录"""
+        return [record for record in self._records if record.event == event]
+
+    def clear(self) -> None:
+        self._records.clear()
+
+
+class FileSink(TraceSink):
+    """以 JSON Lines 追加写入文件"""
+
+    def __init__(self, path: str | Path, sample_rate: float = 1.0) -> None:
+        super().__init__(sample_rate)
+        self._file = Path(path).open("a", encoding="utf-8")  # noqa: SIM115
+
+    def write(self, record: TraceRecord) -> None:
+        self._file.write(json.dumps(record.to_dict(), ensure_ascii=False, default=str))
+        self._file.write("\n")
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class ConsoleRenderer(TraceSink):
+    """控制台渲染器，按模板输出与原来打印一致的文本"""
+
+    def __init__(self, stream: TextIO | None = None, sample_rate: float = 1.0) -> None:
+        super().__init__(sample_rate)
+        self._stream = stream
+
+    def write(self, record: TraceRecord) -> None:
+        print(record.message, file=self._stream or sys.stdout)
+
+
+class Tracer:
+    """追踪分发器，没有 sink 时为关闭状态"""
+
+    def __init__(self, seed: int | None = None) -> None:
+        self._sinks: list[TraceSink] = []
+        self._random = random.Random(seed)  # noqa: S311 采样用，无安全要求
+        self.enabled = False
+
+    @property
+    def sinks(self) -> list[TraceSink]:
+        return list(self._sinks)
+
+    def add_sink(self, sink: TraceSink) -> TraceSink:
+        self._sinks.append(sink)
+        self.enabled = True
+        return sink
+
+    def remove_sink(self, sink: TraceSink) -> None:
+        self._sinks.remove(sink)
+        sink.close()
+        self.enabled = bool(self._sinks)
+
+    def clear(self) -> None:
+        """移除并关闭所有 sink"""
+        for sink in self._sinks:
+            sink.close()
+        self._sinks.clear()
+        self.enabled = False
+
+    def emit(self, event: str, template: str = "", **fields: Any) -> None:
+        """
+        产生一条记录
+        event: 事件名，如 "rebalance.buy"
+        template: str.format 模板，字段取自 fields，仅在渲染时格式化
+        """
+        if not self.enabled:
+            return
+
+        record = None
+        for sink in self._sinks:
+            if sink.sample_rate < 1 and self._random.random() >= sink.sample_rate:
+                continue
+            if record is None:
+                record = TraceRecord(event, template, fields)
+            sink.write(record)
+
+
+# 全局追踪器
+tracer = Tracer()
@@ -0,0 +1,183 @@
+"""
+交易日历
+
+日内：预先算好一天中每个自然分钟对应的交易分钟序号（上午 09:30-11:30 为 0-119，
+下午 13:00 起为 120 起，14:57 截止为 237），时间统一表示为当日秒数的整数数组，
+加减、求差、截断都先查表换成会话内秒数，再做数组运算。
+午休和开盘前的时间按下一个可交易时刻处理，超过 14:57 截断为 14:57:00。
+日间：工作日去掉节假日，节假日可从本地文件加载，基于 numpy 的 busdaycalendar。
+"""
+
+from collections.abc import Iterable, Sequence
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+
+MORNING_OPEN = 9 * 60 + 30
+MORNING_CLOSE = 11 * 60 + 30
+AFTERNOON_OPEN = 13 * 60
+CLOSE_CUTOFF = 14 * 60 + 57
+MORNING_MINUTES = MORNING_CLOSE - MORNING_OPEN
+SESSION_MINUTES = MORNING_MINUTES + CLOSE_CUTOFF - AFTERNOON_OPEN
+
+_DAY_MINUTES = np.arange(24 * 60)
+_SESSION_INDEX = np.arange(SESSION_MINUTES + 1)
+
+# 自然分钟 -> 交易分钟序号
+_MINUTE_INDEX = np.clip(
+    np.where(
+        _DAY_MINUTES < MORNING_CLOSE,
+        _DAY_MINUTES - MORNING_OPEN,
+        np.maximum(_DAY_MINUTES - AFTERNOON_OPEN, 0) + MORNING_MINUTES,
+    ),
+    0,
+    SESSION_MINUTES,
+)
+# 自然分钟是否在连续竞价时段内（秒数有效）
+_IN_SESSION = ((_DAY_MINUTES >= MORNING_OPEN) & (_DAY_MINUTES < MORNING_CLOSE)) | (
+    (_DAY_MINUTES >= AFTERNOON_OPEN) & (_DAY_MINUTES < CLOSE_CUTOFF)
+)
+# 交易分钟序号 -> 自然分钟，序号 120 为 13:00
+_INDEX_MINUTE = np.where(
+    _SESSION_INDEX < MORNING_MINUTES,
+    _SESSION_INDEX + MORNING_OPEN,
+    _SESSION_INDEX - MORNING_MINUTES + AFTERNOON_OPEN,
+)
+
+
+def parse_times(times: Sequence[str] | str) -> np.ndarray:
+    """时间字符串 HH:MM:SS 转为当日秒数"""
+    if isinstance(times, str):
+        times = [times]
+    parts = np.array([time.split(":") for time in times], dtype=np.int64).reshape(-1, 3)
+    return parts[:, 0] * 3600 + parts[:, 1] * 60 + parts[:, 2]
+
+
+def format_times(seconds: np.ndarray) -> list[str]:
+    """当日秒数转为 HH:MM:SS 字符串"""
+    seconds = np.asarray(seconds, dtype=np.int64)
+    hours, rest = np.divmod(seconds, 3600)
+    minutes, secs = np.divmod(rest, 60)
+    return [
+        f"{h:02d}:{m:02d}:{s:02d}"
+        for h, m, s in zip(hours.tolist(), minutes.tolist(), secs.tolist(), strict=True)
+    ]
+
+
+def session_seconds(times: np.ndarray) -> np.ndarray:
+    """当日秒数转为会话内已过的交易秒数，范围 [0, SESSION_MINUTES × 60]"""
+    times = np.asarray(times, dtype=np.int64)
+    minutes = np.clip(times // 60, 0, 24 * 60 - 1)
+    return _MINUTE_INDEX[minutes] * 60 + np.where(_IN_SESSION[minutes], times % 60, 0)
+
+
+def clock_seconds(elapsed: np.ndarray) -> np.ndarray:
+    """会话内交易秒数转回当日秒数，超出范围的截断"""
+    elapsed = np.clip(np.asarray(elapsed, dtype=np.int64), 0, SESSION_MINUTES * 60)
+    index, secs = np.divmod(elapsed, 60)
+    return _INDEX_MINUTE[index] * 60 + secs
+
+
+def minute_index(times: np.ndarray) -> np.ndarray:
+    """交易分钟序号，09:30 为 0，13:00 为 120，14:57 为 237"""
+    return session_seconds(times) // 60
+
+
+def index_times(index: np.ndarray) -> np.ndarray:
+    """交易分钟序号对应的当日秒数"""
+    return clock_seconds(np.asarray(index, dtype=np.int64) * 60)
+
+
+def add_minutes(times: np.ndarray, minutes: np.ndarray | int) -> np.ndarray:
+    """加交易分钟（跳过午休，14:57 截止），minutes 可为负"""
+    return clock_seconds(session_seconds(times) + np.asarray(minutes, dtype=np.int64) * 60)
+
+
+def trade_time_add(cur_time: str, add_min: int) -> str:
+    """单个时间的交易时间加法，跳过午休（11:30 之后从 13:00 起算），14:57 截止"""
+    return format_times(add_minutes(parse_times(cur_time), add_min))[0]
+
+
+def diff_minutes(start: np.ndarray, end: np.ndarray) -> np.ndarray:
+    """两个时刻之间的交易分钟数（不计午休）"""
+    return (session_seconds(end) - session_seconds(start)) / 60
+
+
+def clip_times(times: np.ndarray, start: str = "09:30:00", end: str = "14:57:00") -> np.ndarray:
+    """截断到 [start, end] 的交易时段内，午休时间归到 13:00"""
+    low, high = session_seconds(parse_times([start, end]))
+    return clock_seconds(np.clip(session_seconds(times), low, high))
+
+
+def load_holidays(path: str | Path) -> list[date]:
+    """
+    加载节假日文件
+    txt 为每行一个 YYYY-MM-DD；csv/parquet 读取 date 列
+    """
+    path = Path(path)
+    if path.suffix == ".txt":
+        lines = path.read_text(encoding="utf-8").splitlines()
+        return [date.fromisoformat(line.strip()) for line in lines if line.strip()]
+
+    import polars as pl  # noqa: PLC0415
+
+    frame = pl.read_parquet(path) if path.suffix == ".parquet" else pl.read_csv(path)
+    return [date.fromisoformat(str(value)[:10]) for value in frame["date"].to_list()]
+
+
+class TradingCalendar:
+    """交易日历：工作日去掉节假日"""
+
+    def __init__(self, holidays: Iterable[date | str] = ()) -> None:
+        self.holidays = np.array(sorted({str(day)[:10] for day in holidays}), dtype="datetime64[D]")
+        self._busdays = np.busdaycalendar(holidays=self.holidays)
+
+    @classmethod
+    def from_file(cls, path: str | Path) -> "TradingCalendar":
+        return cls(load_holidays(path))
+
+    def is_trading_day(self, days: np.ndarray | Sequence[str] | str) -> np.ndarray:
+        return np.is_busday(np.asarray(days, dtype="datetime64[D]"), busdaycal=self._busdays)
+
+    def trading_days(self, start: str | date, end: str | date) -> np.ndarray:
+        """[start, end] 内的交易日"""
+        days = np.arange(
+            np.datetime64(str(start)[:10], "D"),
+            np.datetime64(str(end)[:10], "D") + np.timedelta64(1, "D"),
+        )
+        return days[self.is_trading_day(days)]
+
+    def offset_days(self, days: np.ndarray | Sequence[str] | str, offset: int) -> np.ndarray:
+        """向后（offset 为负时向前）第 offset 个交易日，非交易日先滚到下一个交易日"""
+        return np.busday_offset(
+            np.asarray(days, dtype="datetime64[D]"), offset, roll="forward", busdaycal=self._busdays
+        )
+
+    def count_days(self, start: np.ndarray | str, end: np.ndarray | str) -> np.ndarray:
+        """[start, end) 内的交易日数"""
+        return np.busday_count(
+            np.asarray(start, dtype="datetime64[D]"),
+            np.asarray(end, dtype="datetime64[D]"),
+            busdaycal=self._busdays,
+        )
+
+
+# 全局默认交易日历
+_calendar: TradingCalendar | None = None
+
+
+def get_trading_calendar() -> TradingCalendar:
+    """全局交易日历，首次使用时只按工作日创建"""
+    global _calendar  # noqa: PLW0603
+    if _calendar is None:
+        _calendar = TradingCalendar()
+    return _calendar
+
+
+def set_trading_calendar(calendar: TradingCalendar | None) -> TradingCalendar | None:
+    """替换全局交易日历，返回原来的日历便于恢复；None 表示恢复默认"""
+    global _calendar  # noqa: PLW0603
+    previous = _calendar
+    _calendar = calendar
+    return previous
@@ -0,0 +1,122 @@
+"""
+策略树扁平索引
+
+StrategyTree 节点只持有子节点列表，无法向上访问。索引按先序展开一次，记录父节点、
+深度、子树区间 [row, subtree_end[row])、路径权重以及名称 / 产品ID 到节点的映射，
+之后祖先查找、子树遍历、叶子遍历和子树汇总都不再需要递归。
+树结构变化后需要重建索引。
+"""
+
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from src.entity.strategy import StrategyTree
+
+
+class TreeIndex:
+    """策略树扁平索引，nodes 按先序排列"""
+
+    def __init__(self, root: "StrategyTree") -> None:
+        self.root = root
+        self.nodes: list[StrategyTree] = []
+        parents: list[int] = []
+        depths: list[int] = []
+
+        # 迭代式先序遍历，避免深树递归
+        stack: list[tuple[StrategyTree, int, int]] = [(root, -1, 0)]
+        while stack:
+            node, parent_row, depth = stack.pop()
+            parents.append(parent_row)
+            depths.append(depth)
+            row = len(self.nodes)
+            self.nodes.append(node)
+            stack.extend((child, row, depth + 1) for child in reversed(node.children))
+
+        size = len(self.nodes)
+        self.parent = np.asarray(parents, dtype=np.int32)
+        self.depth = np.asarray(depths, dtype=np.int32)
+        self.is_leaf = np.fromiter(
+            (not node.children for node in self.nodes), dtype=bool, count=size
+        )
+        self.leaf_rows = np.flatnonzero(self.is_leaf)
+        self.subtree_end = self._build_subtree_end()
+        self.path_weight = self._build_path_weight()
+        self.rows = {id(node): row for row, node in enumerate(self.nodes)}
+
+        self.by_name: dict[str, StrategyTree] = {}
+        self.by_fund_id: dict[int, StrategyTree] = {}
+        for node in self.nodes:
+            self.by_name.setdefault(node.name, node)
+            self.by_fund_id.setdefault(node.fund_id, node)
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    def __contains__(self, node: "StrategyTree") -> bool:
+        return id(node) in self.rows
+
+    def _build_subtree_end(self) -> np.ndarray:
+        """先序下每个节点子树的结束位置（不含）"""
+        size = len(self.nodes)
+        subtree_size = np.ones(size, dtype=np.int64)
+        # 逆先序时子节点总在父节点之前被处理
+        for row in range(size - 1, 0, -1):
+            subtree_size[self.parent[row]] += subtree_size[row]
+        return np.arange(size) + subtree_size
+
+    def _build_path_weight(self) -> np.ndarray:
+        """根节点到各节点路径上的权重乘积（不含根节点自身权重），即资金分配比例"""
+        size = len(self.nodes)
+        path_weight = np.fromiter((node.weight for node in self.nodes), dtype=float, count=size)
+        path_weight[0] = 1.0
+        # 先序时父节点总在子节点之前被处理
+        for row in range(1, size):
+            path_weight[row] *= path_weight[self.parent[row]]
+        return path_weight
+
+    def row(self, node: "StrategyTree") -> int:
+        return self.rows[id(node)]
+
+    def parent_of(self, node: "StrategyTree") -> "StrategyTree | None":
+        parent = self.parent[self.row(node)]
+        return self.nodes[parent] if parent >= 0 else None
+
+    def ancestors(self, node: "StrategyTree") -> list["StrategyTree"]:
+        """祖先节点，由近及远"""
+        result = []
+        parent = int(self.parent[self.row(node)])
+        while parent >= 0:
+            result.append(self.nodes[parent])
+            parent = int(self.parent[parent])
+        return result
+
+    def subtree(self, node: "StrategyTree") -> list["StrategyTree"]:
+        """子树节点（含自身），先序"""
+        row = self.row(node)
+        return self.nodes[row : self.subtree_end[row]]
+
+    def postorder(self, node: "StrategyTree | None" = None) -> list["StrategyTree"]:
+        """子树节点后序（子节点先于父节点）；缺省为整棵树"""
+        start = 0 if node is None else self.row(node)
+        end = int(self.subtree_end[start])
+        rows = np.arange(start, end)
+        # 子树结束位置小的先输出，结束位置相同的祖先链由深到浅
+        order = np.lexsort((-rows, self.subtree_end[start:end]))
+        return [self.nodes[row] for row in rows[order].tolist()]
+
+    def leaves(self, node: "StrategyTree | None" = None) -> list["StrategyTree"]:
+        """子树内的叶子节点，先序；缺省为整棵树"""
+        if node is None:
+            rows = self.leaf_rows
+        else:
+            row = self.row(node)
+            start, end = np.searchsorted(self.leaf_rows, [row, self.subtree_end[row]])
+            rows = self.leaf_rows[start:end]
+        return [self.nodes[leaf] for leaf in rows.tolist()]
+
+    def subtree_sum(self, values: np.ndarray) -> np.ndarray:
+        """先序区间前缀和：每个节点子树（含自身）的汇总"""
+        prefix = np.concatenate(([0.0], np.cumsum(values)))
+        return prefix[self.subtree_end] - prefix[: len(self.nodes)]
@@ -0,0 +1,223 @@
+"""
+整树估值引擎
+
+借助 TreeIndex 的先序展开构建叶子持仓矩阵（COO 三元组），
+之后每次估值只需一个价格向量：一次 bincount 得到各节点自身的股票市值，
+再利用先序区间 [i, subtree_end[i]) 的前缀和做子树汇总。
+"""
+
+from typing import TYPE_CHECKING
+
+import numpy as np
+from pydantic import BaseModel, ConfigDict
+
+from src.entity.position import symbol_index
+
+from .futures import get_futures_registry
+from .tree_index import TreeIndex
+
+if TYPE_CHECKING:
+    from src.entity.strategy import StrategyTree
+
+
+def account_summary(
+    name: str,
+    stock_positions: int,
+    stock_value: float,
+    available_cash: float,
+    pending_amount: float,
+    futures_margin: float,
+    is_root: bool,
+) -> dict:
+    """组装与 StrategyTree.get_account_summary 相同结构的摘要"""
+    return {
+        "name": name,
+        "stock_positions": stock_positions,
+        "stock_value": stock_value,
+        "available_cash": available_cash,
+        "pending_amount": pending_amount,
+        "futures_margin": futures_margin,
+        "total_value": stock_value + available_cash + pending_amount,
+        "is_root": is_root,
+    }
+
+
+def futures_margin(node: "StrategyTree") -> float:
+    """节点期货空头占用的保证金"""
+    positions = node.virtual_account.futures_short_info
+    if not positions:
+        return 0.0
+    contract = node.strategy_info.get("contract", "")
+    margins = get_futures_registry().position_margins(
+        [position.futures_code for position in positions],
+        np.array([position.futures_amount for position in positions]),
+        [contract] * len(positions),
+    )
+    return float(margins.sum())
+
+
+class TreeValuation(BaseModel):
+    """一次整树估值的结果，数组按先序节点排列"""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    names: list[str]
+    # 节点自身账户
+    own_stock_value: np.ndarray
+    own_available_cash: np.ndarray
+    own_pending_amount: np.ndarray
+    own_futures_margin: np.ndarray
+    stock_positions: np.ndarray
+    # 子树内叶子节点汇总
+    stock_value: np.ndarray
+    available_cash: np.ndarray
+    pending_amount: np.ndarray
+    futures_margin: np.ndarray
+    rows: dict[int, int]
+
+    @property
+    def total_value(self) -> np.ndarray:
+        """子树叶子总资产"""
+        return self.stock_value + self.available_cash + self.pending_amount
+
+    def summary(self, node: "StrategyTree") -> dict:
+        """与 StrategyTree.get_account_summary 相同结构的摘要"""
+        row = self.rows[id(node)]
+        is_root = node.weight == 1.0 and bool(node.children)
+        if is_root:
+            stock, cash, pending, margin = (
+                self.stock_value[row],
+                self.available_cash[row],
+                self.pending_amount[row],
+                self.futures_margin[row],
+            )
+        else:
+            stock, cash, pending, margin = (
+                self.own_stock_value[row],
+                self.own_available_cash[row],
+                self.own_pending_amount[row],
+                self.own_futures_margin[row],
+            )
+
+        return account_summary(
+            self.names[row],
+            int(self.stock_positions[row]),
+            float(stock),
+            float(cash),
+            float(pending),
+            float(margin),
+            is_root,
+        )
+
+
+class ValuationEngine:
+    """
+    整树估值引擎
+    结构取自 root 的扁平索引；账户变化后调用 refresh_accounts，价格变化只需再次 valuate
+    """
+
+    def __init__(self, root: "StrategyTree") -> None:
+        self.root = root
+        index = root.tree_index
+        if index.root is not root:
+            # root 挂在更大的树上时，只展开其子树
+            index = TreeIndex(root)
+        self.index = index
+        self.nodes = index.nodes
+        self.parent = index.parent
+        self.is_leaf = index.is_leaf
+        self.subtree_end = index.subtree_end
+        self.rows = index.rows
+        self.refresh_accounts()
+
+    def refresh_accounts(self) -> None:
+        """重新读取各节点账户，构建叶子持仓矩阵和现金、保证金向量"""
+        size = len(self.nodes)
+        node_rows: list[np.ndarray] = []
+        symbol_ids: list[np.ndarray] = []
+        amounts: list[np.ndarray] = []
+        self.cash = np.zeros(size)
+        self.pending = np.zeros(size)
+        self.futures_margin = np.zeros(size)
+        self.stock_positions = np.zeros(size, dtype=np.int64)
+        # 有期货持仓的节点，最后通过合约注册表一次算出保证金
+        margin_rows: list[int] = []
+        margin_codes: list[str] = []
+        margin_contracts: list[str] = []
+        margin_lots: list[float] = []
+
+        for row, node in enumerate(self.nodes):
+            account = node.virtual_account
+            self.cash[row] = account.cash_info.available_cash
+            self.pending[row] = account.cash_info.pending_purchase_amount
+            self.stock_positions[row] = len(account.stock_long_info)
+
+            if account.is_compact:
+                ids = account.stock_long_info.code_idx
+                node_amounts = account.stock_long_info.amounts
+            else:
+                codes, node_amounts = account.get_stock_arrays()
+                ids = symbol_index.indices(codes)
+            if len(ids):
+                node_rows.append(np.full(len(ids), row, dtype=np.int32))
+                symbol_ids.append(ids)
+                amounts.append(node_amounts)
+
+            contract = node.strategy_info.get("contract", "")
+            for position in account.futures_short_info:
+                margin_rows.append(row)
+                margin_codes.append(position.futures_code)
+                margin_contracts.append(contract)
+                margin_lots.append(position.futures_amount)
+
+        if margin_rows:
+            margins = get_futures_registry().position_margins(
+                margin_codes, np.array(margin_lots), margin_contracts
+            )
+            self.futures_margin[:] = np.bincount(
+                margin_rows, weights=margins, minlength=len(self.nodes)
+            )
+
+        if not amounts:
+            self.pos_node = np.empty(0, dtype=np.int32)
+            self.pos_col = np.empty(0, dtype=np.int64)
+            self.pos_amount = np.empty(0)
+            self.codes: list[str] = []
+            return
+
+        unique_ids, self.pos_col = np.unique(np.concatenate(symbol_ids), return_inverse=True)
+        self.pos_node = np.concatenate(node_rows)
+        self.pos_amount = np.concatenate(amounts).astype(np.float64, copy=False)
+        self.codes = symbol_index.codes(unique_ids.tolist())
+
+    def subtree_sum(self, values: np.ndarray) -> np.ndarray:
+        """先序区间前缀和：每个节点子树（含自身）的汇总"""
+        return self.index.subtree_sum(values)
+
+    def valuate(self, prices: np.ndarray | None = None) -> TreeValuation:
+        """
+        按价格向量估值整棵树
+        prices: 与 self.codes 对齐的价格，缺省时使用根节点的价格来源
+        """
+        if prices is None:
+            prices = self.root._get_stock_prices(self.codes)
+
+        size = len(self.nodes)
+        own_stock = np.bincount(
+            self.pos_node, weights=self.pos_amount * prices[self.pos_col], minlength=size
+        )
+        leaf = self.is_leaf
+
+        return TreeValuation(
+            names=[node.name for node in self.nodes],
+            own_stock_value=own_stock,
+            own_available_cash=self.cash,
+            own_pending_amount=self.pending,
+            own_futures_margin=self.futures_margin,
+            stock_positions=self.stock_positions,
+            stock_value=self.subtree_sum(np.where(leaf, own_stock, 0.0)),
+            available_cash=self.subtree_sum(np.where(leaf, self.cash, 0.0)),
+            pending_amount=self.subtree_sum(np.where(leaf, self.pending, 0.0)),
+            futures_margin=self.subtree_sum(np.where(leaf, self.futures_margin, 0.0)),
+            rows=self.rows,
+        )
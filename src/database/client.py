@@ -0,0 +1,89 @@
+"""
+MongoDB 客户端
+
+每个进程只持有一个带连接池的 AsyncMongoClient，连接池大小、超时和压缩参数取自 sys_config。
+异步客户端绑定创建时的事件循环，在新的事件循环中使用时（如每次 asyncio.run）重新创建。
+FastAPI 在 lifespan 中调用 init_db / close_db；脚本和工作进程同样通过 init_db 复用这一个客户端，
+不再每次注册模型都新建连接。
+"""
+
+import asyncio
+import os
+
+from pymongo import AsyncMongoClient
+from pymongo.asynchronous.database import AsyncDatabase
+
+from src.config.sys_config import sys_config
+
+_client: AsyncMongoClient | None = None
+# 创建客户端的 (进程id, 事件循环)，fork 出的子进程和其他事件循环不能复用这些连接
+_client_owner: tuple[int, asyncio.AbstractEventLoop | None] | None = None
+# 已初始化 Beanie 的数据库名
+_initialized: str | None = None
+# 与客户端一同创建，绑定同一个事件循环
+_init_lock: asyncio.Lock | None = None
+
+
+def client_options() -> dict:
+    """从 sys_config 读取的连接池参数"""
+    return {
+        "maxPoolSize": sys_config.mongo_max_pool_size,
+        "minPoolSize": sys_config.mongo_min_pool_size,
+        "maxIdleTimeMS": sys_config.mongo_max_idle_time_ms,
+        "connectTimeoutMS": sys_config.mongo_connect_timeout_ms,
+        "serverSelectionTimeoutMS": sys_config.mongo_server_selection_timeout_ms,
+        "socketTimeoutMS": sys_config.mongo_socket_timeout_ms or None,
+        "waitQueueTimeoutMS": sys_config.mongo_wait_queue_timeout_ms,
+        "compressors": sys_config.mongo_compressors,
+        "appname": "sss_v2",
+    }
+
+
+def _current_owner() -> tuple[int, asyncio.AbstractEventLoop | None]:
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+    return os.getpid(), loop
+
+
+def get_client() -> AsyncMongoClient:
+    """当前进程和事件循环的共享客户端，首次调用或事件循环变化时创建"""
+    global _client, _client_owner, _initialized, _init_lock  # noqa: PLW0603
+    owner = _current_owner()
+    if _client is None or _client_owner != owner:
+        _client = AsyncMongoClient(sys_config.mongo_url, **client_options())
+        _client_owner = owner
+        _initialized = None
+        _init_lock = None
+    return _client
+
+
+def get_database(name: str | None = None) -> AsyncDatabase:
+    """共享客户端上的数据库，默认使用 sys_config.mongo_database"""
+    return get_client()[name or sys_config.mongo_database]
+
+
+async def init_db(name: str | None = None) -> AsyncDatabase:
+    """初始化 Beanie，同一进程和事件循环内只执行一次"""
+    global _initialized, _init_lock  # noqa: PLW0603
+    from beanie import init_beanie  # noqa: PLC0415
+
+    from .orm import DOCUMENT_MODELS  # noqa: PLC0415
+
+    database = get_database(name)
+    if _init_lock is None:
+        _init_lock = asyncio.Lock()
+    async with _init_lock:
+        if _initialized != database.name:
+            await init_beanie(database, document_models=DOCUMENT_MODELS)
+            _initialized = database.name
+    return database
+
+
+async def close_db() -> None:
+    """关闭共享客户端和连接池，下次使用时重新创建"""
+    global _client, _client_owner, _initialized, _init_lock  # noqa: PLW0603
+    client, _client, _client_owner, _initialized, _init_lock = _client, None, None, None, None
+    if client is not None:
+        await client.close()
@@ -0,0 +1,208 @@
+"""
+带版本的层级权重
+
+父子关系和权重按区间 [start_date, end_date) 存放，调整权重只关闭当前区间并追加新区间，
+不改写历史。区间按子节点分组、按生效日期排序，查询某日的树时每个子节点二分一次，
+O(节点数) 重建当天的结构和权重；解析结果按日期缓存。
+本模块只处理原始文档（dict），不依赖数据库驱动。
+"""
+
+import bisect
+from collections import OrderedDict, defaultdict, deque
+from collections.abc import Iterable, Mapping
+from typing import Any
+
+from src.entity.strategy import StrategyTree
+
+from .tree_link import link_strategy_nodes
+
+# 由节点文档补出的层级区间的生效日期，早于任何交易日
+EARLIEST_DATE = "1900-01-01"
+
+
+class HierarchyIndex:
+    """
+    层级区间索引，区间为 [start_date, end_date)，end_date 为 None 表示仍然有效
+    同一子节点的区间不能重叠
+    """
+
+    def __init__(self, rows: Iterable[Mapping[str, Any]] = ()) -> None:
+        grouped: defaultdict[Any, list[Mapping[str, Any]]] = defaultdict(list)
+        for row in rows:
+            grouped[row["child_node_id"]].append(row)
+
+        # 子节点id -> 按生效日期排序的 (start_date, end_date, parent_node_id, weight)
+        self._intervals: dict[Any, list[tuple[str, str | None, Any, float]]] = {}
+        # 子节点id -> 生效日期列表，供二分
+        self._starts: dict[Any, list[str]] = {}
+        for child_id, group in grouped.items():
+            intervals = sorted(
+                (row["start_date"], row.get("end_date"), row["parent_node_id"], row["weight"])
+                for row in group
+            )
+            for (_, end, _, _), (start, _, _, _) in zip(intervals, intervals[1:], strict=False):
+                if end is None or end > start:
+                    raise ValueError(f"节点 {child_id} 的层级区间重叠: {start}")
+            self._intervals[child_id] = intervals
+            self._starts[child_id] = [interval[0] for interval in intervals]
+
+    def __contains__(self, child_id: Any) -> bool:
+        return child_id in self._intervals
+
+    def as_of(self, day: str) -> dict[Any, tuple[Any, float]]:
+        """day 当天有效的层级：子节点id -> (父节点id, 权重)"""
+        result = {}
+        for child_id, starts in self._starts.items():
+            position = bisect.bisect_right(starts, day) - 1
+            if position < 0:
+                continue
+            _, end, parent_id, weight = self._intervals[child_id][position]
+            if end is None or day < end:
+                result[child_id] = (parent_id, weight)
+        return result
+
+    def append(
+        self, child_id: Any, parent_id: Any, weight: float, start_date: str
+    ) -> tuple[dict[str, Any] | None, dict[str, Any]]:
+        """
+        从 start_date 起把子节点挂到 parent_id 下并使用 weight
+        返回 (被关闭的区间, 新区间)，只能在当前最后一个区间之后追加
+        """
+        intervals = self._intervals.setdefault(child_id, [])
+        starts = self._starts.setdefault(child_id, [])
+        closed = None
+        if intervals:
+            last_start, last_end, last_parent, last_weight = intervals[-1]
+            if start_date <= last_start:
+                raise ValueError(f"生效日期须晚于当前区间 {last_start}: {start_date}")
+            if last_end is None or last_end > start_date:
+                intervals[-1] = (last_start, start_date, last_parent, last_weight)
+                closed = {
+                    "child_node_id": child_id,
+                    "start_date": last_start,
+                    "end_date": start_date,
+                }
+        intervals.append((start_date, None, parent_id, weight))
+        starts.append(start_date)
+        opened = {
+            "child_node_id": child_id,
+            "parent_node_id": parent_id,
+            "weight": weight,
+            "start_date": start_date,
+            "end_date": None,
+        }
+        return closed, opened
+
+
+def resolve_strategy_tree(
+    node_rows: Iterable[Mapping[str, Any]], index: HierarchyIndex, day: str
+) -> StrategyTree:
+    """
+    用 day 当天有效的层级重建策略树
+    没有层级记录的节点沿用节点文档中的 parent_id 和 weight；
+    从根节点出发只保留当天可达的节点。账户为空，持仓需另外加载
+    """
+    nodes = {row["_id"]: row for row in node_rows}
+    edges = {
+        node_id: (row["parent_id"], row.get("weight", 1))
+        for node_id, row in nodes.items()
+        if node_id not in index and row.get("parent_id") is not None
+    }
+    edges.update(index.as_of(day))
+    children: defaultdict[Any, list[Any]] = defaultdict(list)
+    for child_id, (parent_id, _) in edges.items():
+        children[parent_id].append(child_id)
+
+    roots = [
+        node_id
+        for node_id, row in nodes.items()
+        if node_id not in index and row.get("parent_id") is None
+    ]
+    rows = []
+    queue = deque((node_id, 0) for node_id in roots)
+    while queue:
+        node_id, depth = queue.popleft()
+        row = {**nodes[node_id], "virtual_account": None, "depth": depth}
+        if node_id in edges:
+            row["parent_id"], row["weight"] = edges[node_id]
+        else:
+            row["parent_id"] = None
+        rows.append(row)
+        queue.extend(
+            (child_id, depth + 1) for child_id in children.get(node_id, ()) if child_id in nodes
+        )
+    return link_strategy_nodes(rows)
+
+
+def initial_hierarchy_rows(
+    node_rows: Iterable[Mapping[str, Any]], start_date: str
+) -> list[dict[str, Any]]:
+    """由节点文档当前的 parent_id 和 weight 生成从 start_date 起有效的初始层级"""
+    return [
+        {
+            "child_node_id": row["_id"],
+            "parent_node_id": row["parent_id"],
+            "weight": row.get("weight", 1),
+            "start_date": start_date,
+            "end_date": None,
+        }
+        for row in node_rows
+        if row.get("parent_id") is not None
+    ]
+
+
+class VersionedHierarchy:
+    """
+    一个基金的带版本层级，按日期缓存解析出的策略树
+    cache_size: 缓存的日期数
+    """
+
+    def __init__(
+        self,
+        node_rows: Iterable[Mapping[str, Any]],
+        hierarchy_rows: Iterable[Mapping[str, Any]] = (),
+        cache_size: int = 256,
+    ) -> None:
+        self.node_rows = list(node_rows)
+        self.index = HierarchyIndex(hierarchy_rows)
+        self.cache_size = cache_size
+        self._cache: OrderedDict[str, StrategyTree] = OrderedDict()
+
+    def tree_as_of(self, day: str) -> StrategyTree:
+        """day 当天的策略树；返回缓存的写时复制副本，修改不影响缓存"""
+        tree = self._cache.get(day)
+        if tree is None:
+            tree = resolve_strategy_tree(self.node_rows, self.index, day)
+            self._cache[day] = tree
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        else:
+            self._cache.move_to_end(day)
+        return tree.fork()
+
+    def set_weight(
+        self, child_id: Any, parent_id: Any, weight: float, start_date: str
+    ) -> tuple[dict[str, Any] | None, list[dict[str, Any]]]:
+        """
+        追加一个权重区间，清除 start_date 及之后日期的缓存
+        返回 (被关闭的区间, 新增的区间)；子节点还没有层级记录时，先按节点文档的 parent_id
+        和 weight 补一个到 start_date 为止的区间，使之前的日期仍解析为原来的结构
+        """
+        inserted = []
+        if child_id not in self.index:
+            row = next((row for row in self.node_rows if row["_id"] == child_id), None)
+            if row is None:
+                raise ValueError(f"策略节点不存在: {child_id}")
+            if row.get("parent_id") is None:
+                raise ValueError(f"根节点没有层级记录，不能调整: {child_id}")
+            _, seed = self.index.append(
+                child_id, row["parent_id"], row.get("weight", 1), EARLIEST_DATE
+            )
+            inserted.append({**seed, "end_date": start_date})
+        closed, opened = self.index.append(child_id, parent_id, weight, start_date)
+        if inserted:
+            closed = None
+        inserted.append(opened)
+        for day in [day for day in self._cache if day >= start_date]:
+            del self._cache[day]
+        return closed, inserted
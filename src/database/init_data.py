@@ -4,8 +4,9 @@ import asyncio
 
 from rich import print as rprint
 
-from src.database.orm import Fund, StrategyNode, StrategyTree, register_orm_models
-from src.entity.strategy import VirtualAccount
+from src.database.orm import Fund, StrategyNode, register_orm_models
+from src.database.unit_of_work import StrategyUnitOfWork
+from src.entity.strategy import StrategyTree
 
 
 async def init_data():
@@ -19,42 +20,23 @@ async def init_data():
     rprint(fund_75)
 
     # 给这个基金配置一个策略树
-    root_node = StrategyNode(
+    # 给根节点配置两类策略，一个中性策略，一个指数增强策略
+    root_node = StrategyTree(
         fund_id=75,
-        parent_id=None,
         weight=1,
         name="root",
-        info=None,
-        virtual_account=VirtualAccount(),
+        children=[
+            # 中性策略
+            StrategyTree(fund_id=75, weight=0.5, name="中性策略"),
+            # 指数增强策略
+            StrategyTree(fund_id=75, weight=0.5, name="指数增强策略"),
+        ],
     )
-    await root_node.insert()
+    # 整棵树一次批量写入
+    await StrategyUnitOfWork(root_node).flush()
 
     rprint(root_node)
 
-    # 给根节点配置两类策略，一个中性策略，一个指数增强策略
-
-    # 中性策略
-    neutral_strategy = StrategyNode(
-        fund_id=75,
-        parent_id=root_node.id,
-        weight=0.5,
-        name="中性策略",
-        info=None,
-        virtual_account=VirtualAccount(),
-    )
-    await neutral_strategy.insert()
-
-    # 指数增强策略
-    index_enhancement_strategy = StrategyNode(
-        fund_id=75,
-        parent_id=root_node.id,
-        weight=0.5,
-        name="指数增强策略",
-        info=None,
-        virtual_account=VirtualAccount(),
-    )
-    await index_enhancement_strategy.insert()
-
 
 if __name__ == "__main__":
     asyncio.run(init_data())
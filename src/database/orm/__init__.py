@@ -1,20 +1,28 @@
-from beanie import init_beanie
-from pymongo import AsyncMongoClient
-
 from .fund import Fund, StrategyTree
+from .hierarchy import PortfolioHierarchy
+from .position import NodePosition, PositionTypeEnum
 from .strategy import StrategyNode
 
-__all__ = ["Fund", "StrategyNode", "StrategyTree"]
+__all__ = [
+    "Fund",
+    "NodePosition",
+    "PortfolioHierarchy",
+    "PositionTypeEnum",
+    "StrategyNode",
+    "StrategyTree",
+]
+
+DOCUMENT_MODELS = [
+    Fund,
+    NodePosition,
+    PortfolioHierarchy,
+    StrategyNode,
+    StrategyTree,
+]
 
 
 async def register_orm_models():
-    client = AsyncMongoClient("mongodb://localhost:27017")
-    db = client["hbc_test"]
-    await init_beanie(
-        db,
-        document_models=[
-            Fund,
-            StrategyNode,
-            StrategyTree,
-        ],
-    )
+    """在当前进程的共享客户端上注册模型，重复调用不会新建连接"""
+    from src.database.client import init_db  # noqa: PLC0415
+
+    return await init_db()
@@ -1,8 +1,7 @@
 from datetime import datetime
 
-from beanie import Document, Insert, Replace, Save, SaveChanges, Update, before_event
-from bleach import ALLOWED_ATTRIBUTES
-from pydantic import ConfigDict, Field
+from beanie import Document, Insert, Replace, SaveChanges, Update, before_event
+from pydantic import Field
 
 
 class BaseDocument(Document):
@@ -13,13 +12,10 @@ class BaseDocument(Document):
 
     @before_event(Insert)
     async def set_created_at(self):
-        print("set_created_at")
-        self.created_at = datetime.now()
-        self.updated_at = datetime.now()
+        self.created_at = self.updated_at = datetime.now()
 
     @before_event(Update, Replace, SaveChanges)
     async def set_updated_at(self):
-        print("set_updated_at")
         self.updated_at = datetime.now()
 
     # @before_event(Insert, Save)
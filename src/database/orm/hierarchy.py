@@ -0,0 +1,30 @@
+from beanie import PydanticObjectId
+from pydantic import Field
+from pymongo import ASCENDING, IndexModel
+
+from ._base import BaseDocument
+
+
+class PortfolioHierarchy(BaseDocument):
+    """层级关系，在 [start_date, end_date) 内 child 挂在 parent 下并使用 weight"""
+
+    fund_id: int = Field(..., description="基金id")
+    parent_node_id: PydanticObjectId = Field(..., description="父节点id")
+    child_node_id: PydanticObjectId = Field(..., description="子节点id")
+    weight: float = Field(..., description="权重, 0~1, 同一父节点下同一天的权重之和为1")
+    start_date: str = Field(..., description="生效日期, YYYY-MM-DD")
+    end_date: str | None = Field(default=None, description="失效日期(不含), None 表示仍然有效")
+
+    class Settings:
+        name = "portfolio_hierarchy"
+        indexes = [
+            IndexModel(
+                [("child_node_id", ASCENDING), ("start_date", ASCENDING)],
+                unique=True,
+            ),
+            # 区间查询：某基金某日有效的层级
+            IndexModel(
+                [("fund_id", ASCENDING), ("start_date", ASCENDING), ("end_date", ASCENDING)]
+            ),
+            IndexModel([("parent_node_id", ASCENDING), ("start_date", ASCENDING)]),
+        ]
@@ -0,0 +1,47 @@
+from enum import Enum
+
+from beanie import PydanticObjectId
+from pydantic import Field
+from pymongo import ASCENDING, IndexModel
+
+from ._base import BaseDocument
+
+
+class PositionTypeEnum(str, Enum):
+    """持仓类型"""
+
+    # 目标持仓
+    TARGET = "TARGET"
+    # 实际持仓
+    ACTUAL = "ACTUAL"
+
+
+class NodePosition(BaseDocument):
+    """节点持仓，一行一只股票，键为 (node_id, trading_day, position_type, symbol)"""
+
+    node_id: PydanticObjectId = Field(..., description="策略节点id")
+    trading_day: str = Field(..., description="交易日, YYYY-MM-DD")
+    position_type: PositionTypeEnum = Field(..., description="持仓类型")
+    symbol: str = Field(..., description="证券代码")
+    quantity: float = Field(default=0, description="持仓数量")
+    cost_price: float = Field(default=0, description="成本价")
+    market_value: float = Field(default=0, description="市值")
+    weight_in_node: float = Field(default=0, description="占节点股票市值的权重")
+
+    class Settings:
+        name = "node_position"
+        indexes = [
+            IndexModel(
+                [
+                    ("node_id", ASCENDING),
+                    ("trading_day", ASCENDING),
+                    ("position_type", ASCENDING),
+                    ("symbol", ASCENDING),
+                ],
+                unique=True,
+            ),
+            # 单只股票的历史
+            IndexModel([("node_id", ASCENDING), ("symbol", ASCENDING), ("trading_day", ASCENDING)]),
+            # 某日所有节点持有某只股票
+            IndexModel([("trading_day", ASCENDING), ("symbol", ASCENDING)]),
+        ]
@@ -2,7 +2,7 @@ from enum import Enum
 
 from beanie import PydanticObjectId
 from pydantic import Field
-from pymongo import IndexModel
+from pymongo import ASCENDING, IndexModel
 
 from src.entity.strategy import VirtualAccount
 
@@ -25,13 +25,32 @@ class StrategyNode(BaseDocument):
     name: str = Field(..., description="节点名称")
     info: dict | None = Field(default=None, description="策略信息")
     virtual_account: VirtualAccount = Field(default=VirtualAccount(), description="虚拟账户")
+    ancestors: list[PydanticObjectId] = Field(
+        default_factory=list, description="祖先节点id, 从根节点到父节点, 根节点为空"
+    )
+    depth: int = Field(default=0, description="节点深度, 根节点为0")
 
     class Settings:
         name = "strategy_node"
         indexes = [
             IndexModel("fund_id"),
+            IndexModel([("fund_id", ASCENDING), ("parent_id", ASCENDING)]),
+            IndexModel("ancestors"),
         ]
 
+    @classmethod
+    def child_of(cls, parent: "StrategyNode", **fields) -> "StrategyNode":
+        """创建 parent 的子节点，同时写好祖先路径和深度"""
+        if parent.id is None:
+            raise ValueError(f"父节点尚未保存: {parent.name}")
+        return cls(
+            fund_id=parent.fund_id,
+            parent_id=parent.id,
+            ancestors=[*parent.ancestors, parent.id],
+            depth=parent.depth + 1,
+            **fields,
+        )
+
 
 class RootStrategyNode(StrategyNode):
     """根节点"""
@@ -0,0 +1,76 @@
+"""
+节点持仓行
+
+节点的股票多头持仓按 (node_id, trading_day, position_type, symbol) 一行存放在
+node_position 集合中，不再随节点文档整体重写。本模块负责虚拟账户与持仓行之间的转换
+以及两次写入之间的增量比较，不依赖数据库驱动。
+"""
+
+from collections import defaultdict
+from collections.abc import Iterable, Mapping
+from typing import TYPE_CHECKING, Any
+
+import numpy as np
+
+from src.entity.position import StockPositionBook, StockPositionInfo
+
+if TYPE_CHECKING:
+    from src.entity.strategy import StrategyTree, VirtualAccount
+
+# 持仓行的唯一键
+POSITION_KEY = ("node_id", "trading_day", "position_type", "symbol")
+
+
+def account_position_rows(
+    account: "VirtualAccount", prices: np.ndarray | None = None
+) -> dict[str, dict[str, float]]:
+    """
+    股票多头持仓 -> {symbol: 持仓字段}
+    prices 与 get_stock_arrays() 的代码顺序对齐；未给出时市值和权重为 0
+    """
+    positions = list(account.stock_long_info)
+    if prices is None:
+        values = np.zeros(len(positions))
+    else:
+        amounts = np.fromiter((p.stock_amount for p in positions), np.float64, len(positions))
+        values = amounts * prices
+    total = values.sum()
+    weights = values / total if total > 0 else np.zeros(len(positions))
+    return {
+        position.stock_code: {
+            "quantity": position.stock_amount,
+            "cost_price": position.stock_cost,
+            "market_value": value,
+            "weight_in_node": weight,
+        }
+        for position, value, weight in zip(
+            positions, values.tolist(), weights.tolist(), strict=True
+        )
+    }
+
+
+def diff_position_rows(
+    previous: Mapping[str, Mapping[str, float]], current: Mapping[str, Mapping[str, float]]
+) -> tuple[dict[str, Mapping[str, float]], list[str]]:
+    """两次持仓之间的增量：(需要写入的行, 需要删除的代码)"""
+    upserts = {symbol: row for symbol, row in current.items() if previous.get(symbol) != row}
+    deletes = [symbol for symbol in previous if symbol not in current]
+    return upserts, deletes
+
+
+def attach_positions(root: "StrategyTree", rows: Iterable[Mapping[str, Any]]) -> None:
+    """把 node_position 行填回策略树各节点的股票多头持仓，没有持仓行的节点不变"""
+    by_node: defaultdict[Any, list[StockPositionInfo]] = defaultdict(list)
+    for row in rows:
+        by_node[row["node_id"]].append(
+            StockPositionInfo(
+                stock_code=row["symbol"], stock_amount=row["quantity"], stock_cost=row["cost_price"]
+            )
+        )
+
+    for node in root.tree_index.nodes:
+        positions = by_node.get(node.node_id)
+        if positions is None:
+            continue
+        account = node.virtual_account
+        account.stock_long_info = StockPositionBook(positions) if account.is_compact else positions
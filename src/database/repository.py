@@ -0,0 +1,237 @@
+"""
+策略树读写
+
+整棵树按 fund_id 一次扫描取回，子树按 ancestors 多键索引一次取回，再在内存中链接；
+每次加载只有一次数据库往返，与树的层数和节点数无关。
+持仓存放在 node_position 集合中，按 (node_id, trading_day, position_type, symbol) 读写。
+层级权重按区间存放在 portfolio_hierarchy 集合中，每个基金加载一次后在进程内解析任意一天的树。
+"""
+
+import asyncio
+from collections.abc import Mapping, Sequence
+from datetime import datetime
+from typing import Any
+
+from beanie import PydanticObjectId
+from pymongo import DeleteMany, DeleteOne, InsertOne, UpdateOne
+
+from src.entity.strategy import StrategyTree
+
+from .hierarchy import VersionedHierarchy, initial_hierarchy_rows
+from .orm.hierarchy import PortfolioHierarchy
+from .orm.position import NodePosition, PositionTypeEnum
+from .orm.strategy import StrategyNode
+from .positions import attach_positions, diff_position_rows
+from .tree_link import link_strategy_nodes, materialize_ancestors
+
+# 读取持仓时默认返回的字段
+POSITION_PROJECTION = {
+    "_id": 0,
+    "node_id": 1,
+    "trading_day": 1,
+    "symbol": 1,
+    "quantity": 1,
+    "cost_price": 1,
+    "market_value": 1,
+    "weight_in_node": 1,
+}
+
+# 基金id -> 带版本层级，进程内缓存
+_hierarchies: dict[int, VersionedHierarchy] = {}
+
+
+async def load_strategy_tree(fund_id: int, trading_day: str | None = None) -> StrategyTree:
+    """
+    加载基金的整棵策略树，命中 (fund_id, parent_id) 索引
+    trading_day: 同时加载该交易日的实际持仓（再一次查询）
+    """
+    rows = await StrategyNode.get_pymongo_collection().find({"fund_id": fund_id}).to_list()
+    if not rows:
+        raise ValueError(f"基金没有策略树: {fund_id}")
+    root = link_strategy_nodes(rows)
+    if trading_day is not None:
+        node_ids = [row["_id"] for row in rows]
+        attach_positions(
+            root, await find_node_positions(node_ids, trading_day, PositionTypeEnum.ACTUAL)
+        )
+    return root
+
+
+async def load_strategy_subtree(node_id: PydanticObjectId) -> StrategyTree:
+    """加载以 node_id 为根的子树，命中 ancestors 索引"""
+    rows = (
+        await StrategyNode.get_pymongo_collection()
+        .find({"$or": [{"_id": node_id}, {"ancestors": node_id}]})
+        .to_list()
+    )
+    if not rows:
+        raise ValueError(f"策略节点不存在: {node_id}")
+    return link_strategy_nodes(rows, root_id=node_id)
+
+
+async def backfill_ancestors(fund_id: int) -> int:
+    """按 parent_id 回填 ancestors 和 depth，返回修改的节点数"""
+    collection = StrategyNode.get_pymongo_collection()
+    rows = await collection.find(
+        {"fund_id": fund_id}, {"parent_id": 1, "ancestors": 1, "depth": 1}
+    ).to_list()
+    current = {row["_id"]: row.get("ancestors") for row in rows}
+    requests = [
+        UpdateOne({"_id": node_id}, {"$set": {"ancestors": path, "depth": len(path)}})
+        for node_id, path in materialize_ancestors(rows).items()
+        if current[node_id] != path
+    ]
+    if not requests:
+        return 0
+    result = await collection.bulk_write(requests, ordered=False)
+    return result.modified_count
+
+
+async def find_node_positions(
+    node_ids: Sequence[PydanticObjectId],
+    trading_day: str,
+    position_type: PositionTypeEnum = PositionTypeEnum.ACTUAL,
+    symbols: Sequence[str] | None = None,
+) -> list[dict[str, Any]]:
+    """一组节点某交易日的持仓行，可只取部分股票，不加载节点文档"""
+    query: dict[str, Any] = {
+        "node_id": {"$in": list(node_ids)},
+        "trading_day": trading_day,
+        "position_type": position_type.value,
+    }
+    if symbols is not None:
+        query["symbol"] = {"$in": list(symbols)}
+    collection = NodePosition.get_pymongo_collection()
+    return await collection.find(query, POSITION_PROJECTION).to_list()
+
+
+async def find_symbol_history(
+    node_id: PydanticObjectId,
+    symbol: str,
+    start: str,
+    end: str,
+    position_type: PositionTypeEnum = PositionTypeEnum.ACTUAL,
+) -> list[dict[str, Any]]:
+    """节点单只股票在 [start, end] 内的逐日持仓，命中 (node_id, symbol, trading_day) 索引"""
+    query = {
+        "node_id": node_id,
+        "symbol": symbol,
+        "trading_day": {"$gte": start, "$lte": end},
+        "position_type": position_type.value,
+    }
+    collection = NodePosition.get_pymongo_collection()
+    return await collection.find(query, POSITION_PROJECTION).sort("trading_day").to_list()
+
+
+async def save_node_positions(
+    node_id: PydanticObjectId,
+    trading_day: str,
+    position_type: PositionTypeEnum,
+    rows: Mapping[str, Mapping[str, float]],
+    previous: Mapping[str, Mapping[str, float]] | None = None,
+) -> int:
+    """
+    写入节点某交易日的持仓 {symbol: 字段}，一次无序 bulk_write
+    previous: 上次写入的持仓，给出时只 upsert 变化的行并删除清仓的行；
+    未给出时写入全部行并删除该日其余行
+    """
+    collection = NodePosition.get_pymongo_collection()
+    key = {"node_id": node_id, "trading_day": trading_day, "position_type": position_type.value}
+    now = datetime.now()
+    requests: list[Any] = []
+    if previous is None:
+        upserts, deletes = rows, []
+        requests.append(DeleteMany({**key, "symbol": {"$nin": list(rows)}}))
+    else:
+        upserts, deletes = diff_position_rows(previous, rows)
+    requests.extend(
+        UpdateOne(
+            {**key, "symbol": symbol},
+            {"$set": {**row, "updated_at": now}, "$setOnInsert": {"created_at": now}},
+            upsert=True,
+        )
+        for symbol, row in upserts.items()
+    )
+    requests.extend(DeleteOne({**key, "symbol": symbol}) for symbol in deletes)
+    if not requests:
+        return 0
+    await collection.bulk_write(requests, ordered=False)
+    return len(requests)
+
+
+async def load_hierarchy(fund_id: int, refresh: bool = False) -> VersionedHierarchy:
+    """基金的带版本层级，节点和层级各一次查询，之后复用进程内缓存"""
+    hierarchy = _hierarchies.get(fund_id)
+    if hierarchy is None or refresh:
+        node_rows, hierarchy_rows = await asyncio.gather(
+            StrategyNode.get_pymongo_collection()
+            .find({"fund_id": fund_id}, {"virtual_account": 0})
+            .to_list(),
+            PortfolioHierarchy.get_pymongo_collection().find({"fund_id": fund_id}).to_list(),
+        )
+        if not node_rows:
+            raise ValueError(f"基金没有策略树: {fund_id}")
+        hierarchy = _hierarchies[fund_id] = VersionedHierarchy(node_rows, hierarchy_rows)
+    return hierarchy
+
+
+async def load_strategy_tree_as_of(
+    fund_id: int, day: str, with_positions: bool = False
+) -> StrategyTree:
+    """
+    day 当天结构和权重下的策略树
+    with_positions: 同时加载当天的实际持仓
+    """
+    tree = (await load_hierarchy(fund_id)).tree_as_of(day)
+    if with_positions:
+        node_ids = [node.node_id for node in tree.tree_index.nodes]
+        attach_positions(tree, await find_node_positions(node_ids, day))
+    return tree
+
+
+async def set_hierarchy_weight(
+    fund_id: int,
+    child_id: PydanticObjectId,
+    parent_id: PydanticObjectId,
+    weight: float,
+    start_date: str,
+) -> None:
+    """
+    从 start_date 起调整子节点的父节点和权重：关闭当前区间并追加新区间，一次 bulk_write
+    写入失败时丢弃进程内缓存，下次加载时重新读取
+    """
+    hierarchy = await load_hierarchy(fund_id)
+    closed, inserted = hierarchy.set_weight(child_id, parent_id, weight, start_date)
+    now = datetime.now()
+    requests: list[Any] = [
+        InsertOne({**row, "fund_id": fund_id, "created_at": now, "updated_at": now})
+        for row in inserted
+    ]
+    if closed is not None:
+        requests.append(
+            UpdateOne(
+                {"child_node_id": child_id, "start_date": closed["start_date"]},
+                {"$set": {"end_date": closed["end_date"], "updated_at": now}},
+            )
+        )
+    try:
+        await PortfolioHierarchy.get_pymongo_collection().bulk_write(requests, ordered=False)
+    except Exception:
+        _hierarchies.pop(fund_id, None)
+        raise
+
+
+async def backfill_hierarchy(fund_id: int, start_date: str) -> int:
+    """为没有层级记录的节点按当前 parent_id 和 weight 写入初始层级，返回写入条数"""
+    hierarchy = await load_hierarchy(fund_id, refresh=True)
+    now = datetime.now()
+    rows = [
+        {**row, "fund_id": fund_id, "created_at": now, "updated_at": now}
+        for row in initial_hierarchy_rows(hierarchy.node_rows, start_date)
+        if row["child_node_id"] not in hierarchy.index
+    ]
+    if not rows:
+        return 0
+    await PortfolioHierarchy.get_pymongo_collection().insert_many(rows, ordered=False)
+    await load_hierarchy(fund_id, refresh=True)
+    return len(rows)
@@ -0,0 +1,80 @@
+"""
+策略节点行 -> StrategyTree
+
+数据库中的策略树以 parent_id 邻接行存储。一次查询取回整棵树（或子树）的所有行后，
+在内存中按 parent_id 分组链接成 StrategyTree，不需要逐层查询。
+本模块只处理原始文档（dict），不依赖数据库驱动。
+"""
+
+from collections import defaultdict
+from collections.abc import Iterable, Mapping
+from typing import Any
+
+from src.entity.strategy import StrategyTree, VirtualAccount
+
+
+def link_strategy_nodes(rows: Iterable[Mapping[str, Any]], root_id: Any = None) -> StrategyTree:
+    """
+    把 strategy_node 集合的原始文档链接成策略树
+    root_id: 子树根节点id；为 None 时以唯一没有父节点（或父节点不在 rows 中）的行为根
+    同一父节点下的子节点按 _id 排序，即插入顺序
+    """
+    rows = sorted(rows, key=lambda row: (row.get("depth", 0), row["_id"]))
+    if not rows:
+        raise ValueError("策略节点为空")
+
+    ids = {row["_id"] for row in rows}
+    nodes: dict[Any, StrategyTree] = {}
+    children: defaultdict[Any, list[StrategyTree]] = defaultdict(list)
+    roots = []
+    for row in rows:
+        node = StrategyTree(
+            fund_id=row["fund_id"],
+            weight=row.get("weight", 1),
+            name=row["name"],
+            virtual_account=VirtualAccount.model_validate(row.get("virtual_account") or {}),
+            strategy_info=row.get("info") or {},
+        )
+        node.node_id = row["_id"]
+        nodes[row["_id"]] = node
+        parent_id = row.get("parent_id")
+        if root_id is None and (parent_id is None or parent_id not in ids):
+            roots.append(node)
+        else:
+            children[parent_id].append(node)
+
+    for node_id, node in nodes.items():
+        node.children = children.get(node_id, [])
+
+    if root_id is not None:
+        if root_id not in nodes:
+            raise ValueError(f"根节点不存在: {root_id}")
+        return nodes[root_id]
+    if len(roots) != 1:
+        raise ValueError(f"策略树须有且只有一个根节点: {[node.name for node in roots]}")
+    return roots[0]
+
+
+def materialize_ancestors(rows: Iterable[Mapping[str, Any]]) -> dict[Any, list[Any]]:
+    """
+    由 parent_id 计算每个节点的祖先路径（从根节点到父节点），用于回填 ancestors 字段
+    """
+    parents = {row["_id"]: row.get("parent_id") for row in rows}
+    ancestors: dict[Any, list[Any]] = {}
+
+    def resolve(node_id: Any, seen: frozenset) -> list[Any]:
+        if node_id in ancestors:
+            return ancestors[node_id]
+        if node_id in seen:
+            raise ValueError(f"策略节点存在环: {node_id}")
+        parent_id = parents[node_id]
+        if parent_id is None or parent_id not in parents:
+            path = []
+        else:
+            path = [*resolve(parent_id, seen | {node_id}), parent_id]
+        ancestors[node_id] = path
+        return path
+
+    for node_id in parents:
+        resolve(node_id, frozenset())
+    return ancestors
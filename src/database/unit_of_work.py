@@ -0,0 +1,289 @@
+"""
+策略树批量写入
+
+跟踪一棵策略树，记录每个节点上次写入时的字段快照。提交时只比较快照找出变化的字段，
+所有变更合并为一次无序 bulk_write：新增节点按 _id upsert 整个文档（重试幂等），
+修改节点 UpdateOne $set 变化的字段（虚拟账户细到子字段，移动节点时包括父节点和祖先路径），
+已从树中移除的节点 DeleteOne。时间戳每批只取一次，不经过 BaseDocument 的逐文档事件钩子。
+
+指定交易日时，股票多头持仓不写入节点文档，而是按行增量写入 node_position 集合：
+变化的行 upsert，清仓的行删除；移除节点时同时删除该节点的全部持仓行。
+"""
+
+import asyncio
+from collections.abc import Callable, Iterator
+from datetime import datetime
+from typing import TYPE_CHECKING, Any
+
+from .positions import account_position_rows, diff_position_rows
+
+if TYPE_CHECKING:
+    from src.entity.strategy import StrategyTree
+
+# 持仓市值的估值时点
+CLOSE_TIME = "15:00:00"
+
+
+def node_fields(
+    node: "StrategyTree", ancestors: list[Any], positions: bool = True
+) -> dict[str, Any]:
+    """
+    节点中可修改的 strategy_node 文档字段，虚拟账户展开为 virtual_account.<子字段>
+    ancestors: 从根节点到父节点的节点id
+    positions: 是否包含股票多头持仓
+    """
+    fields = _tree_fields(node, ancestors)
+    exclude = None if positions else {"stock_long_info"}
+    for key, value in node.virtual_account.model_dump(exclude=exclude).items():
+        fields[f"virtual_account.{key}"] = value
+    return fields
+
+
+def _tree_fields(node: "StrategyTree", ancestors: list[Any]) -> dict[str, Any]:
+    """节点文档中除虚拟账户以外的可修改字段"""
+    return {
+        "parent_id": ancestors[-1] if ancestors else None,
+        "ancestors": ancestors,
+        "depth": len(ancestors),
+        "weight": node.weight,
+        "name": node.name,
+        "info": node.strategy_info or None,
+    }
+
+
+class StrategyUnitOfWork:
+    """
+    策略树的工作单元
+    id_factory: 新增节点的id生成函数，默认使用 bson.ObjectId
+    trading_day: 持仓所属交易日，为 None 时持仓随节点文档写入
+    close_time: 持仓市值按 trading_day 该时点的价格计算
+    """
+
+    def __init__(
+        self,
+        root: "StrategyTree | None" = None,
+        id_factory: Callable[[], Any] | None = None,
+        trading_day: str | None = None,
+        close_time: str = CLOSE_TIME,
+    ) -> None:
+        self._id_factory = id_factory
+        self.trading_day = trading_day
+        self.close_time = close_time
+        self._roots: list[StrategyTree] = []
+        # 节点id -> 上次写入时的字段
+        self._snapshots: dict[Any, dict[str, Any]] = {}
+        # 节点id -> 上次写入 trading_day 的持仓行
+        self._positions: dict[Any, dict[str, dict[str, float]]] = {}
+        # 最近一次 collect_positions 计算出的持仓行
+        self._collected: dict[Any, dict[str, dict[str, float]]] = {}
+        # 已分配id但尚未确认写入的新增节点，重试时仍整体 upsert
+        self._pending: set[Any] = set()
+        if root is not None:
+            self.track(root)
+
+    @property
+    def separate_positions(self) -> bool:
+        return self.trading_day is not None
+
+    def track(self, root: "StrategyTree") -> None:
+        """
+        跟踪一棵树，root 应为整棵策略树的根节点
+        已有 node_id 的节点以当前状态为快照（持仓视为已是 trading_day 的持仓），
+        其余节点在提交时新增
+        """
+        self._roots.append(root)
+        for node, ancestors in self._walk(root):
+            if node.node_id is not None:
+                self._snapshots[node.node_id] = self._fields(node, ancestors)
+                if self.separate_positions:
+                    self._positions[node.node_id] = self._position_rows(node)
+
+    @staticmethod
+    def _walk(root: "StrategyTree") -> Iterator[tuple["StrategyTree", list[Any]]]:
+        """
+        先序遍历，附带每个节点从根到父节点的 node_id
+        祖先路径在产出节点时才读取父节点的 node_id，遍历中给父节点分配的id对子节点可见
+        """
+        index = root.tree_index
+        paths: list[list[Any]] = []
+        for node, parent in zip(index.nodes, index.parent.tolist(), strict=True):
+            ancestors = [] if parent < 0 else [*paths[parent], index.nodes[parent].node_id]
+            paths.append(ancestors)
+            yield node, ancestors
+
+    def _fields(self, node: "StrategyTree", ancestors: list[Any]) -> dict[str, Any]:
+        return node_fields(node, ancestors, not self.separate_positions)
+
+    def set_trading_day(self, trading_day: str) -> None:
+        """切换交易日，新交易日的持仓行在下次提交时全部写入"""
+        if trading_day != self.trading_day:
+            self.trading_day = trading_day
+            self._positions.clear()
+
+    def _position_rows(self, node: "StrategyTree") -> dict[str, dict[str, float]]:
+        account = node.virtual_account
+        codes, _ = account.get_stock_arrays()
+        if not codes:
+            return {}
+        prices = node.price_provider.get_prices(codes, f"{self.trading_day} {self.close_time}")
+        return account_position_rows(account, prices)
+
+    def _new_id(self) -> Any:
+        if self._id_factory is None:
+            from bson import ObjectId  # noqa: PLC0415
+
+            self._id_factory = ObjectId
+        return self._id_factory()
+
+    def collect(
+        self, now: datetime
+    ) -> tuple[list[dict[str, Any]], list[tuple[Any, dict[str, Any]]], list[Any]]:
+        """
+        计算待写入的变更：(新增文档, [(节点id, $set 字段)], 待删除的节点id)
+        新增节点在此分配 node_id；写入失败后重试时仍作为新增文档按 _id upsert
+        """
+        inserts: list[dict[str, Any]] = []
+        updates: list[tuple[Any, dict[str, Any]]] = []
+        seen: set[Any] = set()
+        for root in self._roots:
+            for node, ancestors in self._walk(root):
+                if node.node_id is None:
+                    node.node_id = self._new_id()
+                    self._pending.add(node.node_id)
+                seen.add(node.node_id)
+                if node.node_id in self._pending:
+                    account = node.virtual_account.model_dump()
+                    if self.separate_positions:
+                        account["stock_long_info"] = []
+                    document = {
+                        "_id": node.node_id,
+                        "fund_id": node.fund_id,
+                        **_tree_fields(node, ancestors),
+                        "virtual_account": account,
+                        "created_at": now,
+                        "updated_at": now,
+                    }
+                    inserts.append(document)
+                    continue
+
+                previous = self._snapshots.get(node.node_id, {})
+                changed = {
+                    key: value
+                    for key, value in self._fields(node, ancestors).items()
+                    if previous.get(key) != value
+                }
+                if changed:
+                    updates.append((node.node_id, {**changed, "updated_at": now}))
+
+        deletes = [node_id for node_id in self._snapshots if node_id not in seen]
+        return inserts, updates, deletes
+
+    def collect_positions(
+        self, now: datetime
+    ) -> tuple[list[tuple[dict[str, Any], dict[str, Any]]], list[dict[str, Any]]]:
+        """
+        计算 trading_day 的持仓增量：([(持仓键, $set 字段)], [待删除的持仓键])
+        应在 collect 之后调用，新增节点此时已有 node_id
+        """
+        upserts: list[tuple[dict[str, Any], dict[str, Any]]] = []
+        deletes: list[dict[str, Any]] = []
+        self._collected = {}
+        if not self.separate_positions:
+            return upserts, deletes
+
+        for root in self._roots:
+            for node in root.tree_index.nodes:
+                current = self._position_rows(node)
+                self._collected[node.node_id] = current
+                previous = self._positions.get(node.node_id, {})
+                changed, removed = diff_position_rows(previous, current)
+                key = {"node_id": node.node_id, "trading_day": self.trading_day}
+                upserts.extend(
+                    (
+                        {**key, "position_type": "ACTUAL", "symbol": symbol},
+                        {**row, "updated_at": now},
+                    )
+                    for symbol, row in changed.items()
+                )
+                deletes.extend(
+                    {**key, "position_type": "ACTUAL", "symbol": symbol} for symbol in removed
+                )
+        return upserts, deletes
+
+    def commit(
+        self,
+        inserts: list[dict[str, Any]],
+        updates: list[tuple[Any, dict]],
+        deletes: list[Any],
+    ) -> None:
+        """写入成功后把已写入的节点状态记为新快照，删除的节点不再跟踪"""
+        written = {document["_id"] for document in inserts} | {node_id for node_id, _ in updates}
+        self._pending -= written
+        for root in self._roots:
+            for node, ancestors in self._walk(root):
+                if node.node_id in written:
+                    self._snapshots[node.node_id] = self._fields(node, ancestors)
+        for node_id in deletes:
+            self._snapshots.pop(node_id, None)
+            self._positions.pop(node_id, None)
+
+    def commit_positions(self) -> None:
+        """持仓写入成功后把最近一次计算的持仓记为 trading_day 的快照"""
+        self._positions.update(self._collected)
+        self._collected = {}
+
+    async def flush(self, collection: Any = None, position_collection: Any = None) -> int:
+        """
+        节点和持仓各一次无序 bulk_write，两者并发执行，返回写入的文档数
+        所有操作都是幂等的，部分失败后可直接重试
+        """
+        from pymongo import DeleteMany, DeleteOne, UpdateOne  # noqa: PLC0415
+
+        now = datetime.now()
+        inserts, updates, deletes = self.collect(now)
+        upserts, position_deletes = self.collect_positions(now)
+        writes = []
+        if inserts or updates or deletes:
+            if collection is None:
+                from .orm.strategy import StrategyNode  # noqa: PLC0415
+
+                collection = StrategyNode.get_pymongo_collection()
+            requests = [
+                UpdateOne(
+                    {"_id": document["_id"]},
+                    {
+                        "$set": {
+                            key: value
+                            for key, value in document.items()
+                            if key not in {"_id", "created_at"}
+                        },
+                        "$setOnInsert": {"created_at": document["created_at"]},
+                    },
+                    upsert=True,
+                )
+                for document in inserts
+            ]
+            requests.extend(
+                UpdateOne({"_id": node_id}, {"$set": fields}) for node_id, fields in updates
+            )
+            requests.extend(DeleteOne({"_id": node_id}) for node_id in deletes)
+            writes.append(collection.bulk_write(requests, ordered=False))
+        if upserts or position_deletes or deletes:
+            if position_collection is None:
+                from .orm.position import NodePosition  # noqa: PLC0415
+
+                position_collection = NodePosition.get_pymongo_collection()
+            requests = [
+                UpdateOne(key, {"$set": fields, "$setOnInsert": {"created_at": now}}, upsert=True)
+                for key, fields in upserts
+            ]
+            requests.extend(DeleteOne(key) for key in position_deletes)
+            requests.extend(DeleteMany({"node_id": node_id}) for node_id in deletes)
+            writes.append(position_collection.bulk_write(requests, ordered=False))
+        if not writes:
+            return 0
+
+        await asyncio.gather(*writes)
+        self.commit(inserts, updates, deletes)
+        self.commit_positions()
+        return len(inserts) + len(updates) + len(deletes) + len(upserts) + len(position_deletes)
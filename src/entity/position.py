@@ -0,0 +1,277 @@
+"""
+列式持仓存储
+
+每个账户的股票持仓按股票代码合并为一行，三列数据（代码索引、持仓数量、持仓成本）
+保存在连续的 numpy 数组中。代码索引来自全局 `symbol_index`，不同账户的持仓
+可以直接对齐到同一个价格向量上计算市值。
+"""
+
+import copy
+from collections.abc import Iterable, Iterator
+
+import numpy as np
+from pydantic import BaseModel, Field
+from pydantic_core import core_schema
+
+
+class StockPositionInfo(BaseModel):
+    """
+    股票持仓信息
+    """
+
+    # 股票代码
+    stock_code: str = Field(description="股票代码")
+    # 股票数量
+    stock_amount: float = Field(description="股票数量")
+    # 股票成本
+    stock_cost: float = Field(description="股票成本")
+
+
+class SymbolIndex:
+    """股票代码与整数索引的双向映射，索引只增不减"""
+
+    def __init__(self) -> None:
+        self._codes: list[str] = []
+        self._index: dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._codes)
+
+    def __contains__(self, stock_code: str) -> bool:
+        return stock_code in self._index
+
+    def get(self, stock_code: str) -> int | None:
+        """获取已登记的索引，不分配新索引"""
+        return self._index.get(stock_code)
+
+    def index(self, stock_code: str) -> int:
+        """获取股票代码的索引，不存在时分配新索引"""
+        idx = self._index.get(stock_code)
+        if idx is None:
+            idx = len(self._codes)
+            self._index[stock_code] = idx
+            self._codes.append(stock_code)
+        return idx
+
+    def indices(self, stock_codes: Iterable[str]) -> np.ndarray:
+        """批量获取索引"""
+        return np.fromiter((self.index(code) for code in stock_codes), dtype=np.int32)
+
+    def code(self, idx: int) -> str:
+        return self._codes[idx]
+
+    def codes(self, indices: Iterable[int]) -> list[str]:
+        return [self._codes[i] for i in indices]
+
+
+# 全局代码索引
+symbol_index = SymbolIndex()
+
+
+class StockPositionBook:
+    """
+    列式股票持仓簿
+    同一股票只保留一行，加仓时按数量加权合并成本；删除采用末行填补，不保证顺序。
+    对外保留 list[StockPositionInfo] 的读取接口（迭代、下标、len、append、pop、clear），
+    迭代得到的是持仓快照，修改持仓需要通过 add / reduce。
+    fork 得到的副本与原持仓簿共享列数组，任一方第一次写入前才复制（写时复制）。
+    """
+
+    __slots__ = ("_amount", "_code_idx", "_cost", "_rows", "_shared", "_size")
+
+    _INITIAL_CAPACITY = 16
+
+    def __init__(self, positions: Iterable[StockPositionInfo] = ()) -> None:
+        self._code_idx = np.empty(self._INITIAL_CAPACITY, dtype=np.int32)
+        self._amount = np.empty(self._INITIAL_CAPACITY, dtype=np.float64)
+        self._cost = np.empty(self._INITIAL_CAPACITY, dtype=np.float64)
+        self._rows: dict[int, int] = {}
+        self._size = 0
+        self._shared = False
+        self.extend(positions)
+
+    # ---------------------------------------------------------------- 列视图
+    @property
+    def code_idx(self) -> np.ndarray:
+        """代码索引列（只读视图）"""
+        return self._readonly(self._code_idx)
+
+    @property
+    def amounts(self) -> np.ndarray:
+        """持仓数量列（只读视图）"""
+        return self._readonly(self._amount)
+
+    @property
+    def costs(self) -> np.ndarray:
+        """持仓成本列（只读视图）"""
+        return self._readonly(self._cost)
+
+    @property
+    def codes(self) -> list[str]:
+        return symbol_index.codes(self._code_idx[: self._size])
+
+    def _readonly(self, column: np.ndarray) -> np.ndarray:
+        view = column[: self._size]
+        view.flags.writeable = False
+        return view
+
+    # ---------------------------------------------------------------- 写入
+    def add(self, stock_code: str, amount: float, price: float) -> None:
+        """买入：已有持仓则合并，成本按数量加权"""
+        if amount <= 0:
+            return
+
+        self._detach()
+        idx = symbol_index.index(stock_code)
+        row = self._rows.get(idx)
+        if row is None:
+            self._append_row(idx, amount, price)
+            return
+
+        old_amount = self._amount[row]
+        new_amount = old_amount + amount
+        self._cost[row] = (old_amount * self._cost[row] + amount * price) / new_amount
+        self._amount[row] = new_amount
+
+    def reduce(self, stock_code: str, amount: float, dust: float = 0.0) -> float:
+        """
+        卖出：返回实际减少的数量
+        剩余数量不超过 dust 时视为清仓并移除该行
+        """
+        row = self._rows.get(symbol_index.get(stock_code))
+        if row is None or amount <= 0:
+            return 0.0
+
+        self._detach()
+        reduced = min(amount, self._amount[row])
+        self._amount[row] -= reduced
+        if self._amount[row] <= dust:
+            self._remove_row(row)
+        return float(reduced)
+
+    def amount(self, stock_code: str) -> float:
+        """持有数量，未持有返回0"""
+        row = self._rows.get(symbol_index.get(stock_code))
+        return 0.0 if row is None else float(self._amount[row])
+
+    def market_value(self, prices: np.ndarray) -> float:
+        """按行对齐的价格向量计算市值"""
+        return float(self._amount[: self._size] @ prices)
+
+    def _detach(self) -> None:
+        """与其他持仓簿共享列数组时，写入前先复制一份"""
+        if not self._shared:
+            return
+        self._code_idx = self._code_idx.copy()
+        self._amount = self._amount.copy()
+        self._cost = self._cost.copy()
+        self._rows = self._rows.copy()
+        self._shared = False
+
+    def _append_row(self, idx: int, amount: float, cost: float) -> None:
+        if self._size == len(self._amount):
+            self._grow()
+        row = self._size
+        self._code_idx[row] = idx
+        self._amount[row] = amount
+        self._cost[row] = cost
+        self._rows[idx] = row
+        self._size += 1
+
+    def _remove_row(self, row: int) -> None:
+        last = self._size - 1
+        del self._rows[int(self._code_idx[row])]
+        if row != last:
+            self._code_idx[row] = self._code_idx[last]
+            self._amount[row] = self._amount[last]
+            self._cost[row] = self._cost[last]
+            self._rows[int(self._code_idx[row])] = row
+        self._size = last
+
+    def _grow(self) -> None:
+        capacity = max(len(self._amount) * 2, self._INITIAL_CAPACITY)
+        for name in ("_code_idx", "_amount", "_cost"):
+            column = getattr(self, name)
+            grown = np.empty(capacity, dtype=column.dtype)
+            grown[: self._size] = column[: self._size]
+            setattr(self, name, grown)
+
+    # ---------------------------------------------------------------- list 兼容接口
+    def __len__(self) -> int:
+        return self._size
+
+    def __bool__(self) -> bool:
+        return self._size > 0
+
+    def __getitem__(self, row: int) -> StockPositionInfo:
+        if row < 0:
+            row += self._size
+        if not 0 <= row < self._size:
+            raise IndexError("持仓下标越界")
+        return StockPositionInfo(
+            stock_code=symbol_index.code(int(self._code_idx[row])),
+            stock_amount=float(self._amount[row]),
+            stock_cost=float(self._cost[row]),
+        )
+
+    def __iter__(self) -> Iterator[StockPositionInfo]:
+        for row in range(self._size):
+            yield self[row]
+
+    def append(self, position: StockPositionInfo) -> None:
+        self.add(position.stock_code, position.stock_amount, position.stock_cost)
+
+    def extend(self, positions: Iterable[StockPositionInfo]) -> None:
+        for position in positions:
+            self.append(position)
+
+    def pop(self, row: int = -1) -> StockPositionInfo:
+        position = self[row]
+        self._detach()
+        self._remove_row(row % self._size)
+        return position
+
+    def clear(self) -> None:
+        self._detach()
+        self._rows.clear()
+        self._size = 0
+
+    def to_list(self) -> list[StockPositionInfo]:
+        return list(self)
+
+    def __copy__(self) -> "StockPositionBook":
+        book = StockPositionBook.__new__(StockPositionBook)
+        book._code_idx = self._code_idx.copy()
+        book._amount = self._amount.copy()
+        book._cost = self._cost.copy()
+        book._rows = self._rows.copy()
+        book._size = self._size
+        book._shared = False
+        return book
+
+    def fork(self) -> "StockPositionBook":
+        """共享列数组的副本，双方在各自第一次写入前复制"""
+        book = StockPositionBook.__new__(StockPositionBook)
+        book._code_idx = self._code_idx
+        book._amount = self._amount
+        book._cost = self._cost
+        book._rows = self._rows
+        book._size = self._size
+        book._shared = self._shared = True
+        return book
+
+    def __deepcopy__(self, memo: dict) -> "StockPositionBook":
+        return copy.copy(self)
+
+    def __repr__(self) -> str:
+        return f"StockPositionBook(size={self._size})"
+
+    @classmethod
+    def __get_pydantic_core_schema__(cls, source, handler) -> core_schema.CoreSchema:
+        # 只接受已构造的持仓簿；序列化为与 list 后端相同的结构
+        return core_schema.is_instance_schema(
+            cls,
+            serialization=core_schema.plain_serializer_function_ser_schema(
+                lambda book: [position.model_dump() for position in book]
+            ),
+        )
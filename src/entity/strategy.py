@@ -1,45 +1,63 @@
 from enum import Enum
-from typing import Literal
+from typing import Any, Literal
 
-from pydantic import BaseModel, Field
+import numpy as np
+from pydantic import BaseModel, ConfigDict, Field, PrivateAttr
 
+from src.core.aggregation import aggregate_orders
+from src.core.crossing import CrossAllocationEnum, CrossReport, cross_orders
+from src.core.execution import ExecutionResult, ExecutionSimulator, FixedRateFillModel
+from src.core.fill import UnfilledReport, distribute_fills
+from src.core.futures import get_futures_registry
+from src.core.hedging import HedgeActionEnum, HedgeOrder, HedgePlan, HedgeSolver
+from src.core.nav import NavLedger
+from src.core.portfolio import PortfolioOptimizer
+from src.core.price import PriceProvider, get_price_provider
+from src.core.trace import tracer
+from src.core.tree_index import TreeIndex
+from src.core.valuation import TreeValuation, ValuationEngine, futures_margin
 
-class TradeDirection(str, Enum):
-    """交易方向"""
+from .alpha import BaseAlphaStrategy
+from .position import StockPositionBook, StockPositionInfo
+from .trade import TradeDirection, TradeOrder
 
-    BUY = "BUY"
-    SELL = "SELL"
 
+class TradeOptimizer(BaseModel):
+    """交易优化器"""
 
-class TradeOrder(BaseModel):
-    """交易单"""
-
-    strategy_name: str = Field(description="策略名称")
-    stock_code: str = Field(description="股票代码")
-    direction: TradeDirection = Field(description="交易方向")
-    target_shares: float = Field(description="目标股数")
-    target_value: float = Field(description="目标金额")
-    price: float = Field(description="价格")
-    priority: int = Field(default=1, description="优先级，1最高")
-    executed_shares: float = Field(default=0, description="已成交股数")
-    executed_value: float = Field(default=0, description="已成交金额")
-
-    @property
-    def remaining_shares(self) -> float:
-        return self.target_shares - self.executed_shares
-
-    @property
-    def remaining_value(self) -> float:
-        return self.target_value - self.executed_value
-
-    @property
-    def execution_ratio(self) -> float:
-        """成交比例"""
-        return self.executed_shares / self.target_shares if self.target_shares > 0 else 0
+    model_config = ConfigDict(arbitrary_types_allowed=True)
 
+    price_provider: PriceProvider | None = Field(
+        default=None, description="价格来源，缺省使用策略树的价格来源"
+    )
+    portfolio_optimizer: PortfolioOptimizer | None = Field(
+        default=None, description="组合优化器，按 alpha 策略的约束求解目标权重"
+    )
 
-class TradeOptimizer(BaseModel):
-    """交易优化器"""
+    def construct_target_weights(
+        self,
+        strategy: "StrategyTree",
+        alpha_strategy: BaseAlphaStrategy,
+        codes: list[str],
+        alpha: np.ndarray,
+        trade_date: str,
+    ) -> dict[str, float]:
+        """
+        按 alpha 策略的约束求解目标权重，当前持仓作为换手约束的起点，不再持有的股票权重为 0
+        求解未在迭代次数内收敛时报错，不使用不满足约束的权重
+        """
+        if self.portfolio_optimizer is None:
+            raise ValueError("未设置组合优化器")
+        previous = strategy._calculate_current_allocations()
+        solution = self.portfolio_optimizer.solve(
+            alpha_strategy, codes, alpha, trade_date, previous, key=strategy.name
+        )
+        if not solution.converged:
+            raise ValueError(
+                f"组合优化未收敛: {strategy.name}，迭代 {solution.iterations} 次，"
+                "可提高 max_iter 或设置正的 risk_aversion"
+            )
+        return {**dict.fromkeys(previous, 0.0), **solution.to_dict()}
 
     def generate_target_weights(
         self, strategy: "StrategyTree", market_signal: dict
@@ -70,13 +88,17 @@ class TradeOptimizer(BaseModel):
         total_value = strategy._calculate_total_position_value()
         current_allocations = strategy._calculate_current_allocations()
 
-        for stock_code, target_weight in target_weights.items():
+        # 一次批量取价
+        stock_codes = list(target_weights)
+        provider = self.price_provider or strategy.price_provider
+        stock_prices = provider.get_prices(stock_codes).tolist()
+
+        for stock_code, stock_price in zip(stock_codes, stock_prices, strict=True):
             current_weight = current_allocations.get(stock_code, 0)
-            weight_diff = target_weight - current_weight
+            weight_diff = target_weights[stock_code] - current_weight
 
             if abs(weight_diff) > 0.001:  # 忽略微小差异
                 target_value = total_value * weight_diff
-                stock_price = strategy._get_stock_price(stock_code)
                 target_shares = abs(target_value) / stock_price
 
                 direction = TradeDirection.BUY if weight_diff > 0 else TradeDirection.SELL
@@ -98,83 +120,84 @@ class TradeOptimizer(BaseModel):
 class TradingSystem(BaseModel):
     """交易系统"""
 
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
     execution_rate: float = Field(default=0.8, description="平均成交率")
     slippage_rate: float = Field(default=0.001, description="滑点率")
+    price_provider: PriceProvider | None = Field(
+        default=None, description="成交价来源，设置后按执行时价格成交，否则按订单价格"
+    )
+    cross_allocation: CrossAllocationEnum = Field(
+        default=CrossAllocationEnum.PRIORITY, description="自成交数量分配方式"
+    )
+    execution_simulator: ExecutionSimulator | None = Field(
+        default=None, description="成交模拟器，设置后 execution_rate 和 slippage_rate 不再生效"
+    )
+
+    def mark_orders(self, orders: list[TradeOrder]) -> None:
+        """按执行时价格批量重新标记订单价格"""
+        if self.price_provider is None or not orders:
+            return
+
+        prices = self.price_provider.get_prices([o.stock_code for o in orders]).tolist()
+        for order, price in zip(orders, prices, strict=True):
+            order.price = price
+
+    def simulator(self) -> ExecutionSimulator:
+        """成交模拟器，未设置时按 execution_rate 和 slippage_rate 使用固定成交率模型"""
+        if self.execution_simulator is not None:
+            return self.execution_simulator
+        return ExecutionSimulator(FixedRateFillModel(self.execution_rate, self.slippage_rate))
+
+    def execute_book(
+        self,
+        codes: list[str],
+        shares: np.ndarray,
+        prices: np.ndarray,
+        available_cash: float,
+        timestamp: str | None = None,
+    ) -> ExecutionResult:
+        """按数组撮合订单簿，shares 买入为正；设置了价格来源时按 timestamp 的价格成交"""
+        if self.price_provider is not None and codes:
+            prices = self.price_provider.get_prices(codes, timestamp)
+        return self.simulator().execute(codes, shares, prices, available_cash, timestamp)
 
     def execute_orders(
         self, orders: list[TradeOrder], available_cash: float
     ) -> tuple[list[TradeOrder], float]:
         """
-        执行交易单
+        执行交易单：整本订单簿一次撮合，卖单先成交回笼现金，买单按顺序受现金约束
         返回：(已执行的订单列表, 剩余现金)
         """
-        executed_orders = []
-        remaining_cash = available_cash
-
-        # 按优先级排序，买单需要现金，优先处理卖单
+        self.mark_orders(orders)
         sell_orders = [o for o in orders if o.direction == TradeDirection.SELL]
         buy_orders = [o for o in orders if o.direction == TradeDirection.BUY]
+        book = sell_orders + buy_orders
+
+        result = self.simulator().execute(
+            [o.stock_code for o in book],
+            np.array(
+                [-o.target_shares for o in sell_orders] + [o.target_shares for o in buy_orders]
+            ),
+            np.array([o.price for o in book]),
+            available_cash,
+        )
+        for order, shares, value in zip(
+            book, result.filled_shares.tolist(), result.filled_value.tolist(), strict=True
+        ):
+            order.executed_shares = shares
+            order.executed_value = value
+
+        executed_orders = sell_orders + [o for o in buy_orders if o.executed_shares > 0]
+        return executed_orders, result.remaining_cash
 
-        # 先执行卖单获得现金
-        for order in sell_orders:
-            execution_ratio = min(self.execution_rate, 1.0)
-            executed_shares = order.target_shares * execution_ratio
-            # 考虑滑点
-            actual_price = order.price * (1 - self.slippage_rate)
-            executed_value = executed_shares * actual_price
-
-            order.executed_shares = executed_shares
-            order.executed_value = executed_value
-            remaining_cash += executed_value
-            executed_orders.append(order)
-
-        # 再执行买单
-        for order in buy_orders:
-            # 考虑滑点
-            actual_price = order.price * (1 + self.slippage_rate)
-            max_affordable_shares = remaining_cash / actual_price
-            execution_ratio = min(self.execution_rate, 1.0)
-
-            # 实际成交数量受现金限制
-            target_executable = order.target_shares * execution_ratio
-            executed_shares = min(target_executable, max_affordable_shares)
-            executed_value = executed_shares * actual_price
-
-            if executed_shares > 0.01:  # 最小成交单位
-                order.executed_shares = executed_shares
-                order.executed_value = executed_value
-                remaining_cash -= executed_value
-                executed_orders.append(order)
-
-        return executed_orders, remaining_cash
+    def cross(self, orders: list[TradeOrder]) -> CrossReport:
+        """内部自成交，返回各股票的交叉数量"""
+        return cross_orders(orders, self.cross_allocation)
 
     def cross_trade(self, orders: list[TradeOrder]) -> list[TradeOrder]:
         """内部自成交"""
-        crossed_orders = []
-        buy_orders = [o for o in orders if o.direction == TradeDirection.BUY]
-        sell_orders = [o for o in orders if o.direction == TradeDirection.SELL]
-
-        # 按股票代码匹配买卖单
-        for buy_order in buy_orders:
-            for sell_order in sell_orders:
-                if (
-                    buy_order.stock_code == sell_order.stock_code
-                    and buy_order.remaining_shares > 0
-                    and sell_order.remaining_shares > 0
-                ):
-                    # 计算可成交数量
-                    cross_shares = min(buy_order.remaining_shares, sell_order.remaining_shares)
-                    cross_price = (buy_order.price + sell_order.price) / 2  # 中间价成交
-                    cross_value = cross_shares * cross_price
-
-                    # 更新买单
-                    buy_order.executed_shares += cross_shares
-                    buy_order.executed_value += cross_value
-
-                    # 更新卖单
-                    sell_order.executed_shares += cross_shares
-                    sell_order.executed_value += cross_value
-
+        self.cross(orders)
         return orders
 
 
@@ -210,19 +233,6 @@ class CashInfo(BaseModel):
     )
 
 
-class StockPositionInfo(BaseModel):
-    """
-    股票持仓信息
-    """
-
-    # 股票代码
-    stock_code: str = Field(description="股票代码")
-    # 股票数量
-    stock_amount: float = Field(description="股票数量")
-    # 股票成本
-    stock_cost: float = Field(description="股票成本")
-
-
 class FuturesPositionInfo(BaseModel):
     """
     期货持仓信息
@@ -238,8 +248,8 @@ class FuturesPositionInfo(BaseModel):
 
 # 虚拟账户
 class VirtualAccount(BaseModel):
-    stock_long_info: list[StockPositionInfo] = Field(
-        default_factory=list, description="股票多头信息"
+    stock_long_info: list[StockPositionInfo] | StockPositionBook = Field(
+        default_factory=list, description="股票多头信息，可切换为列式持仓簿"
     )
     stock_short_info: list[StockPositionInfo] = Field(
         default_factory=list, description="股票空头信息"
@@ -252,12 +262,133 @@ class VirtualAccount(BaseModel):
     )
     cash_info: CashInfo = Field(default=CashInfo(), description="现金信息")
 
+    @property
+    def is_compact(self) -> bool:
+        return isinstance(self.stock_long_info, StockPositionBook)
+
+    def use_compact_positions(self) -> "VirtualAccount":
+        """切换到列式持仓簿，同一股票的多笔持仓合并为一行"""
+        if not self.is_compact:
+            self.stock_long_info = StockPositionBook(self.stock_long_info)
+        return self
+
+    def fork(self) -> "VirtualAccount":
+        """写时复制的副本：列式持仓簿共享数组，现金、期货和列表持仓直接复制"""
+        if self.is_compact:
+            stock_long_info = self.stock_long_info.fork()
+        else:
+            stock_long_info = [position.model_copy() for position in self.stock_long_info]
+        return VirtualAccount(
+            stock_long_info=stock_long_info,
+            stock_short_info=[position.model_copy() for position in self.stock_short_info],
+            futures_long_info=[position.model_copy() for position in self.futures_long_info],
+            futures_short_info=[position.model_copy() for position in self.futures_short_info],
+            cash_info=self.cash_info.model_copy(),
+        )
+
+    def add_stock_position(self, stock_code: str, amount: float, price: float) -> None:
+        """买入股票，已有持仓时合并并按数量加权成本"""
+        if self.is_compact:
+            self.stock_long_info.add(stock_code, amount, price)
+            return
+
+        if amount <= 0:
+            return
+
+        for position in self.stock_long_info:
+            if position.stock_code == stock_code:
+                total_amount = position.stock_amount + amount
+                position.stock_cost = (
+                    position.stock_amount * position.stock_cost + amount * price
+                ) / total_amount
+                position.stock_amount = total_amount
+                return
+
+        self.stock_long_info.append(
+            StockPositionInfo(stock_code=stock_code, stock_amount=amount, stock_cost=price)
+        )
+
+    def reduce_stock_position(self, stock_code: str, amount: float, dust: float = 0.0) -> float:
+        """
+        卖出股票，返回实际卖出数量
+        剩余数量不超过 dust 时视为清仓
+        """
+        if self.is_compact:
+            return self.stock_long_info.reduce(stock_code, amount, dust)
+
+        remaining_to_sell = amount
+        positions_to_remove = []
+
+        for i, position in enumerate(self.stock_long_info):
+            if position.stock_code == stock_code and remaining_to_sell > 0:
+                sold = min(position.stock_amount, remaining_to_sell)
+                position.stock_amount -= sold
+                remaining_to_sell -= sold
+                if position.stock_amount <= dust:
+                    positions_to_remove.append(i)
+
+        # 移除已清仓的持仓
+        for i in reversed(positions_to_remove):
+            self.stock_long_info.pop(i)
+
+        return amount - remaining_to_sell
+
+    def apply_stock_trades(
+        self, stock_codes: list[str], signed_shares: np.ndarray, prices: np.ndarray
+    ) -> None:
+        """批量应用股票成交，signed_shares 买入为正、卖出为负；现金由调用方处理"""
+        for stock_code, shares, price in zip(
+            stock_codes, signed_shares.tolist(), prices.tolist(), strict=True
+        ):
+            if shares > 0:
+                self.add_stock_position(stock_code, shares, price)
+            elif shares < 0:
+                self.reduce_stock_position(stock_code, -shares)
+
+    def get_stock_amount(self, stock_code: str) -> float:
+        """持有数量，未持有返回0"""
+        if self.is_compact:
+            return self.stock_long_info.amount(stock_code)
+
+        return sum(
+            position.stock_amount
+            for position in self.stock_long_info
+            if position.stock_code == stock_code
+        )
+
+    def get_stock_arrays(self) -> tuple[list[str], np.ndarray]:
+        """返回 (股票代码列表, 持仓数量数组)，两种存储方式统一的列式视图"""
+        if self.is_compact:
+            return self.stock_long_info.codes, self.stock_long_info.amounts
+
+        codes = [position.stock_code for position in self.stock_long_info]
+        amounts = np.fromiter(
+            (position.stock_amount for position in self.stock_long_info),
+            dtype=np.float64,
+            count=len(codes),
+        )
+        return codes, amounts
+
 
 class StrategyPortfolio(BaseModel):
     type: StrategyPortfolioTypeEnum
     name: str
 
 
+class _ParentLink:
+    """子节点指向父节点的引用，模型相等比较时不展开父节点"""
+
+    __slots__ = ("node",)
+
+    def __init__(self, node: "StrategyTree") -> None:
+        self.node = node
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, _ParentLink)
+
+    __hash__ = None
+
+
 class StrategyTree(BaseModel):
     """策略树"""
 
@@ -268,6 +399,128 @@ class StrategyTree(BaseModel):
     virtual_account: VirtualAccount = Field(default_factory=VirtualAccount)
     strategy_info: dict = Field(default_factory=dict)
 
+    _price_provider: PriceProvider | None = PrivateAttr(default=None)
+    _nav: NavLedger | None = PrivateAttr(default=None)
+    _index: TreeIndex | None = PrivateAttr(default=None)
+    # 数据库中的节点id，从数据库加载时设置
+    _node_id: Any = PrivateAttr(default=None)
+    _parent: _ParentLink | None = PrivateAttr(default=None)
+
+    def model_post_init(self, _context: Any, /) -> None:
+        self._adopt(self.children)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        if name == "children":
+            # 整体替换子节点列表时清除索引，并重新记录父节点
+            self.invalidate_index()
+            for child in self.children:
+                child._parent = None
+            super().__setattr__(name, value)
+            self._adopt(self.children)
+            return
+        super().__setattr__(name, value)
+
+    def __copy__(self) -> "StrategyTree":
+        node = super().__copy__()
+        node._index = None
+        node._parent = None
+        return node
+
+    def __deepcopy__(self, memo: dict[int, Any] | None = None) -> "StrategyTree":
+        # 索引和父节点引用不随复制展开，复制出的子树重新记录父节点
+        memo = {} if memo is None else memo
+        for private in (self._index, self._parent):
+            if private is not None:
+                memo[id(private)] = None
+        node = super().__deepcopy__(memo)
+        node._adopt(node.children)
+        return node
+
+    def _adopt(self, children: list["StrategyTree"]) -> None:
+        """记录子节点的父节点，子节点原来所在树的索引作废"""
+        link = _ParentLink(self)
+        for child in children:
+            child.invalidate_index()
+            child._parent = link
+
+    @property
+    def root(self) -> "StrategyTree":
+        """所在整棵树的根节点；父节点的子节点列表中已没有本节点时视为根"""
+        node = self
+        while (link := node._parent) is not None and any(
+            child is node for child in link.node.children
+        ):
+            node = link.node
+        return node
+
+    @property
+    def tree_index(self) -> TreeIndex:
+        """
+        整棵树的扁平索引，在任一节点上首次访问时都以根节点构建并挂到所有节点上
+        复制出的节点不在原索引中，访问时重新构建
+        """
+        index = self._index
+        if index is None or self not in index:
+            index = TreeIndex(self.root)
+            for node in index.nodes:
+                node._index = index
+        return index
+
+    @property
+    def node_id(self) -> Any:
+        """数据库中的节点id，不是从数据库加载的节点为 None"""
+        return self._node_id
+
+    @node_id.setter
+    def node_id(self, value: Any) -> None:
+        self._node_id = value
+
+    def invalidate_index(self) -> None:
+        """树结构变化后清除索引，下次访问时重建"""
+        index = self._index
+        nodes = index.nodes if index is not None else [self]
+        for node in nodes:
+            node._index = None
+
+    def add_child(self, child: "StrategyTree") -> None:
+        """添加子节点"""
+        self.invalidate_index()
+        self.children.append(child)
+        self._adopt([child])
+
+    def remove_child(self, child: "StrategyTree") -> None:
+        """移除子节点"""
+        self.invalidate_index()
+        self.children.remove(child)
+        child._parent = None
+
+    @property
+    def price_provider(self) -> PriceProvider:
+        """节点价格来源，未单独设置时使用全局价格来源"""
+        return self._price_provider or get_price_provider()
+
+    def use_price_provider(self, provider: PriceProvider | None) -> "StrategyTree":
+        """为整棵树设置价格来源，None 表示恢复使用全局价格来源"""
+        self._price_provider = provider
+        for child in self.children:
+            child.use_price_provider(provider)
+        return self
+
+    def track_nav(self) -> NavLedger:
+        """
+        为整棵树建立增量净值账本，之后摘要直接读取缓存
+        树结构变化后需要重新调用
+        """
+        ledger = NavLedger(self)
+        for node in ledger.nodes:
+            node._nav = ledger
+        return ledger
+
+    def _account_changed(self) -> None:
+        """账户变化后通知净值账本"""
+        if self._nav is not None:
+            self._nav.sync_account(self)
+
     def allocate_pending_amount(self, amount: float) -> None:
         """
         分配待申购金额：只在根节点记录，通过权重分配到叶子节点
@@ -275,11 +528,36 @@ class StrategyTree(BaseModel):
         if not self.children:
             # 叶子节点：接收分配的金额
             self.virtual_account.cash_info.pending_purchase_amount += amount
+            self._account_changed()
         else:
             # 非叶子节点：递归分配到子节点
             for child in self.children:
                 child.allocate_pending_amount(amount * child.weight)
 
+    def use_compact_positions(self) -> "StrategyTree":
+        """将整棵树的虚拟账户切换为列式持仓簿"""
+        self.virtual_account.use_compact_positions()
+        for child in self.children:
+            child.use_compact_positions()
+        return self
+
+    def fork(self) -> "StrategyTree":
+        """
+        what-if 分支：节点和现金逐个复制，列式持仓数组与原树共享，
+        调仓、赎回等写入某个叶子持仓时才复制该叶子的数组；价格来源和数据库节点id沿用原树
+        """
+        node = StrategyTree(
+            fund_id=self.fund_id,
+            weight=self.weight,
+            name=self.name,
+            children=[child.fork() for child in self.children],
+            virtual_account=self.virtual_account.fork(),
+            strategy_info=dict(self.strategy_info),
+        )
+        node._price_provider = self._price_provider
+        node._node_id = self._node_id
+        return node
+
     def validate_weights(self, tolerance: float = 1e-6) -> bool:
         """验证同一层级子节点权重之和是否为1"""
         if not self.children:
@@ -300,16 +578,23 @@ class StrategyTree(BaseModel):
 
         # 根节点记录总申购金额
         self.virtual_account.cash_info.pending_purchase_amount += amount
+        self._account_changed()
 
         # 分配到所有叶子节点（包括期货策略）
         self._allocate_to_all_leaves(amount)
-        print(f"申购 {amount:,.2f} 元到 {self.name}，已分配到各策略（包括期货）")
+        tracer.emit(
+            "subscription.allocated",
+            "申购 {amount:,.2f} 元到 {name}，已分配到各策略（包括期货）",
+            name=self.name,
+            amount=amount,
+        )
 
     def _allocate_to_all_leaves(self, amount: float) -> None:
         """分配到所有叶子节点，包括期货策略"""
         if not self.children:
             # 叶子节点：接收分配的金额
             self.virtual_account.cash_info.pending_purchase_amount += amount
+            self._account_changed()
         else:
             # 非叶子节点：递归分配到子节点
             for child in self.children:
@@ -322,7 +607,7 @@ class StrategyTree(BaseModel):
         if self.weight != 1.0:
             raise ValueError("赎回只能在根节点执行")
 
-        print(f"客户赎回: {amount:,.2f} 元")
+        tracer.emit("redemption.requested", "客户赎回: {amount:,.2f} 元", amount=amount)
 
         # 1. 先平仓期货释放保证金
         self._liquidate_futures_for_redemption()
@@ -333,66 +618,60 @@ class StrategyTree(BaseModel):
         # 3. 从根节点现金支付赎回款
         if self.virtual_account.cash_info.available_cash >= amount:
             self.virtual_account.cash_info.available_cash -= amount
-            print(f"赎回完成，支付 {amount:,.2f} 元")
+            tracer.emit("redemption.paid", "赎回完成，支付 {amount:,.2f} 元", amount=amount)
         else:
             available = self.virtual_account.cash_info.available_cash
-            print(f"现金不足，只能赎回 {available:,.2f} 元")
+            tracer.emit(
+                "redemption.short_cash",
+                "现金不足，只能赎回 {available:,.2f} 元",
+                available=available,
+            )
             self.virtual_account.cash_info.available_cash = 0
+        self._account_changed()
 
     def _liquidate_futures_for_redemption(self) -> None:
         """为赎回平仓期货"""
-        print("\n为赎回平仓期货...")
-
-        def liquidate_node_futures(node):
-            if not node.children and node._is_futures_strategy():
-                if node.virtual_account.futures_short_info:
-                    futures_info = node._get_futures_contract_info()
-                    contract_value = futures_info["current_price"] * futures_info["multiplier"]
-
-                    total_margin_released = 0
-                    for position in node.virtual_account.futures_short_info:
-                        position_value = position.futures_amount * contract_value
-                        margin = position_value * futures_info["margin_rate"]
-                        total_margin_released += margin
-
-                    # 清空期货持仓
-                    node.virtual_account.futures_short_info.clear()
-                    node.virtual_account.cash_info.available_cash += total_margin_released
-                    print(f"  {node.name}: 平仓期货，释放保证金 {total_margin_released:,.2f} 元")
-            else:
-                for child in node.children:
-                    liquidate_node_futures(child)
+        tracer.emit("redemption.liquidate_futures", "\n为赎回平仓期货...")
 
-        liquidate_node_futures(self)
+        for node in self.tree_index.leaves(self):
+            if not node._is_futures_strategy() or not node.virtual_account.futures_short_info:
+                continue
+
+            total_margin_released = futures_margin(node)
+
+            # 清空期货持仓
+            node.virtual_account.futures_short_info.clear()
+            node.virtual_account.cash_info.available_cash += total_margin_released
+            node._account_changed()
+            tracer.emit(
+                "redemption.futures_closed",
+                "  {name}: 平仓期货，释放保证金 {margin:,.2f} 元",
+                name=node.name,
+                margin=total_margin_released,
+            )
 
     def _liquidate_stocks_for_redemption(self, redemption_amount: float) -> None:
         """为赎回卖出股票"""
-        print(f"\n为赎回卖出股票，目标金额: {redemption_amount:,.2f} 元")
+        tracer.emit(
+            "redemption.liquidate_stocks",
+            "\n为赎回卖出股票，目标金额: {amount:,.2f} 元",
+            amount=redemption_amount,
+        )
 
         # 收集所有叶子节点的股票持仓
         total_stock_value = 0
         stock_nodes = []
 
-        def collect_stock_nodes(node):
-            nonlocal total_stock_value
-            if not node.children and not node._is_futures_strategy():
-                node_stock_value = 0
-                for position in node.virtual_account.stock_long_info:
-                    stock_price = node._get_stock_price(position.stock_code)
-                    position_value = position.stock_amount * stock_price
-                    node_stock_value += position_value
-
-                if node_stock_value > 0:
-                    stock_nodes.append((node, node_stock_value))
-                    total_stock_value += node_stock_value
-            else:
-                for child in node.children:
-                    collect_stock_nodes(child)
-
-        collect_stock_nodes(self)
+        for node in self.tree_index.leaves(self):
+            if node._is_futures_strategy():
+                continue
+            node_stock_value = node._calculate_total_position_value()
+            if node_stock_value > 0:
+                stock_nodes.append((node, node_stock_value))
+                total_stock_value += node_stock_value
 
         if total_stock_value == 0:
-            print("  无股票持仓可卖出")
+            tracer.emit("redemption.no_stocks", "  无股票持仓可卖出")
             return
 
         # 按比例卖出股票
@@ -400,30 +679,32 @@ class StrategyTree(BaseModel):
             sell_ratio = min(redemption_amount / total_stock_value, 1.0)
             node_sell_value = node_stock_value * sell_ratio
 
-            cash_received = 0
-            positions_to_remove = []
-
-            for i, position in enumerate(node.virtual_account.stock_long_info):
-                stock_price = node._get_stock_price(position.stock_code)
-                position_value = position.stock_amount * stock_price
-
-                if node_sell_value > 0:
-                    sell_amount = min(position.stock_amount, node_sell_value / stock_price)
-                    sell_value = sell_amount * stock_price
-
-                    position.stock_amount -= sell_amount
-                    node_sell_value -= sell_value
-                    cash_received += sell_value
-
-                    if position.stock_amount <= 0.01:  # 基本清仓
-                        positions_to_remove.append(i)
+            # 按持仓顺序依次卖出，直到卖够目标金额
+            codes, amounts = node.virtual_account.get_stock_arrays()
+            position_values = amounts * node._get_stock_prices(codes)
+            sold_before = np.cumsum(position_values) - position_values
+            sell_values = np.clip(node_sell_value - sold_before, 0, position_values)
+            sell_amounts = np.divide(
+                amounts * sell_values,
+                position_values,
+                out=np.zeros_like(amounts),
+                where=position_values > 0,
+            )
 
-            # 移除清仓的持仓
-            for i in reversed(positions_to_remove):
-                node.virtual_account.stock_long_info.pop(i)
+            for stock_code, sell_amount in zip(codes, sell_amounts.tolist(), strict=True):
+                if sell_amount > 0:
+                    # 剩余不足0.01股视为基本清仓
+                    node.virtual_account.reduce_stock_position(stock_code, sell_amount, dust=0.01)
 
+            cash_received = float(sell_values.sum())
             node.virtual_account.cash_info.available_cash += cash_received
-            print(f"  {node.name}: 卖出股票获得现金 {cash_received:,.2f} 元")
+            node._account_changed()
+            tracer.emit(
+                "redemption.stocks_sold",
+                "  {name}: 卖出股票获得现金 {cash:,.2f} 元",
+                name=node.name,
+                cash=cash_received,
+            )
 
     def build_positions_from_pending(
         self, strategy_allocations: dict[str, dict[str, float]] | None = None
@@ -447,32 +728,43 @@ class StrategyTree(BaseModel):
                 # 没有指定股票分配，转为可用现金
                 self.virtual_account.cash_info.available_cash += pending_amount
                 self.virtual_account.cash_info.pending_purchase_amount = 0
-                print(f"{self.name}: 转移 {pending_amount:,.2f} 元到可用现金")
+                tracer.emit(
+                    "build.pending_to_cash",
+                    "{name}: 转移 {amount:,.2f} 元到可用现金",
+                    name=self.name,
+                    amount=pending_amount,
+                )
             else:
                 # 按指定分配买入股票
                 total_ratio = sum(stock_allocations.values())
                 if abs(total_ratio - 1.0) > 1e-6:
                     raise ValueError(f"股票分配比例之和不为1: {total_ratio}")
 
-                for stock_code, ratio in stock_allocations.items():
-                    position_value = pending_amount * ratio
-                    # 使用真实股票价格
-                    stock_price = self._get_stock_price(stock_code)
+                # 一次批量取价
+                stock_codes = list(stock_allocations)
+                stock_prices = self._get_stock_prices(stock_codes).tolist()
+
+                for stock_code, stock_price in zip(stock_codes, stock_prices, strict=True):
+                    position_value = pending_amount * stock_allocations[stock_code]
                     shares = position_value / stock_price
 
-                    position = StockPositionInfo(
-                        stock_code=stock_code, stock_amount=shares, stock_cost=stock_price
-                    )
-                    self.virtual_account.stock_long_info.append(position)
-                    print(
-                        f"{self.name}: 买入 {stock_code} {shares:,.0f}股，成本 {stock_price:.2f}元/股"
+                    self.virtual_account.add_stock_position(stock_code, shares, stock_price)
+                    tracer.emit(
+                        "build.buy",
+                        "{name}: 买入 {stock_code} {shares:,.0f}股，成本 {price:.2f}元/股",
+                        name=self.name,
+                        stock_code=stock_code,
+                        shares=shares,
+                        price=stock_price,
                     )
 
                 # 清零待申购金额
                 self.virtual_account.cash_info.pending_purchase_amount = 0
+            self._account_changed()
         else:
             # 非叶子节点：清零当前节点的待申购金额，递归处理子节点
             self.virtual_account.cash_info.pending_purchase_amount = 0
+            self._account_changed()
 
             for child in self.children:
                 child.build_positions_from_pending(strategy_allocations)
@@ -486,53 +778,65 @@ class StrategyTree(BaseModel):
             # 叶子节点执行调仓
             new_allocations = strategy_allocations.get(self.name)
             if not new_allocations:
-                print(f"{self.name}: 无调仓配置，跳过")
+                tracer.emit("rebalance.skip_no_config", "{name}: 无调仓配置，跳过", name=self.name)
                 return
 
             total_value = self._calculate_total_position_value()
             if total_value <= 0:
-                print(f"{self.name}: 无持仓，跳过调仓")
+                tracer.emit(
+                    "rebalance.skip_no_position", "{name}: 无持仓，跳过调仓", name=self.name
+                )
                 return
 
-            current_allocations = self._calculate_current_allocations()
+            if tracer.enabled:
+                tracer.emit(
+                    "rebalance.start",
+                    "\n{name} 调仓:\n  总持仓价值: {total_value:,.2f} 元\n"
+                    "  当前配置: {current}\n  目标配置: {target}",
+                    name=self.name,
+                    total_value=total_value,
+                    current=self._calculate_current_allocations(),
+                    target=new_allocations,
+                )
 
-            print(f"\n{self.name} 调仓:")
-            print(f"  总持仓价值: {total_value:,.2f} 元")
-            print(f"  当前配置: {current_allocations}")
-            print(f"  目标配置: {new_allocations}")
+            # 一次批量取价，计算需要买卖的数量
+            stock_codes = list(new_allocations)
+            stock_prices = self._get_stock_prices(stock_codes).tolist()
 
-            # 计算需要买卖的数量
-            for stock_code, target_ratio in new_allocations.items():
-                target_value = total_value * target_ratio
-                current_value = sum(
-                    pos.stock_amount * self._get_stock_price(pos.stock_code)
-                    for pos in self.virtual_account.stock_long_info
-                    if pos.stock_code == stock_code
-                )
+            for stock_code, stock_price in zip(stock_codes, stock_prices, strict=True):
+                target_value = total_value * new_allocations[stock_code]
+                current_value = self.virtual_account.get_stock_amount(stock_code) * stock_price
 
                 diff_value = target_value - current_value
-                stock_price = self._get_stock_price(stock_code)  # 使用真实价格
 
                 if abs(diff_value) > 1:  # 忽略小额差异
                     if diff_value > 0:
                         # 需要买入
                         shares_to_buy = diff_value / stock_price
-                        position = StockPositionInfo(
-                            stock_code=stock_code,
-                            stock_amount=shares_to_buy,
-                            stock_cost=stock_price,
+                        self.virtual_account.add_stock_position(
+                            stock_code, shares_to_buy, stock_price
                         )
-                        self.virtual_account.stock_long_info.append(position)
                         self.virtual_account.cash_info.available_cash -= diff_value
-                        print(f"  买入 {stock_code}: {shares_to_buy:,.0f}股 ({diff_value:,.2f}元)")
+                        tracer.emit(
+                            "rebalance.buy",
+                            "  买入 {stock_code}: {shares:,.0f}股 ({value:,.2f}元)",
+                            stock_code=stock_code,
+                            shares=shares_to_buy,
+                            value=diff_value,
+                        )
                     else:
                         # 需要卖出
                         shares_to_sell = abs(diff_value) / stock_price
                         self._sell_stock(stock_code, shares_to_sell)
                         self.virtual_account.cash_info.available_cash += abs(diff_value)
-                        print(
-                            f"  卖出 {stock_code}: {shares_to_sell:,.0f}股 ({abs(diff_value):,.2f}元)"
+                        tracer.emit(
+                            "rebalance.sell",
+                            "  卖出 {stock_code}: {shares:,.0f}股 ({value:,.2f}元)",
+                            stock_code=stock_code,
+                            shares=shares_to_sell,
+                            value=abs(diff_value),
                         )
+            self._account_changed()
         else:
             # 非叶子节点递归调仓
             for child in self.children:
@@ -540,137 +844,110 @@ class StrategyTree(BaseModel):
 
     def _calculate_total_position_value(self) -> float:
         """计算总持仓价值"""
-        total_value = 0
-        for position in self.virtual_account.stock_long_info:
-            stock_price = self._get_stock_price(position.stock_code)
-            total_value += position.stock_amount * stock_price
-        return total_value
+        codes, amounts = self.virtual_account.get_stock_arrays()
+        if not codes:
+            return 0.0
+        return float(amounts @ self._get_stock_prices(codes))
 
     def _calculate_current_allocations(self) -> dict[str, float]:
         """计算当前持仓配置"""
-        total_value = self._calculate_total_position_value()
-        if total_value <= 0:
+        codes, amounts = self.virtual_account.get_stock_arrays()
+        if not codes:
             return {}
 
-        allocations = {}
-        for position in self.virtual_account.stock_long_info:
-            stock_price = self._get_stock_price(position.stock_code)
-            stock_value = position.stock_amount * stock_price
-            allocations[position.stock_code] = stock_value / total_value
+        stock_values = amounts * self._get_stock_prices(codes)
+        total_value = stock_values.sum()
+        if total_value <= 0:
+            return {}
 
+        allocations: dict[str, float] = {}
+        for stock_code, weight in zip(codes, (stock_values / total_value).tolist(), strict=True):
+            allocations[stock_code] = allocations.get(stock_code, 0) + weight
         return allocations
 
     def _sell_stock(self, stock_code: str, shares_to_sell: float) -> None:
         """卖出指定数量的股票"""
-        remaining_to_sell = shares_to_sell
-        positions_to_remove = []
-
-        for i, position in enumerate(self.virtual_account.stock_long_info):
-            if position.stock_code == stock_code and remaining_to_sell > 0:
-                if position.stock_amount <= remaining_to_sell:
-                    # 全部卖出
-                    remaining_to_sell -= position.stock_amount
-                    positions_to_remove.append(i)
-                else:
-                    # 部分卖出
-                    position.stock_amount -= remaining_to_sell
-                    remaining_to_sell = 0
-
-        # 移除已清仓的持仓
-        for i in reversed(positions_to_remove):
-            self.virtual_account.stock_long_info.pop(i)
+        self.virtual_account.reduce_stock_position(stock_code, shares_to_sell)
 
     def get_account_summary(self) -> dict:
         """获取账户摘要 - 只统计根节点和叶子节点，包含期货信息"""
+        # 已建立净值账本时直接读取缓存
+        if self._nav is not None:
+            return self._nav.summary(self)
+
+        # 如果是根节点，需要汇总所有叶子节点的资产
+        if self.weight == 1.0 and self.children:
+            return self.valuate_tree().summary(self)
+
         stock_value = self._calculate_total_position_value()
         cash_value = self.virtual_account.cash_info.available_cash
         pending_value = self.virtual_account.cash_info.pending_purchase_amount
 
         # 计算期货保证金占用
-        futures_margin = 0
-        if self.virtual_account.futures_short_info:
-            futures_info = self._get_futures_contract_info()
-            contract_value = futures_info["current_price"] * futures_info["multiplier"]
-            for position in self.virtual_account.futures_short_info:
-                position_value = position.futures_amount * contract_value
-                futures_margin += position_value * futures_info["margin_rate"]
+        margin = futures_margin(self)
+
+        # 叶子节点或中间节点
+        total_value = stock_value + cash_value + pending_value
+
+        return {
+            "name": self.name,
+            "stock_positions": len(self.virtual_account.stock_long_info),
+            "stock_value": stock_value,
+            "available_cash": cash_value,
+            "pending_amount": pending_value,
+            "futures_margin": margin,
+            "total_value": total_value,
+            "is_root": False,
+        }
 
-        # 如果是根节点，需要汇总所有叶子节点的资产
-        if self.weight == 1.0 and self.children:
-            # 根节点：汇总叶子节点资产
-            total_leaf_stock = 0
-            total_leaf_cash = 0
-            total_leaf_pending = 0
-            total_leaf_futures_margin = 0
-
-            def collect_leaf_assets(node):
-                nonlocal \
-                    total_leaf_stock, \
-                    total_leaf_cash, \
-                    total_leaf_pending, \
-                    total_leaf_futures_margin
-                if not node.children:
-                    # 叶子节点
-                    total_leaf_stock += node._calculate_total_position_value()
-                    total_leaf_cash += node.virtual_account.cash_info.available_cash
-                    total_leaf_pending += node.virtual_account.cash_info.pending_purchase_amount
-
-                    # 计算期货保证金
-                    if node.virtual_account.futures_short_info:
-                        futures_info = node._get_futures_contract_info()
-                        contract_value = futures_info["current_price"] * futures_info["multiplier"]
-                        for position in node.virtual_account.futures_short_info:
-                            position_value = position.futures_amount * contract_value
-                            total_leaf_futures_margin += (
-                                position_value * futures_info["margin_rate"]
-                            )
-                else:
-                    for child in node.children:
-                        collect_leaf_assets(child)
-
-            collect_leaf_assets(self)
-
-            total_value = total_leaf_stock + total_leaf_cash + total_leaf_pending
-
-            return {
-                "name": self.name,
-                "stock_positions": len(self.virtual_account.stock_long_info),
-                "stock_value": total_leaf_stock,
-                "available_cash": total_leaf_cash,
-                "pending_amount": total_leaf_pending,
-                "futures_margin": total_leaf_futures_margin,
-                "total_value": total_value,
-                "is_root": True,
-            }
-        else:
-            # 叶子节点或中间节点
-            total_value = stock_value + cash_value + pending_value
-
-            return {
-                "name": self.name,
-                "stock_positions": len(self.virtual_account.stock_long_info),
-                "stock_value": stock_value,
-                "available_cash": cash_value,
-                "pending_amount": pending_value,
-                "futures_margin": futures_margin,
-                "total_value": total_value,
-                "is_root": False,
-            }
-
-    def print_account_details(self, level: int = 0, only_active: bool = True) -> None:
+    def valuate_tree(self, prices: np.ndarray | None = None) -> TreeValuation:
+        """
+        整树估值：展开一次，按价格向量一次性计算所有节点
+        prices: 与 ValuationEngine.codes 对齐的价格，缺省时使用当前价格来源
+        """
+        return ValuationEngine(self).valuate(prices)
+
+    def print_account_details(
+        self,
+        level: int = 0,
+        only_active: bool = True,
+        valuation: TreeValuation | None = None,
+    ) -> None:
         """
         打印账户详细信息
         only_active: 只显示有资产的节点
+        valuation: 整树估值结果，缺省时在顶层计算一次并传给子节点
         """
+        if valuation is None:
+            valuation = self.valuate_tree()
+
         indent = "  " * level
-        summary = self.get_account_summary()
+        summary = valuation.summary(self)
 
         # 如果只显示活跃节点，跳过无资产的中间节点
         if only_active and summary["total_value"] == 0 and self.children:
             for child in self.children:
-                child.print_account_details(level, only_active)
+                child.print_account_details(level, only_active, valuation)
             return
 
+        self._print_summary(summary, indent)
+
+        if self.virtual_account.stock_long_info and not summary["is_root"]:
+            print(f"{indent}  📋 持仓明细:")
+            for position in self.virtual_account.stock_long_info:
+                value = position.stock_amount * position.stock_cost
+                print(
+                    f"{indent}    {position.stock_code}: {position.stock_amount:,.0f}股 × {position.stock_cost:.2f}元 = {value:,.2f}元"
+                )
+
+        # 递归打印子账户
+        if not only_active or not summary["is_root"]:
+            for child in self.children:
+                child.print_account_details(level + 1, only_active, valuation)
+
+    @staticmethod
+    def _print_summary(summary: dict, indent: str) -> None:
+        """打印节点摘要：总资产、股票、现金、保证金和待申购赎回"""
         print(f"{indent}📊 {summary['name']}:")
         print(f"{indent}  💼 总资产: {summary['total_value']:,.2f} 元")
 
@@ -691,224 +968,169 @@ class StrategyTree(BaseModel):
             else:
                 print(f"{indent}  ⏳ 待赎回: {abs(summary['pending_amount']):,.2f} 元")
 
-        if self.virtual_account.stock_long_info and not summary["is_root"]:
-            print(f"{indent}  📋 持仓明细:")
-            for position in self.virtual_account.stock_long_info:
-                value = position.stock_amount * position.stock_cost
-                print(
-                    f"{indent}    {position.stock_code}: {position.stock_amount:,.0f}股 × {position.stock_cost:.2f}元 = {value:,.2f}元"
+    def rebalance_futures_positions(self, solver: HedgeSolver | None = None) -> HedgePlan:
+        """
+        期货调仓：一次求解所有期货叶子的目标手数，再统一执行对冲指令
+        返回对冲求解结果
+        """
+        plan = (solver or HedgeSolver()).solve(self)
+        self.apply_hedge_plan(plan)
+        return plan
+
+    def apply_hedge_plan(self, plan: HedgePlan) -> None:
+        """执行对冲指令，plan 须由本节点求解得到"""
+        index = self.tree_index if self.tree_index.root is self else TreeIndex(self)
+        for group, row in enumerate(plan.group_rows.tolist()):
+            if row < 0 or plan.group_stock_value[group] <= 0:
+                continue
+            tracer.emit(
+                "futures.coordinate",
+                "\n{name} 期货协调:\n  目标敞口: {target_exposure}\n"
+                "  子节点股票总市值: {stock_value:,.2f} 元\n  期货策略数: {futures_count}个",
+                name=index.nodes[row].name,
+                target_exposure=float(plan.group_target_exposure[group]),
+                stock_value=float(plan.group_stock_value[group]),
+                futures_count=int(plan.group_futures_count[group]),
+            )
+
+        orders = {order.line: order for order in plan.orders}
+        registry = get_futures_registry()
+        for i, row in enumerate(plan.leaf_rows.tolist()):
+            node = index.nodes[row]
+            group = plan.leaf_group[i]
+            stock_value = float(plan.group_stock_value[group])
+            if stock_value <= 0:
+                tracer.emit(
+                    "futures.skip_no_stock",
+                    "{name}: 父节点无股票持仓，期货无需调仓",
+                    name=node.name,
                 )
+                continue
 
-        # 递归打印子账户
-        if not only_active or not summary["is_root"]:
-            for child in self.children:
-                child.print_account_details(level + 1, only_active)
+            tracer.emit(
+                "futures.rebalance",
+                "\n{name} 期货调仓:\n  期货合约: {contract}\n"
+                "  父节点股票市值: {parent_stock_value:,.2f} 元\n"
+                "  父节点目标敞口: {parent_target_exposure:.1f}\n"
+                "  目标期货敞口: {target_exposure:,.2f} 元\n"
+                "  合约价值: {contract_value:,.2f} 元/手\n"
+                "  目标手数: {target_contracts:.1f}手\n"
+                "  当前手数: {current_contracts:.1f}手",
+                name=node.name,
+                contract=registry.get(plan.leaf_contracts[i]).name,
+                parent_stock_value=stock_value,
+                parent_target_exposure=float(plan.group_target_exposure[group]),
+                target_exposure=float(plan.target_exposure_value[i]),
+                contract_value=float(plan.contract_values[i]),
+                target_contracts=float(plan.target_lots[i]),
+                current_contracts=float(plan.current_lots[i]),
+            )
 
-    def rebalance_futures_positions(self) -> None:
-        """
-        期货调仓：根据父节点敞口要求和股票市值调整期货仓位
-        """
-        if not self.children:
-            # 叶子节点 - 如果是期货策略则执行期货调仓
-            if self._is_futures_strategy():
-                self._rebalance_single_futures()
+            order = orders.get(i)
+            if order is None:
+                tracer.emit("futures.unchanged", "  仓位无需调整")
+                continue
+            node._apply_hedge_order(order)
+
+    def _apply_hedge_order(self, order: HedgeOrder) -> None:
+        """执行单个对冲指令"""
+        if order.action == HedgeActionEnum.OPEN_SHORT:
+            if order.capped:
+                tracer.emit(
+                    "futures.short_cash",
+                    "  现金不足（可用: {available_cash:,.2f}元），只能开空 {contracts:.1f}手",
+                    available_cash=self.virtual_account.cash_info.available_cash,
+                    contracts=order.lots,
+                )
+            self.virtual_account.futures_short_info.append(
+                FuturesPositionInfo(
+                    futures_code=order.futures_code,
+                    futures_amount=order.lots,
+                    futures_cost=order.price,
+                )
+            )
+            self.virtual_account.cash_info.available_cash -= order.margin
+            tracer.emit(
+                "futures.open_short",
+                "  开空 {contracts:.1f}手，保证金: {margin:,.2f} 元",
+                contracts=order.lots,
+                margin=order.margin,
+            )
         else:
-            # 非叶子节点 - 递归处理子节点，并协调期货对冲
-            for child in self.children:
-                child.rebalance_futures_positions()
+            self._close_futures_positions(order.lots, order.futures_code)
+            self.virtual_account.cash_info.available_cash += order.margin
+            tracer.emit(
+                "futures.close_short",
+                "  平空 {contracts:.1f}手，释放保证金: {margin:,.2f} 元",
+                contracts=order.lots,
+                margin=order.margin,
+            )
+        self._account_changed()
 
-            # 处理当前节点的期货对冲协调
-            self._coordinate_futures_hedging()
+    def settle_futures(self) -> float:
+        """
+        按合约最新价逐日结算子树内的期货空头：盈亏计入可用现金，成本价重置为最新价，
+        保证金按新价格补足或释放，返回结算盈亏合计
+        """
+        registry = get_futures_registry()
+        total = 0.0
+        for node in self.tree_index.subtree(self):
+            positions = node.virtual_account.futures_short_info
+            if not positions:
+                continue
+            rows = registry.code_rows(
+                [position.futures_code for position in positions],
+                [node.strategy_info.get("contract", "")] * len(positions),
+            )
+            marks = registry.marks[rows]
+            costs = np.array([position.futures_cost for position in positions])
+            notional = (
+                np.array([position.futures_amount for position in positions])
+                * registry.multipliers[rows]
+            )
+            pnl = float((costs - marks) @ notional)
+            margin_change = float((marks - costs) @ (notional * registry.margin_rates[rows]))
+            for position, mark in zip(positions, marks.tolist(), strict=True):
+                position.futures_cost = mark
+            node.virtual_account.cash_info.available_cash += pnl - margin_change
+            node._account_changed()
+            total += pnl
+            tracer.emit(
+                "futures.settle",
+                "{name}: 期货结算盈亏 {pnl:,.2f} 元，保证金变动 {margin_change:,.2f} 元",
+                name=node.name,
+                pnl=pnl,
+                margin_change=margin_change,
+            )
+        return total
 
     def _is_futures_strategy(self) -> bool:
         """判断是否为期货策略"""
         strategy_type = self.strategy_info.get("strategy_type", "")
         return "期货" in strategy_type or "futures" in strategy_type.lower()
 
-    def _get_futures_contract_info(self) -> dict:
-        """获取期货合约信息"""
+    def _get_futures_contract_info(self, futures_code: str | None = None) -> dict:
+        """获取期货合约信息，指定持仓期货代码时按代码查找（多合约对冲）"""
         contract = self.strategy_info.get("contract", "")
-
-        # 期货合约配置
-        futures_configs = {
-            "IC期货": {
-                "name": "沪深300股指期货",
-                "multiplier": 300,  # 每点300元
-                "margin_rate": 0.12,  # 12%保证金
-                "index_code": "IC",
-                "current_price": 4000,  # 模拟当前点位
-            },
-            "IC500期货": {
-                "name": "中证500股指期货",
-                "multiplier": 200,  # 每点200元
-                "margin_rate": 0.15,  # 15%保证金
-                "index_code": "IC500",
-                "current_price": 6500,  # 模拟当前点位
-            },
-            "IM期货": {
-                "name": "中证1000股指期货",
-                "multiplier": 200,  # 每点200元
-                "margin_rate": 0.15,  # 15%保证金
-                "index_code": "IM",
-                "current_price": 7000,
-            },
-            "IC/IC500期货": {  # 混合对冲
-                "name": "IC/IC500混合期货",
-                "multiplier": 250,  # 平均值
-                "margin_rate": 0.135,  # 平均值
-                "index_code": "mixed",
-                "current_price": 5000,
-            },
-        }
-
-        return futures_configs.get(contract, futures_configs["IC期货"])
+        if futures_code is None:
+            return get_futures_registry().contract_info(contract)
+        return get_futures_registry().code_info(futures_code, contract)
 
     def _get_stock_price(self, stock_code: str) -> float:
-        """获取股票价格数据库"""
-        stock_prices = {
-            # 沪深300成分股
-            "000001.SZ": 15.20,  # 平安银行
-            "000002.SZ": 8.45,  # 万科A
-            "000858.SZ": 185.60,  # 五粮液
-            "600519.SH": 1580.00,  # 贵州茅台
-            "600036.SH": 42.80,  # 招商银行
-            "000066.SZ": 12.30,  # 中国长城
-            "600276.SH": 58.90,  # 恒瑞医药
-            # 中证500成分股
-            "002415.SZ": 28.50,  # 海康威视
-            "002594.SZ": 245.80,  # 比亚迪
-            "300059.SZ": 13.45,  # 东方财富
-            "300750.SZ": 185.20,  # 宁德时代
-            "002230.SZ": 45.60,  # 科大讯飞
-            "300888.SZ": 125.40,  # 康希诺
-            # 中证1000成分股
-            "688111.SH": 280.50,  # 金山办公
-            "688599.SH": 45.80,  # 天合光能
-            "300347.SZ": 58.90,  # 泰格医药
-            "300015.SZ": 22.40,  # 爱尔眼科
-            "300253.SZ": 18.70,  # 卫宁健康
-            "300142.SZ": 35.20,  # 沃森生物
-        }
-
-        return stock_prices.get(stock_code, 50.0)  # 默认50元
-
-    def _rebalance_single_futures(self) -> None:
-        """单个期货策略调仓"""
-        # 获取父节点信息 - 使用动态属性或计算
-        parent_target_exposure = getattr(
-            self, "_parent_target_exposure", self._get_parent_target_exposure()
-        )
-        parent_stock_value = getattr(self, "_parent_stock_value", self._get_parent_stock_value())
-
-        if parent_stock_value <= 0:
-            print(f"{self.name}: 父节点无股票持仓，期货无需调仓")
-            return
-
-        futures_info = self._get_futures_contract_info()
-
-        # 计算目标期货敞口
-        # 对于中性策略：target_exposure = 0，期货应完全对冲股票
-        # 对于指增策略：target_exposure = 1.0，期货应不对冲
-        target_futures_exposure = parent_stock_value * (parent_target_exposure - 1.0)
+        """获取股票价格"""
+        return self.price_provider.get_price(stock_code)
 
-        # 计算需要的期货手数（负数表示空头）
-        contract_value = futures_info["current_price"] * futures_info["multiplier"]
-        target_contracts = (
-            abs(target_futures_exposure) / contract_value if contract_value > 0 else 0
-        )
-
-        # 计算当前期货持仓价值
-        current_futures_value = sum(
-            pos.futures_amount * pos.futures_cost * futures_info["multiplier"]
-            for pos in self.virtual_account.futures_short_info
-        )
-        current_contracts = current_futures_value / contract_value if contract_value > 0 else 0
-
-        # 计算需要调整的手数
-        contracts_diff = target_contracts - current_contracts
-
-        print(f"\n{self.name} 期货调仓:")
-        print(f"  期货合约: {futures_info['name']}")
-        print(f"  父节点股票市值: {parent_stock_value:,.2f} 元")
-        print(f"  父节点目标敞口: {parent_target_exposure:.1f}")
-        print(f"  目标期货敞口: {target_futures_exposure:,.2f} 元")
-        print(f"  合约价值: {contract_value:,.2f} 元/手")
-        print(f"  目标手数: {target_contracts:.1f}手")
-        print(f"  当前手数: {current_contracts:.1f}手")
-
-        if abs(contracts_diff) > 0.1:  # 超过0.1手才调仓
-            margin_required = abs(contracts_diff) * contract_value * futures_info["margin_rate"]
-
-            if contracts_diff > 0:
-                # 增加空头仓位
-                if self.virtual_account.cash_info.available_cash >= margin_required:
-                    position = FuturesPositionInfo(
-                        futures_code=futures_info["index_code"],
-                        futures_amount=contracts_diff,
-                        futures_cost=futures_info["current_price"],
-                    )
-                    self.virtual_account.futures_short_info.append(position)
-                    self.virtual_account.cash_info.available_cash -= margin_required
-                    print(f"  开空 {contracts_diff:.1f}手，保证金: {margin_required:,.2f} 元")
-                else:
-                    available_cash = self.virtual_account.cash_info.available_cash
-                    max_contracts = available_cash / (contract_value * futures_info["margin_rate"])
-                    print(
-                        f"  现金不足（可用: {available_cash:,.2f}元），只能开空 {max_contracts:.1f}手"
-                    )
-
-                    if max_contracts > 0.1:
-                        position = FuturesPositionInfo(
-                            futures_code=futures_info["index_code"],
-                            futures_amount=max_contracts,
-                            futures_cost=futures_info["current_price"],
-                        )
-                        self.virtual_account.futures_short_info.append(position)
-                        self.virtual_account.cash_info.available_cash -= (
-                            max_contracts * contract_value * futures_info["margin_rate"]
-                        )
-                        print(f"  实际开空 {max_contracts:.1f}手")
-            else:
-                # 减少空头仓位
-                contracts_to_close = abs(contracts_diff)
-                self._close_futures_positions(contracts_to_close, futures_info)
-                margin_released = contracts_to_close * contract_value * futures_info["margin_rate"]
-                self.virtual_account.cash_info.available_cash += margin_released
-                print(f"  平空 {contracts_to_close:.1f}手，释放保证金: {margin_released:,.2f} 元")
-        else:
-            print(f"  仓位无需调整")
-
-    def _get_parent_target_exposure(self) -> float:
-        """获取父节点目标敞口"""
-        # 这里需要向上查找父节点，简化起见，根据策略名称判断
-        strategy_name = self.name
-        if "对冲" in strategy_name:
-            return 0.0  # 中性策略目标敞口为0
-        elif "指增" in strategy_name:
-            return 1.0  # 指增策略目标敞口为1
-        else:
-            return 0.0  # 默认中性
-
-    def _get_parent_stock_value(self) -> float:
-        """获取父节点下所有股票策略的市值总和"""
-        # 这是一个简化版本，实际应该通过父节点引用计算
-        # 这里使用策略权重估算
-        if "300" in self.name:
-            return 100000000 * 0.85  # 假设300策略组合85%配置股票
-        elif "500" in self.name:
-            return 80000000 * 0.85  # 假设500策略组合
-        elif "1000" in self.name:
-            return 60000000 * 0.85  # 假设1000策略组合
-        else:
-            return 50000000
+    def _get_stock_prices(self, stock_codes: list[str]) -> np.ndarray:
+        """批量获取股票价格，与 stock_codes 一一对应"""
+        return self.price_provider.get_prices(stock_codes)
 
-    def _close_futures_positions(self, contracts_to_close: float, futures_info: dict) -> None:
+    def _close_futures_positions(self, contracts_to_close: float, futures_code: str) -> None:
         """平仓期货"""
         remaining_to_close = contracts_to_close
         positions_to_remove = []
 
         for i, position in enumerate(self.virtual_account.futures_short_info):
-            if position.futures_code == futures_info["index_code"] and remaining_to_close > 0:
+            if position.futures_code == futures_code and remaining_to_close > 0:
                 if position.futures_amount <= remaining_to_close:
                     # 全部平仓
                     remaining_to_close -= position.futures_amount
@@ -922,50 +1144,27 @@ class StrategyTree(BaseModel):
         for i in reversed(positions_to_remove):
             self.virtual_account.futures_short_info.pop(i)
 
-    def _coordinate_futures_hedging(self) -> None:
-        """协调期货对冲 - 在组合级别计算总敞口"""
-        target_exposure = self.strategy_info.get("target_exposure")
-        if target_exposure is None:
-            return
-
-        # 计算子节点总股票市值
-        total_stock_value = 0
-        futures_children = []
-
-        def collect_stock_value_and_futures(node):
-            nonlocal total_stock_value
-            if not node.children:
-                # 叶子节点
-                if node._is_futures_strategy():
-                    futures_children.append(node)
-                else:
-                    total_stock_value += node._calculate_total_position_value()
-            else:
-                for child in node.children:
-                    collect_stock_value_and_futures(child)
-
-        collect_stock_value_and_futures(self)
-
-        if total_stock_value > 0 and futures_children:
-            print(f"\n{self.name} 期货协调:")
-            print(f"  目标敞口: {target_exposure}")
-            print(f"  子节点股票总市值: {total_stock_value:,.2f} 元")
-            print(f"  期货策略数: {len(futures_children)}个")
-
-            # 更新期货策略的父节点信息
-            for futures_child in futures_children:
-                futures_child._parent_stock_value = total_stock_value
-                futures_child._parent_target_exposure = target_exposure
+    def print_futures_details(self, level: int = 0, has_futures: np.ndarray | None = None) -> None:
+        """
+        打印期货持仓详情
+        has_futures: 按索引先序排列的子树是否有期货持仓，缺省时在顶层计算一次
+        """
+        index = self.tree_index
+        if has_futures is None:
+            holds_futures = np.fromiter(
+                (bool(node.virtual_account.futures_short_info) for node in index.nodes),
+                dtype=float,
+                count=len(index),
+            )
+            has_futures = index.subtree_sum(holds_futures) > 0
 
-    def print_futures_details(self, level: int = 0) -> None:
-        """打印期货持仓详情"""
         indent = "  " * level
 
         if self.virtual_account.futures_short_info:
             print(f"{indent}🔻 期货空头持仓:")
             total_margin = 0
             for position in self.virtual_account.futures_short_info:
-                futures_info = self._get_futures_contract_info()
+                futures_info = self._get_futures_contract_info(position.futures_code)
                 contract_value = position.futures_cost * futures_info["multiplier"]
                 position_value = position.futures_amount * contract_value
                 margin = position_value * futures_info["margin_rate"]
@@ -978,30 +1177,24 @@ class StrategyTree(BaseModel):
 
             print(f"{indent}    💰 期货保证金总计: {total_margin:,.2f} 元")
 
-        # 递归打印子节点期货
+        # 递归打印子树中有期货持仓的子节点
         for child in self.children:
-            if child.virtual_account.futures_short_info or any(
-                grandchild.virtual_account.futures_short_info
-                for grandchild in self._get_all_descendants()
-            ):
-                child.print_futures_details(level + 1)
+            if has_futures[index.row(child)]:
+                child.print_futures_details(level + 1, has_futures)
 
     def _get_all_descendants(self) -> list["StrategyTree"]:
         """获取所有后代节点"""
-        descendants = []
-        for child in self.children:
-            descendants.append(child)
-            descendants.extend(child._get_all_descendants())
-        return descendants
+        return self.tree_index.subtree(self)[1:]
 
     def advanced_rebalance(
         self,
         market_signals: dict[str, dict[str, float]],
         trading_system: TradingSystem | None = None,
-    ) -> None:
+    ) -> UnfilledReport | None:
         """
         高级调仓：使用交易系统的完整流程
         market_signals: {"strategy_name": {"stock_code": adjustment, ...}, ...}
+        返回产品层调仓的未成交报告，叶子节点或无交易单时返回 None
         """
         if trading_system is None:
             trading_system = TradingSystem()
@@ -1014,73 +1207,94 @@ class StrategyTree(BaseModel):
                 self._execute_advanced_rebalance(
                     market_signals[self.name], optimizer, trading_system
                 )
-        else:
-            # 非叶子节点：收集所有子策略的交易单
-            all_orders = []
-            strategy_nodes = []
-
-            def collect_strategy_orders(node):
-                if not node.children and not node._is_futures_strategy():
-                    if node.name in market_signals:
-                        signal = market_signals[node.name]
-                        target_weights = optimizer.generate_target_weights(node, signal)
-                        orders = optimizer.generate_trade_orders(node, target_weights)
-                        all_orders.extend(orders)
-                        strategy_nodes.append(node)
-
-                        print(f"\n{node.name} 生成交易单:")
-                        for order in orders:
-                            print(
-                                f"  {order.direction.value} {order.stock_code}: {order.target_shares:,.0f}股 "
-                                f"({order.target_value:,.2f}元)"
-                            )
-                else:
-                    for child in node.children:
-                        collect_strategy_orders(child)
+            return None
 
-            collect_strategy_orders(self)
+        # 非叶子节点：收集所有子策略的交易单
+        all_orders = []
+        strategy_nodes = []
 
-            if all_orders:
-                print(f"\n{self.name} 产品层汇总:")
-                print(f"  收集到 {len(all_orders)} 个交易单")
-
-                # 产品层自成交
-                print("\n执行内部自成交...")
-                crossed_orders = trading_system.cross_trade(all_orders)
+        for node in self.tree_index.leaves(self):
+            if node._is_futures_strategy() or node.name not in market_signals:
+                continue
+            signal = market_signals[node.name]
+            target_weights = optimizer.generate_target_weights(node, signal)
+            orders = optimizer.generate_trade_orders(node, target_weights)
+            all_orders.extend(orders)
+            strategy_nodes.append(node)
+
+            tracer.emit("advanced.orders", "\n{name} 生成交易单:", name=node.name)
+            for order in orders:
+                tracer.emit(
+                    "advanced.order",
+                    "  {direction} {stock_code}: {shares:,.0f}股 ({value:,.2f}元)",
+                    direction=order.direction.value,
+                    stock_code=order.stock_code,
+                    shares=order.target_shares,
+                    value=order.target_value,
+                )
 
-                cross_count = sum(1 for o in crossed_orders if o.executed_shares > 0)
-                print(f"  自成交订单数: {cross_count}")
+        if not all_orders:
+            return None
 
-                # 计算总可用现金
-                total_cash = sum(
-                    node.virtual_account.cash_info.available_cash for node in strategy_nodes
-                )
+        tracer.emit(
+            "advanced.collected",
+            "\n{name} 产品层汇总:\n  收集到 {order_count} 个交易单",
+            name=self.name,
+            order_count=len(all_orders),
+        )
 
-                # 执行剩余订单
-                print(f"\n移交外部交易系统执行，可用现金: {total_cash:,.2f} 元")
-                remaining_orders = [o for o in crossed_orders if o.remaining_shares > 0.01]
+        # 产品层按股票净额汇总，买卖相抵的部分内部对冲
+        aggregation = aggregate_orders(
+            all_orders, [node.name for node in strategy_nodes], self.name
+        )
+        parent_orders = aggregation.parent_orders
 
-                if remaining_orders:
-                    executed_orders, remaining_cash = trading_system.execute_orders(
-                        remaining_orders, total_cash
-                    )
+        tracer.emit(
+            "advanced.aggregated",
+            "  净额汇总为 {parent_count} 个产品层母单\n  内部对冲股数: {crossed_shares:,.0f}",
+            parent_count=len(parent_orders),
+            crossed_shares=float(aggregation.crossed_shares.sum()),
+        )
 
-                    # 统计执行结果
-                    total_executed = sum(o.executed_value for o in executed_orders)
-                    avg_execution_rate = (
-                        sum(o.execution_ratio for o in executed_orders) / len(executed_orders)
-                        if executed_orders
-                        else 0
-                    )
+        # 计算总可用现金
+        total_cash = sum(node.virtual_account.cash_info.available_cash for node in strategy_nodes)
 
-                    print(f"  外部成交金额: {total_executed:,.2f} 元")
-                    print(f"  平均成交率: {avg_execution_rate:.1%}")
+        # 执行母单
+        tracer.emit(
+            "advanced.execute",
+            "\n移交外部交易系统执行，可用现金: {cash:,.2f} 元",
+            cash=total_cash,
+        )
+        executed_orders, remaining_cash = trading_system.execute_orders(parent_orders, total_cash)
+
+        # 统计执行结果
+        total_executed = sum(o.executed_value for o in executed_orders)
+        avg_execution_rate = (
+            sum(o.execution_ratio for o in executed_orders) / len(executed_orders)
+            if executed_orders
+            else 0
+        )
 
-                    # 应用交易结果到各策略
-                    self._apply_trade_results(executed_orders, strategy_nodes)
+        tracer.emit(
+            "advanced.executed",
+            "  外部成交金额: {executed_value:,.2f} 元\n  平均成交率: {execution_rate:.1%}",
+            executed_value=total_executed,
+            execution_rate=avg_execution_rate,
+        )
 
-                    # 处理未成交订单
-                    self._handle_unfilled_orders(executed_orders, strategy_nodes)
+        # 按分配表把母单成交拆回叶子，一次性写回各叶子持仓和现金
+        distribution = distribute_fills(aggregation, len(strategy_nodes))
+        distribution.apply([node.virtual_account for node in strategy_nodes])
+        for node in strategy_nodes:
+            node._account_changed()
+
+        unfilled_report = distribution.unfilled_report([node.name for node in strategy_nodes])
+        tracer.emit(
+            "advanced.unfilled",
+            "  未成交订单: {unfilled_count}个",
+            unfilled_count=len(unfilled_report.orders),
+        )
+        return unfilled_report
 
     def _execute_advanced_rebalance(
         self,
@@ -1096,11 +1310,15 @@ class StrategyTree(BaseModel):
         orders = optimizer.generate_trade_orders(self, target_weights)
 
         if not orders:
-            print(f"{self.name}: 无需调仓")
+            tracer.emit("advanced.skip", "{name}: 无需调仓", name=self.name)
             return
 
-        print(f"\n{self.name} 高级调仓:")
-        print(f"  目标权重: {target_weights}")
+        tracer.emit(
+            "advanced.leaf",
+            "\n{name} 高级调仓:\n  目标权重: {target_weights}",
+            name=self.name,
+            target_weights=target_weights,
+        )
 
         # 执行交易
         executed_orders, remaining_cash = trading_system.execute_orders(
@@ -1110,23 +1328,7 @@ class StrategyTree(BaseModel):
         # 应用交易结果
         self._apply_single_strategy_trades(executed_orders)
         self.virtual_account.cash_info.available_cash = remaining_cash
-
-    def _apply_trade_results(
-        self, executed_orders: list[TradeOrder], strategy_nodes: list["StrategyTree"]
-    ) -> None:
-        """应用交易结果到各策略"""
-        # 按策略分组订单
-        strategy_orders = {}
-        for order in executed_orders:
-            if order.strategy_name not in strategy_orders:
-                strategy_orders[order.strategy_name] = []
-            strategy_orders[order.strategy_name].append(order)
-
-        # 应用到各策略
-        for strategy_node in strategy_nodes:
-            if strategy_node.name in strategy_orders:
-                orders = strategy_orders[strategy_node.name]
-                strategy_node._apply_single_strategy_trades(orders)
+        self._account_changed()
 
     def _apply_single_strategy_trades(self, orders: list[TradeOrder]) -> None:
         """应用交易结果到单个策略"""
@@ -1136,66 +1338,12 @@ class StrategyTree(BaseModel):
 
             if order.direction == TradeDirection.BUY:
                 # 买入
-                position = StockPositionInfo(
-                    stock_code=order.stock_code,
-                    stock_amount=order.executed_shares,
-                    stock_cost=order.price,
+                self.virtual_account.add_stock_position(
+                    order.stock_code, order.executed_shares, order.price
                 )
-                self.virtual_account.stock_long_info.append(position)
                 self.virtual_account.cash_info.available_cash -= order.executed_value
 
             elif order.direction == TradeDirection.SELL:
                 # 卖出
                 self._sell_stock(order.stock_code, order.executed_shares)
                 self.virtual_account.cash_info.available_cash += order.executed_value
-
-    def _handle_unfilled_orders(
-        self, executed_orders: list[TradeOrder], strategy_nodes: list["StrategyTree"]
-    ) -> None:
-        """处理未成交订单"""
-        unfilled_orders = [o for o in executed_orders if o.remaining_shares > 0.01]
-
-        if not unfilled_orders:
-            return
-
-        print(f"\n处理未成交订单 ({len(unfilled_orders)}个):")
-
-        # 按股票代码分组未成交订单
-        unfilled_by_stock = {}
-        for order in unfilled_orders:
-            if order.stock_code not in unfilled_by_stock:
-                unfilled_by_stock[order.stock_code] = {"buy": [], "sell": []}
-
-            if order.direction == TradeDirection.BUY:
-                unfilled_by_stock[order.stock_code]["buy"].append(order)
-            else:
-                unfilled_by_stock[order.stock_code]["sell"].append(order)
-
-        # 按权重分配未成交部分
-        for stock_code, orders_dict in unfilled_by_stock.items():
-            buy_orders = orders_dict["buy"]
-            sell_orders = orders_dict["sell"]
-
-            if buy_orders:
-                total_unfilled_buy = sum(o.remaining_shares for o in buy_orders)
-                total_target_buy = sum(o.target_shares for o in buy_orders)
-
-                if total_target_buy > 0:
-                    for order in buy_orders:
-                        weight = order.target_shares / total_target_buy
-                        allocated_unfilled = total_unfilled_buy * weight
-                        print(
-                            f"  {order.strategy_name} {stock_code} 未买入: {allocated_unfilled:,.0f}股"
-                        )
-
-            if sell_orders:
-                total_unfilled_sell = sum(o.remaining_shares for o in sell_orders)
-                total_target_sell = sum(o.target_shares for o in sell_orders)
-
-                if total_target_sell > 0:
-                    for order in sell_orders:
-                        weight = order.target_shares / total_target_sell
-                        allocated_unfilled = total_unfilled_sell * weight
-                        print(
-                            f"  {order.strategy_name} {stock_code} 未卖出: {allocated_unfilled:,.0f}股"
-                        )
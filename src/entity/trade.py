@@ -0,0 +1,37 @@
+from enum import Enum
+
+from pydantic import BaseModel, Field
+
+
+class TradeDirection(str, Enum):
+    """交易方向"""
+
+    BUY = "BUY"
+    SELL = "SELL"
+
+
+class TradeOrder(BaseModel):
+    """交易单"""
+
+    strategy_name: str = Field(description="策略名称")
+    stock_code: str = Field(description="股票代码")
+    direction: TradeDirection = Field(description="交易方向")
+    target_shares: float = Field(description="目标股数")
+    target_value: float = Field(description="目标金额")
+    price: float = Field(description="价格")
+    priority: int = Field(default=1, description="优先级，1最高")
+    executed_shares: float = Field(default=0, description="已成交股数")
+    executed_value: float = Field(default=0, description="已成交金额")
+
+    @property
+    def remaining_shares(self) -> float:
+        return self.target_shares - self.executed_shares
+
+    @property
+    def remaining_value(self) -> float:
+        return self.target_value - self.executed_value
+
+    @property
+    def execution_ratio(self) -> float:
+        """成交比例"""
+        return self.executed_shares / self.target_shares if self.target_shares > 0 else 0
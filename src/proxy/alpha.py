@@ -19,7 +19,12 @@ def get_alpha(
     )
 
 
+def get_stock_snapshots(codes: list[str] | str, *, date: str, snapshot_time: str) -> pd.DataFrame:
+    """批量读取某一时刻的股票快照，codes 为 "ALL" 时读取全市场"""
+    return virgo.stock.snapshots(codes, date, date, snapshot_time, snapshot_time)
+
+
 if __name__ == "__main__":
     print(get_alpha("mars_v8", "10:00", date=datetime.date(2025, 7, 28), intraday=True))
 
-    print(virgo.stock.snapshots("ALL", "2025-07-28", "2025-07-28", "10:00:00", "10:00:00"))
+    print(get_stock_snapshots("ALL", date="2025-07-28", snapshot_time="10:00:00"))
@@ -1,3 +1,4 @@
+from src.core.trace import ConsoleRenderer, tracer
 from src.entity.strategy import CashInfo, StrategyTree, VirtualAccount
 
 
@@ -232,6 +233,9 @@ def test_weight_validation():
 
 
 if __name__ == "__main__":
+    # 开启控制台输出，显示各步骤的过程信息
+    tracer.add_sink(ConsoleRenderer())
+
     print("🎯 策略树模拟系统")
     print("=" * 60)
 
@@ -0,0 +1,61 @@
+"""
+产品层净额汇总测试
+"""
+
+import pytest
+
+from src.core.aggregation import aggregate_orders
+from src.entity.trade import TradeDirection, TradeOrder
+
+
+def make_order(strategy: str, code: str, direction: TradeDirection, shares: float) -> TradeOrder:
+    return TradeOrder(
+        strategy_name=strategy,
+        stock_code=code,
+        direction=direction,
+        target_shares=shares,
+        target_value=shares * 10,
+        price=10,
+    )
+
+
+def test_orders_are_netted_per_symbol():
+    """同一股票的买卖单净额合并为一个母单"""
+    orders = [
+        make_order("a", "000001.SZ", TradeDirection.BUY, 300),
+        make_order("b", "000001.SZ", TradeDirection.SELL, 100),
+        make_order("c", "000001.SZ", TradeDirection.BUY, 100),
+        make_order("a", "600519.SH", TradeDirection.SELL, 50),
+        make_order("b", "600519.SH", TradeDirection.BUY, 50),
+    ]
+
+    aggregation = aggregate_orders(orders, ["a", "b", "c"], "product")
+
+    assert len(aggregation.parent_orders) == 1
+    parent = aggregation.parent_orders[0]
+    assert parent.stock_code == "000001.SZ"
+    assert parent.direction == TradeDirection.BUY
+    assert parent.target_shares == 300
+    assert aggregation.crossed_shares.tolist() == [100, 50]
+    assert aggregation.alloc_leaf.tolist() == [0, 1, 2, 0, 1]
+    assert aggregation.alloc_shares.tolist() == [300, -100, 100, -50, 50]
+
+
+def test_split_fills_back_to_leaves():
+    """内部对冲全额成交，外部成交按同方向股数等比例拆分"""
+    orders = [
+        make_order("a", "000001.SZ", TradeDirection.BUY, 300),
+        make_order("b", "000001.SZ", TradeDirection.SELL, 100),
+        make_order("c", "000001.SZ", TradeDirection.BUY, 100),
+    ]
+    aggregation = aggregate_orders(orders, ["a", "b", "c"], "product")
+    parent = aggregation.parent_orders[0]
+    parent.executed_shares = 150
+    parent.executed_value = 150 * 10.01
+
+    filled_shares, filled_value = aggregation.split_fills()
+
+    # 买方共成交 100(对冲) + 150(外部) = 250，按 3:1 分给 a、c
+    assert filled_shares.tolist() == pytest.approx([187.5, 100, 62.5])
+    assert filled_value[0] == pytest.approx(0.75 * (100 * 10 + 150 * 10.01))
+    assert filled_value[1] == pytest.approx(1000)
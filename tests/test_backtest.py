@@ -0,0 +1,145 @@
+"""
+逐日回测测试
+"""
+
+import numpy as np
+import polars as pl
+import pytest
+
+from src.core.backtest import BacktestEngine, ParquetAlphaSource, top_alpha_weights
+from src.core.futures import ContractRegistry, set_futures_registry
+from src.core.price import FilePriceProvider
+from src.core.trading_calendar import TradingCalendar
+from src.entity.strategy import CashInfo, StrategyTree, VirtualAccount
+
+DAYS = ["2025-07-28", "2025-07-29", "2025-07-30", "2025-07-31"]
+
+
+def build_tree() -> StrategyTree:
+    """root -> hedge(target 0) -> (alpha 叶子, 期货叶子)"""
+    stocks = StrategyTree(fund_id=1, weight=0.9, name="stocks", strategy_info={"model": "mars_v8"})
+    futures = StrategyTree(
+        fund_id=2,
+        weight=0.1,
+        name="futures",
+        strategy_info={"strategy_type": "期货对冲", "contract": "IC期货"},
+    )
+    hedge = StrategyTree(
+        fund_id=3,
+        weight=1.0,
+        name="hedge",
+        children=[stocks, futures],
+        strategy_info={"target_exposure": 0},
+    )
+    root = StrategyTree(
+        fund_id=4,
+        weight=1.0,
+        name="root",
+        children=[hedge],
+        virtual_account=VirtualAccount(cash_info=CashInfo()),
+    )
+    root.process_subscription(20_000_000)
+    return root
+
+
+@pytest.fixture
+def market(tmp_path):
+    """三只股票逐日价格，alpha 每天轮换排名"""
+    codes = ["A", "B", "C"]
+    prices = pl.DataFrame(
+        {
+            "stock_code": codes * len(DAYS),
+            "timestamp": [f"{day} 15:00:00" for day in DAYS for _ in codes],
+            "price": [10.0, 20.0, 40.0, 11.0, 20.0, 38.0, 12.0, 21.0, 40.0, 12.0, 22.0, 41.0],
+        }
+    )
+    alpha = pl.DataFrame(
+        {
+            "model": ["mars_v8"] * 3 * len(DAYS),
+            "trade_date": [day for day in DAYS for _ in codes],
+            "code": codes * len(DAYS),
+            "alpha": [0.3, 0.2, -0.1, 0.1, 0.3, 0.2, 0.2, -0.1, 0.3, 0.3, 0.1, 0.2],
+        }
+    )
+    prices.write_csv(tmp_path / "prices.csv")
+    alpha.write_parquet(tmp_path / "alpha.parquet")
+    return FilePriceProvider(tmp_path / "prices.csv"), ParquetAlphaSource(
+        tmp_path / "alpha.parquet"
+    )
+
+
+def test_top_alpha_weights_keeps_positive_top_n():
+    """只保留 alpha 为正的前 top_n 只，等权"""
+    codes, weights = top_alpha_weights(["A", "B", "C", "D"], np.array([0.1, -0.2, 0.5, 0.3]), 2)
+
+    assert sorted(codes) == ["C", "D"]
+    assert weights.tolist() == [0.5, 0.5]
+
+
+def test_backtest_rebalances_hedges_and_records_nav(market):
+    """每天换到 alpha 前两名，期货开空，净值按收盘价变化"""
+    prices, alpha = market
+    engine = BacktestEngine(build_tree(), alpha, prices, TradingCalendar(), top_n=2)
+
+    result = engine.run(DAYS[0], DAYS[-1])
+
+    stocks = engine.tree.tree_index.by_name["stocks"]
+    futures = engine.tree.tree_index.by_name["futures"]
+    assert result.dates == DAYS
+    assert sorted(stocks.virtual_account.get_stock_arrays()[0]) == ["A", "C"]
+    assert futures.virtual_account.futures_short_info
+    # 第一天按收盘价建仓，总资产等于申购金额
+    assert result.nav[0] == pytest.approx(20_000_000)
+    # 第二天 A 从 10 涨到 11，B 不变：股票部分 18,000,000 × 50% × 10%
+    assert result.nav[1] == pytest.approx(20_000_000 + 900_000)
+    assert result.turnover[0] == pytest.approx(18_000_000)
+
+
+def test_checkpoint_resume_matches_uninterrupted_run(market, tmp_path):
+    """中途停止后从检查点续跑，结果与一次跑完一致"""
+    prices, alpha = market
+    full = BacktestEngine(build_tree(), alpha, prices, TradingCalendar(), top_n=2).run(
+        DAYS[0], DAYS[-1]
+    )
+
+    path = tmp_path / "checkpoint.json"
+    BacktestEngine(
+        build_tree(), alpha, prices, TradingCalendar(), top_n=2, checkpoint_path=path
+    ).run(DAYS[0], DAYS[1])
+    resumed = BacktestEngine(
+        build_tree(), alpha, prices, TradingCalendar(), top_n=2, checkpoint_path=path
+    ).run(DAYS[0], DAYS[-1])
+
+    assert resumed.dates == full.dates
+    np.testing.assert_allclose(resumed.node_values, full.node_values)
+
+
+def test_futures_marked_and_settled_daily(market, tmp_path):
+    """期货按当天价格结算：指数上涨时空头亏损，对冲净值与不对冲净值的差额等于空头盈亏"""
+    prices, alpha = market
+    path = tmp_path / "marks.csv"
+    path.write_text(
+        "code,timestamp,price\nIC,2025-07-28 15:00:00,4000\nIC,2025-07-29 15:00:00,4200\n",
+        encoding="utf-8",
+    )
+    previous = set_futures_registry(
+        ContractRegistry(feed=FilePriceProvider(path, code_column="code"))
+    )
+    try:
+        hedged = BacktestEngine(build_tree(), alpha, prices, TradingCalendar(), top_n=2)
+        unhedged = BacktestEngine(
+            build_tree(), alpha, prices, TradingCalendar(), top_n=2, hedge=False
+        )
+        hedged.step(DAYS[0])
+        unhedged.step(DAYS[0])
+        futures = hedged.tree.tree_index.by_name["futures"].virtual_account.futures_short_info
+        lots = sum(position.futures_amount for position in futures)
+        assert futures[0].futures_cost == 4000
+
+        hedged_nav, unhedged_nav = hedged.step(DAYS[1])[0], unhedged.step(DAYS[1])[0]
+    finally:
+        set_futures_registry(previous)
+
+    assert lots > 0
+    assert hedged_nav - unhedged_nav == pytest.approx(-200 * 300 * lots)
+    assert {position.futures_cost for position in futures} == {4200}
@@ -0,0 +1,46 @@
+"""
+beta 估计测试
+"""
+
+import numpy as np
+import pytest
+
+from src.core.beta import BetaModel, ReturnProvider, SimulatedReturnProvider
+
+
+class CountingProvider(ReturnProvider):
+    """记录取数次数的模拟收益"""
+
+    def __init__(self) -> None:
+        self.inner = SimulatedReturnProvider()
+        self.calls: list[tuple[str, int]] = []
+
+    def get_returns(self, codes, trade_date, window):
+        self.calls.append((trade_date, len(codes)))
+        return self.inner.get_returns(codes, trade_date, window)
+
+
+def test_betas_load_on_member_index_and_cache_per_day():
+    """成分股 beta 集中在所属指数；同一交易日复用估计，新增代码时按并集重估一次"""
+    provider = CountingProvider()
+    model = BetaModel(provider, window=250)
+
+    estimate = model.estimate(["600519.SH", "300750.SZ"], "2024-01-02")
+    assert model.estimate(["300750.SZ"], "2024-01-02") is estimate
+    extended = model.estimate(["688111.SH"], "2024-01-02")
+    model.estimate(["600519.SH"], "2024-01-03")
+
+    assert provider.calls == [("2024-01-02", 5), ("2024-01-02", 6), ("2024-01-03", 4)]
+    assert extended.codes == ["600519.SH", "300750.SZ", "688111.SH"]
+    assert extended.betas.argmax(axis=1).tolist() == [0, 1, 2]
+    assert extended.betas.max(axis=1) == pytest.approx(np.ones(3), abs=0.4)
+
+
+def test_unknown_code_uses_fallback_beta():
+    """没有收益历史的代码使用 fallback_beta"""
+    model = BetaModel(SimulatedReturnProvider(), fallback_beta=[0.0, 1.0, 0.0])
+
+    estimate = model.estimate(["UNKNOWN"], "2024-01-02")
+
+    assert estimate.betas.tolist() == [[0.0, 1.0, 0.0]]
+    assert estimate.factor_cov.shape == (3, 3)
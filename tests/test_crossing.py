@@ -0,0 +1,61 @@
+"""
+内部自成交测试
+"""
+
+import pytest
+
+from src.core.crossing import CrossAllocationEnum, cross_orders
+from src.entity.trade import TradeDirection, TradeOrder
+
+
+def make_order(
+    strategy: str, code: str, direction: TradeDirection, shares: float, priority: int = 1
+) -> TradeOrder:
+    return TradeOrder(
+        strategy_name=strategy,
+        stock_code=code,
+        direction=direction,
+        target_shares=shares,
+        target_value=shares * 10,
+        price=10,
+        priority=priority,
+    )
+
+
+def test_priority_allocation_fills_in_priority_order():
+    """优先级分配：优先级高的订单先满足"""
+    low = make_order("a", "000001.SZ", TradeDirection.BUY, 100, priority=2)
+    high = make_order("b", "000001.SZ", TradeDirection.BUY, 100, priority=1)
+    sell = make_order("c", "000001.SZ", TradeDirection.SELL, 150)
+
+    report = cross_orders([low, high, sell], CrossAllocationEnum.PRIORITY)
+
+    assert high.executed_shares == 100
+    assert low.executed_shares == 50
+    assert sell.executed_shares == 150
+    assert report.crossed_shares == {"000001.SZ": 150}
+    assert report.crossed_value == {"000001.SZ": 1500}
+
+
+def test_pro_rata_allocation_splits_by_remaining():
+    """等比例分配：按剩余数量分摊交叉数量"""
+    buy_a = make_order("a", "000001.SZ", TradeDirection.BUY, 300)
+    buy_b = make_order("b", "000001.SZ", TradeDirection.BUY, 100)
+    sell = make_order("c", "000001.SZ", TradeDirection.SELL, 200)
+
+    cross_orders([buy_a, buy_b, sell], CrossAllocationEnum.PRO_RATA)
+
+    assert buy_a.executed_shares == pytest.approx(150)
+    assert buy_b.executed_shares == pytest.approx(50)
+    assert sell.remaining_shares == pytest.approx(0)
+
+
+def test_symbols_without_opposite_side_are_untouched():
+    """只有单边订单的股票不参与交叉"""
+    buy = make_order("a", "000001.SZ", TradeDirection.BUY, 100)
+    sell = make_order("b", "600519.SH", TradeDirection.SELL, 100)
+
+    report = cross_orders([buy, sell])
+
+    assert report.crossed_shares == {}
+    assert buy.executed_shares == sell.executed_shares == 0
@@ -0,0 +1,66 @@
+"""
+成交模拟测试
+"""
+
+import numpy as np
+import pytest
+
+from src.core.execution import (
+    ExecutionSimulator,
+    SquareRootImpactFillModel,
+    StaticVolumeProvider,
+    VolumeParticipationFillModel,
+)
+from src.entity.strategy import TradingSystem
+from src.entity.trade import TradeDirection, TradeOrder
+
+
+def test_fixed_rate_sells_fund_buys_in_order():
+    """卖单先成交回笼现金，买单按顺序受现金约束，最后一笔部分成交"""
+    simulator = ExecutionSimulator()
+
+    result = simulator.execute(
+        ["A", "B", "C"], np.array([-100.0, 100.0, 100.0]), np.array([10.0, 10.0, 10.0]), 500.0
+    )
+
+    # 卖出 80 股得 799.2，现金 1299.2；B 买 80 股花 800.8，C 只够买 498.4 / 10.01 股
+    assert result.filled_shares[:2].tolist() == pytest.approx([80.0, 80.0])
+    assert result.filled_shares[2] == pytest.approx((1299.2 - 800.8) / 10.01)
+    assert result.remaining_cash == pytest.approx(0.0, abs=1e-9)
+
+
+def test_volume_participation_shares_capacity_and_sqrt_impact():
+    """同一股票的订单按比例分享成交量容量；平方根冲击随参与率上升"""
+    volumes = StaticVolumeProvider({"A": 1000.0, "B": 1_000_000.0})
+    participation = ExecutionSimulator(VolumeParticipationFillModel(0.1), volumes)
+    impact = ExecutionSimulator(SquareRootImpactFillModel(0.1, volatility=0.02), volumes)
+    shares = np.array([-300.0, -100.0, -100.0])
+
+    filled = participation.execute(["A", "A", "B"], shares, np.full(3, 10.0), 0.0)
+    impacted = impact.execute(["A", "A", "B"], shares, np.full(3, 10.0), 0.0)
+
+    assert filled.filled_shares.tolist() == pytest.approx([75.0, 25.0, 100.0])
+    assert impacted.impact[0] == pytest.approx(0.1 * 0.02 * np.sqrt(400 / 1000))
+    assert impacted.impact[0] > impacted.impact[2]
+
+
+def test_trading_system_uses_configured_simulator():
+    """TradingSystem 通过成交模拟器执行并写回订单"""
+    simulator = ExecutionSimulator(
+        VolumeParticipationFillModel(0.5, slippage_rate=0.0), StaticVolumeProvider({"A": 100.0})
+    )
+    system = TradingSystem(execution_simulator=simulator)
+    order = TradeOrder(
+        strategy_name="s",
+        stock_code="A",
+        direction=TradeDirection.BUY,
+        target_shares=80,
+        target_value=800,
+        price=10.0,
+    )
+
+    executed, remaining_cash = system.execute_orders([order], 1000.0)
+
+    assert executed == [order]
+    assert order.executed_shares == 50
+    assert remaining_cash == pytest.approx(500.0)
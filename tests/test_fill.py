@@ -0,0 +1,46 @@
+"""
+成交分发测试
+"""
+
+import pytest
+
+from src.core.aggregation import aggregate_orders
+from src.core.fill import distribute_fills
+from src.entity.strategy import VirtualAccount
+from src.entity.trade import TradeDirection, TradeOrder
+
+
+def make_order(strategy: str, code: str, direction: TradeDirection, shares: float) -> TradeOrder:
+    return TradeOrder(
+        strategy_name=strategy,
+        stock_code=code,
+        direction=direction,
+        target_shares=shares,
+        target_value=shares * 10,
+        price=10,
+    )
+
+
+def test_distribution_updates_positions_cash_and_reports_unfilled():
+    """成交写回各叶子账户，未成交余量进入报告"""
+    accounts = [VirtualAccount(), VirtualAccount().use_compact_positions()]
+    accounts[1].add_stock_position("000001.SZ", 500, 9.0)
+    orders = [
+        make_order("a", "000001.SZ", TradeDirection.BUY, 400),
+        make_order("b", "000001.SZ", TradeDirection.SELL, 100),
+    ]
+    aggregation = aggregate_orders(orders, ["a", "b"], "product")
+    parent = aggregation.parent_orders[0]
+    parent.executed_shares = 200
+    parent.executed_value = 2000
+
+    distribution = distribute_fills(aggregation, leaf_count=2)
+    distribution.apply(accounts)
+    report = distribution.unfilled_report(["a", "b"])
+
+    assert accounts[0].get_stock_amount("000001.SZ") == pytest.approx(300)
+    assert accounts[0].cash_info.available_cash == pytest.approx(-3000)
+    assert accounts[1].get_stock_amount("000001.SZ") == pytest.approx(400)
+    assert accounts[1].cash_info.available_cash == pytest.approx(1000)
+    assert [(o.strategy_name, o.unfilled_shares) for o in report.orders] == [("a", 100)]
+    assert report.by_stock() == {"000001.SZ": 100}
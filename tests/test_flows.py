@@ -0,0 +1,46 @@
+"""
+批量申购赎回测试
+"""
+
+import pytest
+
+from src.core.flows import process_fund_flows
+from src.entity.strategy import StrategyTree
+
+
+def build_fund(fund_id: int) -> StrategyTree:
+    """root -> (group -> (a, b), c)"""
+    leaf_a = StrategyTree(fund_id=fund_id, weight=0.5, name=f"{fund_id}-a")
+    leaf_b = StrategyTree(fund_id=fund_id, weight=0.5, name=f"{fund_id}-b")
+    leaf_c = StrategyTree(fund_id=fund_id, weight=0.4, name=f"{fund_id}-c")
+    group = StrategyTree(
+        fund_id=fund_id, weight=0.6, name=f"{fund_id}-group", children=[leaf_a, leaf_b]
+    )
+    return StrategyTree(fund_id=fund_id, weight=1.0, name=str(fund_id), children=[group, leaf_c])
+
+
+def test_flows_are_netted_and_allocated_by_path_weight():
+    """同一产品的申购赎回先净额汇总，再按叶子路径权重分配"""
+    fund_1, fund_2 = build_fund(1), build_fund(2)
+
+    result = process_fund_flows(
+        [fund_1, fund_2], [1, 2, 1, 2], [1_000_000, 500_000, -200_000, -800_000]
+    )
+
+    assert result.fund_ids.tolist() == [1, 2]
+    assert result.net_amounts.tolist() == pytest.approx([800_000, -300_000])
+    assert result.fund_allocations(1) == pytest.approx(
+        {"1-a": 240_000, "1-b": 240_000, "1-c": 320_000}
+    )
+    assert fund_1.virtual_account.cash_info.pending_purchase_amount == pytest.approx(800_000)
+    leaf_c = fund_2.children[1]
+    assert leaf_c.virtual_account.cash_info.pending_purchase_amount == pytest.approx(-120_000)
+
+
+def test_unknown_fund_is_rejected_before_applying():
+    """存在未知产品ID时整批不生效"""
+    fund = build_fund(1)
+
+    with pytest.raises(ValueError, match="未知的产品ID"):
+        process_fund_flows([fund], [1, 9], [100, 100])
+    assert fund.virtual_account.cash_info.pending_purchase_amount == 0
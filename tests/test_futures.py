@@ -0,0 +1,54 @@
+"""
+期货合约注册表测试
+"""
+
+import pytest
+
+from src.core.futures import ContractRegistry, set_futures_registry
+from src.core.price import FilePriceProvider
+from src.entity.strategy import FuturesPositionInfo, StrategyTree
+
+
+def test_lookup_and_vectorized_margins():
+    """按合约名查找，未知合约回落到默认合约，保证金按数组计算"""
+    registry = ContractRegistry()
+
+    assert registry.get("IM期货").index_code == "IM"
+    assert registry.get("未知合约").contract == "IC期货"
+    assert registry.by_index_code("IC500").multiplier == 200
+    margins = registry.margins(["IC期货", "IM期货"], [2, 1])
+    assert margins.tolist() == pytest.approx([2 * 4000 * 300 * 0.12, 7000 * 200 * 0.15])
+
+
+def test_marks_replayed_from_file(tmp_path):
+    """行情来源可以从本地文件回放，refresh_marks 按时间点刷新"""
+    path = tmp_path / "marks.csv"
+    path.write_text(
+        "code,timestamp,price\nIC,2024-01-02 09:30:00,4000\nIC,2024-01-02 10:00:00,4100\n",
+        encoding="utf-8",
+    )
+    registry = ContractRegistry(feed=FilePriceProvider(path, code_column="code"))
+
+    registry.refresh_marks("2024-01-02 09:45:00")
+    assert registry.mark_price("IC期货") == 4000
+    registry.refresh_marks("2024-01-02 10:00:00")
+    assert registry.mark_price("IC期货") == 4100
+    assert registry.contract_info("IC期货")["current_price"] == 4100
+
+
+def test_tree_margin_uses_registry(tmp_path):
+    """整树估值的保证金使用注册表的最新价"""
+    path = tmp_path / "marks.csv"
+    path.write_text("code,timestamp,price\nIC,2024-01-02 09:30:00,5000\n", encoding="utf-8")
+    leaf = StrategyTree(fund_id=1, weight=1.0, name="f", strategy_info={"contract": "IC期货"})
+    root = StrategyTree(fund_id=2, weight=1.0, name="root", children=[leaf])
+    leaf.virtual_account.futures_short_info.append(
+        FuturesPositionInfo(futures_code="IC", futures_amount=2, futures_cost=4000)
+    )
+
+    feed = FilePriceProvider(path, code_column="code")
+    previous = set_futures_registry(ContractRegistry(feed=feed))
+    try:
+        assert root.get_account_summary()["futures_margin"] == pytest.approx(2 * 5000 * 300 * 0.12)
+    finally:
+        set_futures_registry(previous)
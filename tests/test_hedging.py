@@ -0,0 +1,97 @@
+"""
+期货对冲求解测试
+"""
+
+import numpy as np
+import pytest
+
+from src.core.beta import BetaModel, SimulatedReturnProvider
+from src.core.hedging import HedgeActionEnum, HedgeSolver, solve_contract_mix
+from src.core.price import StaticPriceProvider
+from src.entity.strategy import CashInfo, StrategyTree, VirtualAccount
+
+
+def build_tree(
+    futures_cash: float, contract: str = "IC期货", stock_code: str = "000001.SZ"
+) -> StrategyTree:
+    """root -> hedge(target 0) -> (stocks, futures)"""
+    stocks = StrategyTree(fund_id=1, weight=0.9, name="stocks")
+    futures = StrategyTree(
+        fund_id=2,
+        weight=0.1,
+        name="futures",
+        virtual_account=VirtualAccount(cash_info=CashInfo(available_cash=futures_cash)),
+        strategy_info={"strategy_type": "期货对冲", "contract": contract},
+    )
+    hedge = StrategyTree(
+        fund_id=3,
+        weight=1.0,
+        name="hedge",
+        children=[stocks, futures],
+        strategy_info={"target_exposure": 0},
+    )
+    root = StrategyTree(fund_id=4, weight=1.0, name="root", children=[hedge])
+    # 10,000,000 元股票，IC 每手 4000 × 300 = 1,200,000 元
+    stocks.virtual_account.add_stock_position(stock_code, 1_000_000, 10.0)
+    return root.use_price_provider(StaticPriceProvider({stock_code: 10.0}))
+
+
+def test_solver_rounds_lots_without_mutating_accounts():
+    """整手取整，求解过程不修改账户"""
+    root = build_tree(futures_cash=10_000_000)
+    futures = root.tree_index.by_name["futures"]
+
+    plan = HedgeSolver().solve(root)
+
+    (order,) = plan.orders
+    assert plan.target_lots.tolist() == [8.0]
+    assert order.action == HedgeActionEnum.OPEN_SHORT
+    assert order.lots == 8
+    assert order.margin == pytest.approx(8 * 1_200_000 * 0.12)
+    assert not futures.virtual_account.futures_short_info
+
+
+def test_margin_limit_caps_open_lots_and_plan_is_applied():
+    """加仓受可用现金约束，执行后写入期货持仓和现金"""
+    root = build_tree(futures_cash=500_000)
+    futures = root.tree_index.by_name["futures"]
+
+    plan = root.rebalance_futures_positions()
+
+    (order,) = plan.orders
+    assert order.capped
+    assert order.lots == 3  # 500,000 / 144,000 向下取整
+    assert futures.virtual_account.futures_short_info[0].futures_amount == 3
+    assert futures.virtual_account.cash_info.available_cash == pytest.approx(500_000 - 3 * 144_000)
+    assert HedgeSolver().solve(root).order_lots.tolist() == [0.0]
+
+
+def test_contract_mix_is_non_negative_least_residual():
+    """无保证金惩罚时正暴露完全对冲，负暴露的合约不开仓"""
+    factor_cov = np.diag([1.0, 2.0, 3.0]) * 1e-4
+    exposures = np.array([[0.8, 0.3, 0.0], [1.0, -0.5, 0.2]])
+
+    ratios = solve_contract_mix(exposures, factor_cov, [0, 1, 2], np.full(3, 0.12))
+
+    assert ratios == pytest.approx(np.array([[0.8, 0.3, 0.0], [1.0, 0.0, 0.2]]))
+
+
+def test_multi_contract_leaf_hedges_by_beta():
+    """多合约叶子按组合 beta 选择合约，持仓只有中证500成分股时主要用 IC500 对冲"""
+    root = build_tree(futures_cash=10_000_000, contract="多合约", stock_code="300750.SZ")
+
+    model = BetaModel(SimulatedReturnProvider())
+    plan = HedgeSolver(beta_model=model, trade_date="2024-01-02").solve(root)
+
+    assert plan.leaf_contracts == ["IC期货", "IC500期货", "IM期货"]
+    assert plan.beta_index_codes == ["IC", "IC500", "IM"]
+    assert plan.target_lots[1] == plan.target_lots.max() > 0
+    assert [order.line for order in plan.orders] == np.flatnonzero(plan.target_lots).tolist()
+
+
+def test_multi_contract_requires_configured_beta_model():
+    """未传入也未配置全局 beta 模型时，多合约对冲报错而不是使用模拟收益"""
+    root = build_tree(futures_cash=10_000_000, contract="多合约", stock_code="300750.SZ")
+
+    with pytest.raises(ValueError, match="beta 模型"):
+        HedgeSolver(trade_date="2024-01-02").solve(root)
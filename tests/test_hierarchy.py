@@ -0,0 +1,85 @@
+"""
+带版本层级权重测试
+"""
+
+import pytest
+
+from src.database.hierarchy import HierarchyIndex, VersionedHierarchy, initial_hierarchy_rows
+
+NODES = [
+    {"_id": 1, "fund_id": 7, "parent_id": None, "name": "root"},
+    {"_id": 2, "fund_id": 7, "parent_id": 1, "weight": 0.5, "name": "a"},
+    {"_id": 3, "fund_id": 7, "parent_id": 1, "weight": 0.5, "name": "b"},
+    {"_id": 4, "fund_id": 7, "parent_id": 2, "weight": 1.0, "name": "c"},
+]
+
+
+def weights(tree) -> dict[str, float]:
+    return {node.name: node.weight for node in tree.tree_index.nodes}
+
+
+def test_tree_as_of_follows_intervals():
+    """按日期解析权重和父节点；区间外的节点及其子树不出现"""
+    rows = initial_hierarchy_rows(NODES, "2025-01-01")
+    hierarchy = VersionedHierarchy(NODES, rows)
+    hierarchy.set_weight(2, 1, 0.8, "2025-03-01")
+    hierarchy.set_weight(3, 1, 0.2, "2025-03-01")
+    # c 从 6 月起改挂到 b 下
+    hierarchy.set_weight(4, 3, 1.0, "2025-06-01")
+
+    assert weights(hierarchy.tree_as_of("2025-02-28")) == {"root": 1, "a": 0.5, "c": 1.0, "b": 0.5}
+    assert weights(hierarchy.tree_as_of("2025-03-01"))["a"] == 0.8
+    june = hierarchy.tree_as_of("2025-06-30")
+    assert june.tree_index.parent_of(june.tree_index.by_name["c"]).name == "b"
+    assert june.tree_index.by_name["c"].node_id == 4
+    # 生效之前节点不存在
+    assert weights(hierarchy.tree_as_of("2024-12-31")) == {"root": 1}
+
+
+def test_cache_returns_independent_copies_and_invalidates():
+    """缓存返回副本，修改不影响缓存；追加区间后清除之后日期的缓存"""
+    hierarchy = VersionedHierarchy(NODES, initial_hierarchy_rows(NODES, "2025-01-01"))
+    first = hierarchy.tree_as_of("2025-05-01")
+    first.children[0].weight = 0.1
+    assert weights(hierarchy.tree_as_of("2025-05-01"))["a"] == 0.5
+
+    closed, inserted = hierarchy.set_weight(2, 1, 0.7, "2025-04-01")
+    assert closed == {"child_node_id": 2, "start_date": "2025-01-01", "end_date": "2025-04-01"}
+    assert [row["weight"] for row in inserted] == [0.7]
+    assert weights(hierarchy.tree_as_of("2025-05-01"))["a"] == 0.7
+
+
+def test_first_change_keeps_earlier_dates_after_reload():
+    """没有层级记录的节点首次调整时补出原区间，重新加载后调整之前的日期仍是原结构"""
+    hierarchy = VersionedHierarchy(NODES)
+    closed, inserted = hierarchy.set_weight(4, 3, 0.6, "2025-06-01")
+
+    assert closed is None
+    assert [(row["parent_node_id"], row["weight"], row["end_date"]) for row in inserted] == [
+        (2, 1.0, "2025-06-01"),
+        (3, 0.6, None),
+    ]
+    # 只用写入的记录重建，不依赖内存中的缓存
+    reloaded = VersionedHierarchy(NODES, inserted)
+    may = reloaded.tree_as_of("2025-05-31")
+    assert may.tree_index.parent_of(may.tree_index.by_name["c"]).name == "a"
+    june = reloaded.tree_as_of("2025-06-01")
+    assert june.tree_index.parent_of(june.tree_index.by_name["c"]).name == "b"
+    assert weights(june)["c"] == 0.6
+
+    with pytest.raises(ValueError, match="根节点"):
+        hierarchy.set_weight(1, 2, 1.0, "2025-06-01")
+
+
+def test_overlapping_or_backdated_intervals_rejected():
+    """区间重叠、倒序追加报错"""
+    rows = [
+        {"child_node_id": 2, "parent_node_id": 1, "weight": 1, "start_date": "2025-01-01"},
+        {"child_node_id": 2, "parent_node_id": 1, "weight": 1, "start_date": "2025-02-01"},
+    ]
+    with pytest.raises(ValueError, match="重叠"):
+        HierarchyIndex(rows)
+
+    index = HierarchyIndex(rows[:1])
+    with pytest.raises(ValueError, match="生效日期"):
+        index.append(2, 1, 0.5, "2024-12-01")
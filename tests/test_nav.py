@@ -0,0 +1,55 @@
+"""
+增量净值账本测试
+"""
+
+import pytest
+
+from src.core.price import StaticPriceProvider
+from src.entity.strategy import StrategyTree
+
+
+def build_tree() -> StrategyTree:
+    """root -> (group -> (a, b), c)"""
+    leaf_a = StrategyTree(fund_id=1, weight=0.5, name="a")
+    leaf_b = StrategyTree(fund_id=2, weight=0.5, name="b").use_compact_positions()
+    leaf_c = StrategyTree(fund_id=3, weight=0.4, name="c")
+    group = StrategyTree(fund_id=4, weight=0.6, name="group", children=[leaf_a, leaf_b])
+    root = StrategyTree(fund_id=5, weight=1.0, name="root", children=[group, leaf_c])
+
+    leaf_a.virtual_account.add_stock_position("000001.SZ", 1000, 15.2)
+    leaf_b.virtual_account.add_stock_position("000001.SZ", 500, 15.2)
+    leaf_b.virtual_account.add_stock_position("600519.SH", 10, 1580.0)
+    leaf_c.virtual_account.cash_info.available_cash = 1_000
+    return root.use_price_provider(StaticPriceProvider({"000001.SZ": 10.0, "600519.SH": 1500.0}))
+
+
+def test_events_refresh_cached_aggregates():
+    """持仓、现金、价格事件只更新发生节点，摘要读取时推给祖先"""
+    root = build_tree()
+    ledger = root.track_nav()
+    leaf_a, leaf_b = root.children[0].children
+
+    ledger.on_position(leaf_a, "600519.SH", 2)
+    ledger.on_cash(leaf_a, available=-3000)
+    ledger.on_prices(["000001.SZ"], [12.0])
+
+    summary = root.get_account_summary()
+    assert summary["stock_value"] == pytest.approx(1500 * 12.0 + 12 * 1500.0)
+    assert summary["available_cash"] == pytest.approx(1000 - 3000)
+    assert leaf_b.get_account_summary()["stock_value"] == pytest.approx(500 * 12.0 + 15000)
+    assert ledger.summary(leaf_a)["stock_positions"] == 2
+
+
+def test_tree_operations_keep_ledger_in_sync():
+    """树上的申购、建仓、赎回都会同步净值账本"""
+    root = build_tree()
+    ledger = root.track_nav()
+
+    root.process_subscription(10_000)
+    root.build_positions_from_pending({"a": {"000001.SZ": 1.0}})
+    root.process_redemption(500)
+
+    cached = {node.name: ledger.summary(node) for node in ledger.nodes}
+    fresh = root.valuate_tree()
+    for node in ledger.nodes:
+        assert cached[node.name] == pytest.approx(fresh.summary(node))
@@ -0,0 +1,133 @@
+"""
+组合构建测试
+"""
+
+import numpy as np
+import pytest
+
+from src.core.portfolio import MarketData, PortfolioOptimizer, StaticMarketDataProvider
+from src.core.price import StaticPriceProvider
+from src.entity.alpha import BaseAlphaStrategy, BenchmarkEnum, ConstraintModel, UniverseEnum
+from src.entity.strategy import StrategyTree, TradeOptimizer
+
+TRADE_DATE = "2025-07-28"
+
+
+def build_market(size: int = 200, seed: int = 0) -> tuple[MarketData, np.ndarray]:
+    """size 只股票、7 个行业，前一半属于中证500，奇数位置的代码在科创板"""
+    rng = np.random.default_rng(seed)
+    codes = [f"{688000 + i:06d}.SH" if i % 2 else f"{i:06d}.SZ" for i in range(size)]
+    benchmark = np.where(np.arange(size) < size // 2, rng.random(size) + 0.5, 0.0)
+    data = MarketData(
+        codes=codes,
+        industries=[f"行业{i % 7}" for i in range(size)],
+        volatility=rng.uniform(0.01, 0.03, size),
+        index_weights={"000905.SSE": benchmark},
+    )
+    return data, rng.normal(0, 0.01, size)
+
+
+def make_strategy(**constraints) -> BaseAlphaStrategy:
+    return BaseAlphaStrategy(
+        alpha_name="mars_v8",
+        constraints=ConstraintModel(
+            benchmark=BenchmarkEnum.SSE_000905,
+            **{"max_weight": 0.02, "turnover_rate": 1.0, **constraints},
+        ),
+    )
+
+
+@pytest.mark.parametrize("risk_aversion", [0, 500])
+def test_solution_honors_constraints(risk_aversion: int):
+    """权重和为1，满足单股上限、基准偏离、行业暴露和股票池约束"""
+    data, alpha = build_market()
+    strategy = make_strategy(
+        weight_bias=[-0.02, 0.02],
+        risk_aversion=risk_aversion,
+        industry_up_limit=0.02,
+        industry_down_limit=-0.02,
+        universe=UniverseEnum.NON_KECHUANG,
+    )
+    optimizer = PortfolioOptimizer(StaticMarketDataProvider(data))
+
+    solution = optimizer.solve(strategy, data.codes, alpha, TRADE_DATE)
+
+    weights = solution.weights
+    benchmark = data.benchmark_weights("000905.SSE")
+    industry_ids, names = data.industry_ids
+    active = np.bincount(industry_ids, weights - benchmark, len(names))
+    assert solution.converged
+    assert weights.sum() == pytest.approx(1.0)
+    assert weights.max() <= 0.02 + 1e-9
+    assert np.abs(weights - benchmark).max() <= 0.02 + 1e-6
+    assert np.abs(active).max() <= 0.02 + 1e-4
+    assert weights[1::2].max() == 0.0
+    # alpha 为正的股票整体超配
+    assert alpha @ weights > alpha @ benchmark
+
+
+def test_turnover_limit_and_warm_start():
+    """第二天以上一期解为起点，换手不超过 turnover_rate，warm start 减少迭代"""
+    data, alpha = build_market()
+    strategy = make_strategy(risk_aversion=500, turnover_rate=0.1)
+    optimizer = PortfolioOptimizer(StaticMarketDataProvider(data))
+
+    first = optimizer.solve(strategy, data.codes, alpha, TRADE_DATE, key="leaf")
+    second = optimizer.solve(strategy, data.codes, -alpha, "2025-07-29", key="leaf")
+
+    assert second.turnover == pytest.approx(0.1)
+    assert 0.5 * np.abs(second.weights - first.weights).sum() == pytest.approx(0.1)
+    assert second.weights.sum() == pytest.approx(1.0)
+    again = optimizer.solve(strategy, data.codes, -alpha, "2025-07-29", key="leaf")
+    assert again.iterations < first.iterations
+
+
+def test_solve_tree_returns_allocations_for_alpha_leaves():
+    """整树并行求解，叶子原有但不在目标中的股票权重为 0"""
+    data, alpha = build_market()
+    strategy = make_strategy(risk_aversion=500)
+    leaves = [
+        StrategyTree(
+            fund_id=i,
+            weight=0.5,
+            name=f"leaf{i}",
+            strategy_info={"alpha_strategy": strategy.model_dump()},
+        )
+        for i in range(2)
+    ]
+    root = StrategyTree(fund_id=9, weight=1.0, name="root", children=leaves)
+    root.use_price_provider(StaticPriceProvider({"999999.SZ": 10.0}))
+    leaves[0].virtual_account.add_stock_position("999999.SZ", 100, 10.0)
+    optimizer = PortfolioOptimizer(StaticMarketDataProvider(data), max_workers=2)
+
+    allocations = optimizer.solve_tree(root, {"mars_v8": (data.codes, alpha)}, TRADE_DATE)
+
+    assert set(allocations) == {"leaf0", "leaf1"}
+    assert allocations["leaf0"]["999999.SZ"] == 0.0
+    assert sum(allocations["leaf1"].values()) == pytest.approx(1.0)
+
+
+def test_infeasible_previous_weights_not_interpolated():
+    """上一期权重违反单股上限时不按换手插值，结果仍满足约束"""
+    data, alpha = build_market()
+    strategy = make_strategy(risk_aversion=500, turnover_rate=0.1)
+    optimizer = PortfolioOptimizer(StaticMarketDataProvider(data))
+
+    solution = optimizer.solve(strategy, data.codes, alpha, TRADE_DATE, {data.codes[0]: 1.0})
+
+    assert solution.weights.max() <= 0.02 + 1e-9
+    assert solution.turnover > 0.1
+
+
+def test_target_weights_reject_unconverged_solution():
+    """求解未收敛时构建目标权重报错"""
+    data, alpha = build_market()
+    leaf = StrategyTree(fund_id=1, weight=1.0, name="leaf")
+    trade_optimizer = TradeOptimizer(
+        portfolio_optimizer=PortfolioOptimizer(StaticMarketDataProvider(data), max_iter=10)
+    )
+
+    with pytest.raises(ValueError, match="未收敛"):
+        trade_optimizer.construct_target_weights(
+            leaf, make_strategy(), data.codes, alpha, TRADE_DATE
+        )
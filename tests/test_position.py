@@ -0,0 +1,138 @@
+"""
+列式持仓簿测试
+"""
+
+import copy
+
+import numpy as np
+import pytest
+
+from src.entity.position import StockPositionBook, StockPositionInfo
+from src.entity.strategy import StrategyTree, VirtualAccount
+
+
+def test_book_merges_lots_with_weighted_cost():
+    """同一股票多次买入合并为一行，成本按数量加权"""
+    book = StockPositionBook()
+    book.add("000001.SZ", 100, 10.0)
+    book.add("000001.SZ", 300, 14.0)
+    book.add("600519.SH", 10, 1500.0)
+
+    assert len(book) == 2
+    assert book.amount("000001.SZ") == 400
+    assert book[0].stock_cost == pytest.approx(13.0)
+
+
+def test_book_reduce_removes_empty_rows():
+    """卖空的持仓被移除，其余行保持可查"""
+    book = StockPositionBook(
+        [
+            StockPositionInfo(stock_code="000001.SZ", stock_amount=100, stock_cost=10),
+            StockPositionInfo(stock_code="000002.SZ", stock_amount=50, stock_cost=8),
+            StockPositionInfo(stock_code="600036.SH", stock_amount=20, stock_cost=40),
+        ]
+    )
+
+    assert book.reduce("000001.SZ", 150) == 100
+    assert book.reduce("000002.SZ", 49.995, dust=0.01) == pytest.approx(49.995)
+    assert book.reduce("300750.SZ", 10) == 0
+
+    assert book.codes == ["600036.SH"]
+    assert book.amount("600036.SH") == 20
+
+
+def test_book_market_value_is_dot_product():
+    """市值为数量与价格向量的点积"""
+    book = StockPositionBook()
+    book.add("000001.SZ", 100, 10.0)
+    book.add("000002.SZ", 200, 8.0)
+
+    assert book.market_value(np.array([11.0, 9.0])) == pytest.approx(2900.0)
+
+
+def test_book_copy_is_independent():
+    """深拷贝后的持仓簿互不影响"""
+    account = VirtualAccount().use_compact_positions()
+    account.add_stock_position("000001.SZ", 100, 10.0)
+
+    cloned = copy.deepcopy(account)
+    cloned.reduce_stock_position("000001.SZ", 40)
+
+    assert account.get_stock_amount("000001.SZ") == 100
+    assert cloned.get_stock_amount("000001.SZ") == 60
+
+
+def test_book_fork_shares_arrays_until_write():
+    """fork 与原持仓簿共享数组，任一方写入时才复制"""
+    book = StockPositionBook()
+    book.add("000001.SZ", 100, 10.0)
+
+    forked = book.fork()
+    assert np.shares_memory(forked.amounts, book.amounts)
+
+    forked.reduce("000001.SZ", 40)
+    book.add("000002.SZ", 50, 8.0)
+
+    assert not np.shares_memory(forked.amounts, book.amounts)
+    assert forked.codes == ["000001.SZ"]
+    assert forked.amount("000001.SZ") == 60
+    assert book.amount("000001.SZ") == 100
+
+
+def test_tree_fork_copies_only_touched_leaves():
+    """树分支上的调仓和赎回不影响原树，未触及的叶子继续共享持仓数组"""
+    left = StrategyTree(fund_id=1, weight=0.5, name="left")
+    right = StrategyTree(fund_id=2, weight=0.5, name="right")
+    root = StrategyTree(fund_id=3, weight=1.0, name="root", children=[left, right])
+    root.use_compact_positions()
+    root.process_subscription(2_000_000)
+    root.build_positions_from_pending(
+        {"left": {"000001.SZ": 1.0}, "right": {"000001.SZ": 0.5, "600519.SH": 0.5}}
+    )
+
+    forked = root.fork()
+    forked.rebalance_positions({"left": {"000001.SZ": 0.5, "000002.SZ": 0.5}})
+
+    fork_left, fork_right = forked.children
+    assert left.virtual_account.stock_long_info.codes == ["000001.SZ"]
+    assert fork_left.virtual_account.get_stock_amount("000002.SZ") > 0
+    assert not np.shares_memory(
+        fork_left.virtual_account.stock_long_info.amounts,
+        left.virtual_account.stock_long_info.amounts,
+    )
+    assert np.shares_memory(
+        fork_right.virtual_account.stock_long_info.amounts,
+        right.virtual_account.stock_long_info.amounts,
+    )
+
+    amounts = right.virtual_account.stock_long_info.amounts.copy()
+    root.fork().process_redemption(100_000)
+    np.testing.assert_array_equal(right.virtual_account.stock_long_info.amounts, amounts)
+
+
+def test_compact_account_serializes_like_list_account():
+    """列式账户序列化结果与 list 账户一致"""
+    list_account = VirtualAccount()
+    compact_account = VirtualAccount().use_compact_positions()
+    for account in (list_account, compact_account):
+        account.add_stock_position("000001.SZ", 100, 10.0)
+        account.add_stock_position("000001.SZ", 100, 12.0)
+
+    assert compact_account.model_dump() == list_account.model_dump()
+    assert len(list_account.stock_long_info) == 1
+
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_tree_valuation_matches_between_backends(compact: bool):
+    """两种存储方式的持仓估值一致"""
+    leaf = StrategyTree(fund_id=1, weight=1.0, name="leaf")
+    if compact:
+        leaf.use_compact_positions()
+
+    leaf.virtual_account.cash_info.pending_purchase_amount = 1_000_000
+    leaf.build_positions_from_pending({"leaf": {"000001.SZ": 0.4, "600519.SH": 0.6}})
+
+    assert leaf._calculate_total_position_value() == pytest.approx(1_000_000)
+    assert leaf._calculate_current_allocations() == pytest.approx(
+        {"000001.SZ": 0.4, "600519.SH": 0.6}
+    )
@@ -0,0 +1,45 @@
+"""
+节点持仓行测试
+"""
+
+import numpy as np
+import pytest
+
+from src.database.positions import account_position_rows, attach_positions, diff_position_rows
+from src.database.tree_link import link_strategy_nodes
+from src.entity.strategy import VirtualAccount
+
+
+def test_account_rows_carry_value_and_weight():
+    """持仓行带成本、市值和占节点股票市值的权重"""
+    account = VirtualAccount()
+    account.add_stock_position("A", 100, 10.0)
+    account.add_stock_position("B", 300, 5.0)
+
+    rows = account_position_rows(account, np.array([12.0, 4.0]))
+
+    assert rows["A"]["cost_price"] == 10.0
+    assert rows["A"]["market_value"] == 1200.0
+    assert rows["A"]["weight_in_node"] == pytest.approx(0.5)
+    assert rows["B"]["quantity"] == 300
+
+
+def test_diff_and_attach_positions():
+    """增量只含变化和清仓的代码；持仓行填回对应节点"""
+    previous = {"A": {"quantity": 100}, "B": {"quantity": 300}}
+    current = {"A": {"quantity": 100}, "C": {"quantity": 50}}
+    assert diff_position_rows(previous, current) == ({"C": {"quantity": 50}}, ["B"])
+
+    root = link_strategy_nodes(
+        [
+            {"_id": 1, "fund_id": 7, "parent_id": None, "name": "root"},
+            {"_id": 2, "fund_id": 7, "parent_id": 1, "name": "a"},
+        ]
+    )
+    root.children[0].use_compact_positions()
+    attach_positions(root, [{"node_id": 2, "symbol": "A", "quantity": 100, "cost_price": 9.0}])
+
+    account = root.children[0].virtual_account
+    assert account.is_compact
+    assert account.get_stock_amount("A") == 100
+    assert root.virtual_account.stock_long_info == []
@@ -0,0 +1,89 @@
+"""
+价格来源与报价缓存测试
+"""
+
+import numpy as np
+import pytest
+
+from src.core.price import (
+    CachedPriceProvider,
+    FilePriceProvider,
+    PriceProvider,
+    QuoteCache,
+    StaticPriceProvider,
+)
+from src.entity.strategy import StrategyTree
+
+
+class CountingProvider(PriceProvider):
+    """记录批量请求次数的价格来源"""
+
+    def __init__(self) -> None:
+        self.calls: list[list[str]] = []
+
+    def get_prices(self, codes, timestamp=None) -> np.ndarray:  # noqa: ARG002
+        self.calls.append(list(codes))
+        return np.arange(1, len(codes) + 1, dtype=np.float64)
+
+
+def test_static_provider_default_price():
+    """未知代码返回默认价格"""
+    provider = StaticPriceProvider({"000001.SZ": 15.2}, default_price=50.0)
+
+    assert provider.get_prices(["000001.SZ", "UNKNOWN"]).tolist() == [15.2, 50.0]
+
+
+def test_cached_provider_fetches_only_misses():
+    """缓存命中不再请求，未命中合并为一次批量请求"""
+    source = CountingProvider()
+    provider = CachedPriceProvider(source)
+
+    provider.get_prices(["a", "b"], "2025-07-28 10:00:00")
+    provider.get_prices(["a", "b", "c"], "2025-07-28 10:00:00")
+    provider.get_prices(["a"], "2025-07-28 10:01:00")
+
+    assert source.calls == [["a", "b"], ["c"], ["a"]]
+
+
+def test_quote_cache_ttl_and_lru_eviction():
+    """过期条目与超出容量的最久未用条目被淘汰"""
+    now = [0.0]
+    cache = QuoteCache(maxsize=2, ttl=10, clock=lambda: now[0])
+    cache.put_many(["a", "b"], None, np.array([1.0, 2.0]))
+
+    cache.get_many(["a"], None)
+    cache.put_many(["c"], None, np.array([3.0]))
+    _, missing = cache.get_many(["a", "b", "c"], None)
+    assert missing == [1]
+
+    now[0] = 11
+    _, missing = cache.get_many(["a", "c"], None)
+    assert missing == [0, 1]
+    assert len(cache) == 0
+
+
+def test_file_provider_replays_latest_snapshot(tmp_path):
+    """按时间回放不晚于请求时间的最近快照"""
+    path = tmp_path / "snapshots.csv"
+    path.write_text(
+        "stock_code,timestamp,price\n"
+        "000001.SZ,2025-07-28 10:00:00,15.0\n"
+        "600519.SH,2025-07-28 10:00:00,1500.0\n"
+        "000001.SZ,2025-07-28 10:05:00,15.5\n"
+    )
+    provider = FilePriceProvider(path)
+
+    assert provider.get_prices(["000001.SZ"], "2025-07-28 10:03:00").tolist() == [15.0]
+    assert provider.get_prices(["000001.SZ"], "2025-07-28 10:05:00").tolist() == [15.5]
+    assert provider.get_price("000001.SZ") == 15.5
+    assert provider.get_price("000001.SZ", "2025-07-28 09:00:00") == provider.default_price
+
+
+def test_tree_uses_configured_provider():
+    """策略树估值使用设置的价格来源"""
+    leaf = StrategyTree(fund_id=1, weight=1.0, name="leaf")
+    leaf.virtual_account.add_stock_position("000001.SZ", 100, 15.2)
+
+    leaf.use_price_provider(StaticPriceProvider({"000001.SZ": 20.0}))
+
+    assert leaf._calculate_total_position_value() == pytest.approx(2000.0)
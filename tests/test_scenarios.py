@@ -0,0 +1,96 @@
+"""
+多情景并行模拟测试
+"""
+
+import numpy as np
+import polars as pl
+import pytest
+
+from src.core.backtest import ParquetAlphaSource
+from src.core.scenarios import PanelPriceProvider, ScenarioRunner, scenario_grid
+from src.core.trading_calendar import TradingCalendar
+from src.entity.strategy import StrategyTree
+
+DAYS = ["2025-07-28", "2025-07-29", "2025-07-30"]
+
+
+def build_tree() -> StrategyTree:
+    """root -> (alpha_a, alpha_b)，不含初始资金"""
+    return StrategyTree(
+        fund_id=3,
+        weight=1.0,
+        name="root",
+        children=[
+            StrategyTree(fund_id=1, weight=0.5, name="alpha_a", strategy_info={"model": "a"}),
+            StrategyTree(fund_id=2, weight=0.5, name="alpha_b", strategy_info={"model": "b"}),
+        ],
+    )
+
+
+@pytest.fixture
+def runner_inputs(tmp_path):
+    """A 每天上涨 10%，B 不变；模型 a 持有 A，模型 b 持有 B"""
+    alpha = pl.DataFrame(
+        {
+            "model": ["a", "b"] * len(DAYS),
+            "trade_date": [day for day in DAYS for _ in range(2)],
+            "code": ["A", "B"] * len(DAYS),
+            "alpha": [1.0] * 2 * len(DAYS),
+        }
+    )
+    alpha.write_parquet(tmp_path / "alpha.parquet")
+    prices = PanelPriceProvider(DAYS, ["A", "B"], np.array([[10.0, 5.0], [11.0, 5.0], [12.1, 5.0]]))
+    return build_tree(), ParquetAlphaSource(tmp_path / "alpha.parquet"), prices
+
+
+def test_panel_prices_use_latest_row_and_default():
+    """按日期取不晚于该日的最近一行，未知代码返回默认价格"""
+    panel = PanelPriceProvider(DAYS[:2], ["A"], np.array([[1.0], [2.0]]), default_price=9.0)
+
+    assert panel.get_prices(["A", "X"], "2025-07-30 15:00:00").tolist() == [2.0, 9.0]
+    assert panel.get_prices(["A"], "2025-07-28 15:00:00").tolist() == [1.0]
+    assert panel.get_prices(["A"], "2025-07-01 15:00:00").tolist() == [9.0]
+
+
+def test_process_pool_matches_sequential_run(runner_inputs):
+    """进程池与顺序运行结果一致；权重变体和成交参数都反映在净值中"""
+    tree, alpha, prices = runner_inputs
+    scenarios = scenario_grid(
+        [1.0, 0.5], [0.0], {"base": {}, "tilt_a": {"alpha_a": 0.8, "alpha_b": 0.2}}
+    )
+    options = {"calendar": TradingCalendar(), "initial_capital": 1_000_000, "hedge": False}
+
+    sequential = ScenarioRunner(tree, alpha, prices, max_workers=1, **options).run(
+        scenarios, DAYS[0], DAYS[-1]
+    )
+    parallel = ScenarioRunner(tree, alpha, prices, max_workers=2, **options).run(
+        scenarios, DAYS[0], DAYS[-1]
+    )
+
+    assert parallel.dates == DAYS
+    assert parallel.nav.shape == (len(DAYS), len(scenarios))
+    np.testing.assert_allclose(parallel.nav, sequential.nav)
+    frame = parallel.to_frame()
+    assert frame.columns == ["trade_date", *parallel.names]
+    # 全部成交时 A 半仓两天涨 21%；加大 A 的权重后收益更高
+    assert frame["base|exec=1.0|slip=0.0"][-1] == pytest.approx(1_000_000 * (0.5 * 1.21 + 0.5))
+    assert frame["tilt_a|exec=1.0|slip=0.0"][-1] == pytest.approx(1_000_000 * (0.8 * 1.21 + 0.2))
+    assert frame["base|exec=0.5|slip=0.0"][-1] < frame["base|exec=1.0|slip=0.0"][-1]
+
+
+def test_empty_scenario_list_returns_empty_result(runner_inputs):
+    """没有情景时不启动进程池，返回 交易日 × 0 的结果"""
+    tree, alpha, prices = runner_inputs
+
+    result = ScenarioRunner(tree, alpha, prices, TradingCalendar()).run([], DAYS[0], DAYS[-1])
+
+    assert result.dates == DAYS
+    assert result.nav.shape == result.turnover.shape == (len(DAYS), 0)
+
+
+def test_checkpoint_options_rejected(runner_inputs, tmp_path):
+    """各情景会并发写同一个检查点文件，检查点参数直接报错"""
+    tree, alpha, prices = runner_inputs
+
+    with pytest.raises(ValueError, match="checkpoint_path"):
+        ScenarioRunner(tree, alpha, prices, checkpoint_path=tmp_path / "checkpoint.json")
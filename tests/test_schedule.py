@@ -0,0 +1,66 @@
+"""
+拆单调度测试
+"""
+
+import numpy as np
+import pytest
+
+from src.core.execution import ExecutionSimulator, FixedRateFillModel
+from src.core.schedule import ExecutionScheduler, SliceCurveEnum
+from src.entity.strategy import TradingSystem
+from src.entity.trade import TradeDirection, TradeOrder
+
+
+def make_order(direction: TradeDirection, shares: float = 1200) -> TradeOrder:
+    return TradeOrder(
+        strategy_name="s",
+        stock_code="000001.SZ",
+        direction=direction,
+        target_shares=shares,
+        target_value=shares * 10.0,
+        price=10.0,
+    )
+
+
+def test_twap_slices_skip_lunch_break_and_vwap_weights_close():
+    """时间片跨午休连续编号；VWAP 在尾盘分配更多"""
+    orders = [make_order(TradeDirection.BUY)]
+
+    twap = ExecutionScheduler(slice_minutes=30).schedule(orders, start_times="11:00:00")
+    vwap = ExecutionScheduler(slice_minutes=30, curve=SliceCurveEnum.VWAP).schedule(orders)
+
+    assert twap.slice_times == ["11:00:00", "13:00:00", "13:30:00", "14:00:00", "14:30:00"]
+    assert twap.slice_shares.sum() == pytest.approx(1200)
+    assert twap.weights[0, 0] == pytest.approx(30 / 147)
+    assert vwap.weights[0, -1] > vwap.weights[0, 3]
+
+
+def test_replay_carries_unfilled_shares_and_updates_parents():
+    """回放按时间撮合，未成交部分顺延，母单累计成交"""
+    system = TradingSystem(
+        execution_simulator=ExecutionSimulator(FixedRateFillModel(0.5, slippage_rate=0.0))
+    )
+    buy, sell = make_order(TradeDirection.BUY), make_order(TradeDirection.SELL)
+    scheduler = ExecutionScheduler(slice_minutes=60)
+    schedule = scheduler.schedule(
+        [buy, sell], start_times=["09:30:00", "13:00:00"], end_time="14:00:00"
+    )
+
+    replay = scheduler.replay(schedule, system, available_cash=1e9)
+
+    # 3 个时间片，买单每片 400 股并顺延上一片的未成交余量；卖单只在 13:00 后的一片
+    assert replay.filled_shares == pytest.approx(np.array([[200, 300, 350], [0, 0, 600]]))
+    assert buy.executed_shares == pytest.approx(850)
+    assert sell.executed_shares == pytest.approx(600)
+    assert replay.remaining_cash == pytest.approx(1e9 - 10 * 850 + 10 * 600)
+    assert np.all(replay.filled_value == replay.filled_shares * 10.0)
+
+
+def test_orders_starting_after_last_slice_rejected():
+    """开始时间之后没有时间片的母单报错，而不是得到全零的拆分比例"""
+    orders = [make_order(TradeDirection.BUY), make_order(TradeDirection.SELL)]
+
+    with pytest.raises(ValueError, match="000001.SZ"):
+        ExecutionScheduler(slice_minutes=60).schedule(
+            orders, start_times=["09:30:00", "13:30:00"], end_time="14:00:00"
+        )
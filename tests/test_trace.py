@@ -0,0 +1,48 @@
+"""
+结构化追踪测试
+"""
+
+import io
+import json
+
+from src.core.trace import ConsoleRenderer, FileSink, RingBufferSink, Tracer, tracer
+from src.entity.strategy import StrategyTree
+
+
+def build_fund() -> StrategyTree:
+    leaf_a = StrategyTree(fund_id=1, weight=0.5, name="a")
+    leaf_b = StrategyTree(fund_id=2, weight=0.5, name="b")
+    return StrategyTree(fund_id=3, weight=1.0, name="root", children=[leaf_a, leaf_b])
+
+
+def test_tree_operations_emit_structured_records():
+    """树操作产生结构化记录，控制台渲染器按模板还原文本"""
+    buffer = tracer.add_sink(RingBufferSink(capacity=100))
+    stream = io.StringIO()
+    renderer = tracer.add_sink(ConsoleRenderer(stream))
+    try:
+        build_fund().process_subscription(1_000_000)
+    finally:
+        tracer.remove_sink(buffer)
+        tracer.remove_sink(renderer)
+
+    (record,) = buffer.events("subscription.allocated")
+    assert record.fields == {"name": "root", "amount": 1_000_000}
+    assert stream.getvalue() == "申购 1,000,000.00 元到 root，已分配到各策略（包括期货）\n"
+    assert not tracer.enabled
+
+
+def test_sampling_and_file_sink(tmp_path):
+    """按 sink 采样，文件 sink 写入 JSON Lines"""
+    local = Tracer(seed=0)
+    sampled = local.add_sink(RingBufferSink(sample_rate=0.1))
+    local.add_sink(FileSink(tmp_path / "trace.jsonl"))
+
+    for i in range(1000):
+        local.emit("tick", "第{i}次", i=i)
+    local.clear()
+
+    assert 50 < len(sampled.records) < 150
+    lines = (tmp_path / "trace.jsonl").read_text(encoding="utf-8").splitlines()
+    assert len(lines) == 1000
+    assert json.loads(lines[-1])["i"] == 999
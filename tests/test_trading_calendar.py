@@ -0,0 +1,56 @@
+"""
+交易日历测试
+"""
+
+import numpy as np
+
+from src.core.trading_calendar import (
+    TradingCalendar,
+    add_minutes,
+    clip_times,
+    diff_minutes,
+    format_times,
+    minute_index,
+    parse_times,
+    trade_time_add,
+)
+
+
+def test_vectorized_minute_arithmetic_across_lunch_and_cutoff():
+    """加减跨午休，14:57 截止，午休和开盘前按下一个可交易时刻"""
+    times = parse_times(["09:00:00", "11:00:20", "12:10:00", "14:30:00"])
+
+    assert minute_index(times).tolist() == [0, 90, 120, 210]
+    assert format_times(add_minutes(times, [10, 45, 5, 60])) == [
+        "09:40:00",
+        "13:15:20",
+        "13:05:00",
+        "14:57:00",
+    ]
+    assert format_times(add_minutes(parse_times("13:10:00"), -20)) == ["11:20:00"]
+    assert diff_minutes(parse_times("11:00:00"), times[3:]).tolist() == [120.0]
+    assert format_times(clip_times(times, "10:00:00", "14:00:00")) == [
+        "10:00:00",
+        "11:00:20",
+        "13:00:00",
+        "14:00:00",
+    ]
+
+
+def test_holidays_loaded_from_file(tmp_path):
+    """节假日文件中的日期不是交易日，偏移和计数跳过节假日与周末"""
+    path = tmp_path / "holidays.txt"
+    path.write_text("2024-10-01\n2024-10-02\n", encoding="utf-8")
+    calendar = TradingCalendar.from_file(path)
+
+    days = calendar.trading_days("2024-09-28", "2024-10-04")
+
+    assert days.astype(str).tolist() == ["2024-09-30", "2024-10-03", "2024-10-04"]
+    assert calendar.offset_days("2024-09-30", 1) == np.datetime64("2024-10-03")
+    assert calendar.count_days("2024-09-30", "2024-10-07") == 3
+
+
+def test_scalar_trade_time_add():
+    """单个时间的加法与批量结果一致，跨午休从 13:00 起算"""
+    assert trade_time_add("11:20:00", 10) == "13:00:00"
+    assert trade_time_add("14:50:00", 30) == "14:57:00"
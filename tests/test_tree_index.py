@@ -0,0 +1,93 @@
+"""
+策略树扁平索引测试
+"""
+
+import pytest
+
+from src.core.hedging import HedgeSolver
+from src.core.price import StaticPriceProvider
+from src.entity.strategy import StrategyTree
+
+
+def build_tree() -> StrategyTree:
+    """root -> (hedge -> (group -> (a, b), futures), c)"""
+    leaf_a = StrategyTree(fund_id=1, weight=0.5, name="a")
+    leaf_b = StrategyTree(fund_id=2, weight=0.5, name="b")
+    futures = StrategyTree(
+        fund_id=3, weight=0.1, name="futures", strategy_info={"strategy_type": "期货对冲"}
+    )
+    group = StrategyTree(fund_id=4, weight=0.9, name="group", children=[leaf_a, leaf_b])
+    hedge = StrategyTree(
+        fund_id=5,
+        weight=0.6,
+        name="hedge",
+        children=[group, futures],
+        strategy_info={"target_exposure": 0},
+    )
+    leaf_c = StrategyTree(fund_id=6, weight=0.4, name="c")
+    root = StrategyTree(fund_id=7, weight=1.0, name="root", children=[hedge, leaf_c])
+
+    leaf_a.virtual_account.add_stock_position("000001.SZ", 1000, 10.0)
+    leaf_b.virtual_account.add_stock_position("000001.SZ", 500, 10.0)
+    leaf_c.virtual_account.add_stock_position("000001.SZ", 9999, 10.0)
+    return root.use_price_provider(StaticPriceProvider({"000001.SZ": 10.0}))
+
+
+def test_index_layout_and_lookups():
+    """父节点、深度、叶子、后序与名称映射"""
+    root = build_tree()
+    index = root.tree_index
+    leaf_b = index.by_name["b"]
+
+    assert " ".join(node.name for node in index.nodes) == "root hedge group a b futures c"
+    assert index.depth.tolist() == [0, 1, 2, 3, 3, 2, 1]
+    assert [node.name for node in index.ancestors(leaf_b)] == ["group", "hedge", "root"]
+    assert [node.name for node in index.leaves(index.by_name["hedge"])] == ["a", "b", "futures"]
+    assert " ".join(node.name for node in index.postorder()) == "a b group futures hedge c root"
+    assert index.by_fund_id[2] is leaf_b
+    assert leaf_b.tree_index is index
+
+
+def test_hedge_group_found_through_index():
+    """期货叶子通过索引找到对冲组合的目标敞口和股票市值"""
+    root = build_tree()
+
+    plan = HedgeSolver(round_lots=False).solve(root)
+
+    (group_row,) = plan.group_rows.tolist()
+    assert root.tree_index.nodes[group_row].name == "hedge"
+    assert plan.group_target_exposure.tolist() == [0.0]
+    assert plan.group_stock_value.tolist() == pytest.approx([1500 * 10.0])
+
+
+def test_structure_change_rebuilds_index():
+    """增删子节点后索引重建"""
+    root = build_tree()
+    old_index = root.tree_index
+    extra = StrategyTree(fund_id=8, weight=0.0, name="extra")
+
+    root.add_child(extra)
+
+    assert root.tree_index is not old_index
+    assert root.tree_index.parent_of(extra) is root
+
+
+def test_index_stays_consistent_with_structure():
+    """先访问子树、整体替换子节点、复制节点时索引都以当前整棵树为准"""
+    root = build_tree()
+    group = root.children[0].children[0]
+    # 先在子树上访问，也以根节点构建
+    assert group.tree_index.root is root
+    assert [node.name for node in group.tree_index.ancestors(group)] == ["hedge", "root"]
+
+    leaf_c = root.children[1]
+    root.children = [leaf_c]
+    assert " ".join(node.name for node in root.tree_index.nodes) == "root c"
+    # 被移走的子树自成一棵树
+    assert group.tree_index.root.name == "hedge"
+
+    copy = leaf_c.model_copy()
+    assert copy.tree_index.root is copy
+    assert leaf_c.tree_index.parent_of(leaf_c) is root
+    deep = root.model_copy(deep=True)
+    assert deep.children[0].tree_index.root is deep
@@ -0,0 +1,60 @@
+"""
+策略节点行链接测试
+"""
+
+import pytest
+
+from src.database.tree_link import link_strategy_nodes, materialize_ancestors
+
+
+def build_rows() -> list[dict]:
+    """root(1) -> (a(2) -> c(4), b(3))，行顺序打乱"""
+    return [
+        {"_id": 4, "fund_id": 7, "parent_id": 2, "ancestors": [1, 2], "depth": 2, "name": "c"},
+        {"_id": 3, "fund_id": 7, "parent_id": 1, "ancestors": [1], "depth": 1, "name": "b"},
+        {"_id": 1, "fund_id": 7, "parent_id": None, "name": "root", "info": None},
+        {
+            "_id": 2,
+            "fund_id": 7,
+            "parent_id": 1,
+            "ancestors": [1],
+            "depth": 1,
+            "weight": 0.6,
+            "name": "a",
+            "info": {"model": "mars_v8"},
+            "virtual_account": {"cash_info": {"available_cash": 100.0}},
+        },
+    ]
+
+
+def test_link_builds_tree_in_insertion_order():
+    """按 parent_id 链接，子节点按 _id 排序，节点记录数据库id"""
+    root = link_strategy_nodes(build_rows())
+
+    assert root.name == "root"
+    assert [child.name for child in root.children] == ["a", "b"]
+    a = root.children[0]
+    assert [child.name for child in a.children] == ["c"]
+    assert a.weight == 0.6
+    assert a.strategy_info == {"model": "mars_v8"}
+    assert a.virtual_account.cash_info.available_cash == 100.0
+    assert a.node_id == 2
+    assert root.tree_index.by_name["c"].node_id == 4
+
+
+def test_link_subtree_and_reject_multiple_roots():
+    """指定子树根节点时只返回该子树；多个根节点报错"""
+    rows = build_rows()
+    subtree = link_strategy_nodes([row for row in rows if row["_id"] in {2, 4}], root_id=2)
+    assert subtree.name == "a"
+    assert [child.name for child in subtree.children] == ["c"]
+
+    with pytest.raises(ValueError, match="根节点"):
+        link_strategy_nodes([row for row in rows if row["_id"] != 1])
+
+
+def test_materialize_ancestors_from_parent_ids():
+    """由 parent_id 回填祖先路径"""
+    rows = [{**row, "ancestors": None} for row in build_rows()]
+
+    assert materialize_ancestors(rows) == {4: [1, 2], 3: [1], 1: [], 2: [1]}
@@ -0,0 +1,194 @@
+"""
+策略树批量写入测试
+"""
+
+import asyncio
+import itertools
+from datetime import datetime
+
+import pytest
+
+from src.core.price import StaticPriceProvider
+from src.database.tree_link import link_strategy_nodes
+from src.database.unit_of_work import StrategyUnitOfWork
+from src.entity.strategy import StrategyTree
+
+NOW = datetime(2025, 7, 28, 15)
+
+
+def test_new_tree_collected_as_inserts_with_ancestors():
+    """新树全部新增，先序分配id，父节点和祖先路径正确，时间戳为同一批次"""
+    root = StrategyTree(
+        fund_id=75,
+        weight=1,
+        name="root",
+        children=[
+            StrategyTree(
+                fund_id=75,
+                weight=0.5,
+                name="a",
+                children=[StrategyTree(fund_id=75, weight=1, name="c")],
+            ),
+            StrategyTree(fund_id=75, weight=0.5, name="b"),
+        ],
+    )
+    work = StrategyUnitOfWork(root, id_factory=itertools.count(1).__next__)
+
+    inserts, updates, deletes = work.collect(NOW)
+    work.commit(inserts, updates, deletes)
+
+    assert updates == deletes == []
+    assert [(doc["_id"], doc["name"], doc["parent_id"]) for doc in inserts] == [
+        (1, "root", None),
+        (2, "a", 1),
+        (3, "c", 2),
+        (4, "b", 1),
+    ]
+    assert inserts[2]["ancestors"] == [1, 2]
+    assert inserts[2]["depth"] == 2
+    assert {doc["created_at"] for doc in inserts} == {NOW}
+    assert not any("." in key for doc in inserts for key in doc)
+    assert work.collect(NOW) == ([], [], [])
+
+
+def test_only_changed_fields_are_set():
+    """加载的树只提交变化的字段，虚拟账户细到子字段；提交后快照更新"""
+    root = link_strategy_nodes(
+        [
+            {"_id": 1, "fund_id": 7, "parent_id": None, "name": "root"},
+            {"_id": 2, "fund_id": 7, "parent_id": 1, "weight": 0.5, "name": "a"},
+            {"_id": 3, "fund_id": 7, "parent_id": 1, "weight": 0.5, "name": "b"},
+        ]
+    )
+    work = StrategyUnitOfWork(root)
+    a, b = root.children
+    a.weight = 0.7
+    b.weight = 0.3
+    b.virtual_account.cash_info.available_cash = 100.0
+
+    inserts, updates, deletes = work.collect(NOW)
+
+    assert inserts == []
+    assert updates[0] == (2, {"weight": 0.7, "updated_at": NOW})
+    node_id, fields = updates[1]
+    assert node_id == 3
+    assert set(fields) == {"weight", "virtual_account.cash_info", "updated_at"}
+    assert deletes == []
+    assert fields["virtual_account.cash_info"]["available_cash"] == 100.0
+
+    work.commit(inserts, updates, deletes)
+    assert work.collect(NOW) == ([], [], [])
+
+
+def test_positions_written_as_incremental_rows():
+    """指定交易日时持仓不进节点文档，只写变化的持仓行；换日后全部重写"""
+    root = link_strategy_nodes(
+        [
+            {"_id": 1, "fund_id": 7, "parent_id": None, "name": "root"},
+            {"_id": 2, "fund_id": 7, "parent_id": 1, "name": "a"},
+        ]
+    )
+    root.use_price_provider(StaticPriceProvider({"A": 10.0, "B": 20.0}))
+    leaf = root.children[0]
+    leaf.virtual_account.add_stock_position("A", 100, 9.0)
+    work = StrategyUnitOfWork(root, trading_day="2025-07-28")
+
+    leaf.virtual_account.add_stock_position("B", 50, 20.0)
+    leaf.virtual_account.reduce_stock_position("A", 100)
+    inserts, updates, removed = work.collect(NOW)
+    upserts, deletes = work.collect_positions(NOW)
+    work.commit(inserts, updates, removed)
+    work.commit_positions()
+
+    assert updates == []
+    key = {"node_id": 2, "trading_day": "2025-07-28", "position_type": "ACTUAL"}
+    assert [position_key for position_key, _ in upserts] == [{**key, "symbol": "B"}]
+    assert upserts[0][1]["market_value"] == 1000.0
+    assert deletes == [{**key, "symbol": "A"}]
+    assert work.collect_positions(NOW) == ([], [])
+
+    work.set_trading_day("2025-07-29")
+    upserts, _ = work.collect_positions(NOW)
+    assert [position_key["trading_day"] for position_key, _ in upserts] == ["2025-07-29"]
+
+
+def test_moved_and_removed_nodes():
+    """移动节点更新父节点和祖先路径，子树随之更新；移除的节点提交为删除且不再跟踪"""
+    root = link_strategy_nodes(
+        [
+            {"_id": 1, "fund_id": 7, "parent_id": None, "name": "root"},
+            {"_id": 2, "fund_id": 7, "parent_id": 1, "name": "a"},
+            {"_id": 3, "fund_id": 7, "parent_id": 1, "name": "b"},
+            {"_id": 4, "fund_id": 7, "parent_id": 3, "name": "c"},
+            {"_id": 5, "fund_id": 7, "parent_id": 1, "name": "d"},
+        ]
+    )
+    work = StrategyUnitOfWork(root)
+    a, b, d = root.children
+    root.remove_child(b)
+    root.remove_child(d)
+    a.add_child(b)
+
+    inserts, updates, deletes = work.collect(NOW)
+
+    assert inserts == []
+    assert [node_id for node_id, _ in updates] == [3, 4]
+    assert updates[0][1] == {"parent_id": 2, "ancestors": [1, 2], "depth": 2, "updated_at": NOW}
+    assert updates[1][1] == {"ancestors": [1, 2, 3], "depth": 3, "updated_at": NOW}
+    assert deletes == [5]
+
+    work.commit(inserts, updates, deletes)
+    assert work.collect(NOW) == ([], [], [])
+
+
+def test_unconfirmed_inserts_are_retried():
+    """写入失败未提交时，新增节点在下次收集时仍是同一id的新增文档"""
+    root = StrategyTree(fund_id=7, weight=1, name="root")
+    work = StrategyUnitOfWork(root, id_factory=itertools.count(1).__next__)
+
+    first, _, _ = work.collect(NOW)
+    retried, _, _ = work.collect(NOW)
+
+    assert [doc["_id"] for doc in first] == [doc["_id"] for doc in retried] == [1]
+
+
+class FakeCollection:
+    """记录 bulk_write 收到的请求"""
+
+    def __init__(self) -> None:
+        self.requests: list = []
+
+    async def bulk_write(self, requests: list, ordered: bool = True) -> None:
+        assert not ordered
+        self.requests.extend(requests)
+
+
+def assert_no_path_conflict(paths) -> None:
+    paths = sorted(paths)
+    for path, other in zip(paths, paths[1:], strict=False):
+        assert not other.startswith(f"{path}."), f"{path} 与 {other} 冲突"
+
+
+def test_flush_builds_conflict_free_requests():
+    """flush 生成的写入请求：新增节点按 _id upsert，任一 $set 中没有互为前缀的路径"""
+    pytest.importorskip("pymongo")
+    root = StrategyTree(
+        fund_id=75, weight=1, name="root", children=[StrategyTree(fund_id=75, name="a")]
+    )
+    work = StrategyUnitOfWork(root, id_factory=itertools.count(1).__next__)
+    nodes, positions = FakeCollection(), FakeCollection()
+
+    assert asyncio.run(work.flush(nodes, positions)) == 2
+    assert [request._filter for request in nodes.requests] == [{"_id": 1}, {"_id": 2}]
+    for request in nodes.requests:
+        assert request._upsert
+        assert_no_path_conflict(request._doc["$set"])
+        assert set(request._doc["$setOnInsert"]) == {"created_at"}
+    assert positions.requests == []
+
+    root.children[0].virtual_account.cash_info.available_cash = 100.0
+    asyncio.run(work.flush(nodes, positions))
+    update = nodes.requests[-1]
+    assert update._filter == {"_id": 2}
+    assert not update._upsert
+    assert_no_path_conflict(update._doc["$set"])
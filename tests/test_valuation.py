@@ -0,0 +1,66 @@
+"""
+整树估值引擎测试
+"""
+
+import numpy as np
+import pytest
+
+from src.core.valuation import ValuationEngine
+from src.entity.strategy import FuturesPositionInfo, StrategyTree
+
+
+def build_tree() -> StrategyTree:
+    """root -> (group -> (a, b), c)"""
+    leaf_a = StrategyTree(fund_id=1, weight=0.5, name="a")
+    leaf_b = StrategyTree(fund_id=2, weight=0.5, name="b").use_compact_positions()
+    leaf_c = StrategyTree(
+        fund_id=3, weight=0.4, name="c", strategy_info={"strategy_type": "期货对冲"}
+    )
+    group = StrategyTree(fund_id=4, weight=0.6, name="group", children=[leaf_a, leaf_b])
+    root = StrategyTree(fund_id=5, weight=1.0, name="root", children=[group, leaf_c])
+
+    leaf_a.virtual_account.add_stock_position("000001.SZ", 1000, 15.2)
+    leaf_a.virtual_account.cash_info.available_cash = 100
+    leaf_b.virtual_account.add_stock_position("000001.SZ", 500, 15.2)
+    leaf_b.virtual_account.add_stock_position("600519.SH", 10, 1580.0)
+    leaf_b.virtual_account.cash_info.pending_purchase_amount = 50
+    leaf_c.virtual_account.cash_info.available_cash = 1_000_000
+    leaf_c.virtual_account.futures_short_info.append(
+        FuturesPositionInfo(futures_code="IC", futures_amount=2, futures_cost=4000)
+    )
+    return root
+
+
+def test_flatten_preorder_and_subtree_ranges():
+    """先序展开与子树区间"""
+    engine = ValuationEngine(build_tree())
+
+    assert [node.name for node in engine.nodes] == ["root", "group", "a", "b", "c"]
+    assert engine.parent.tolist() == [-1, 0, 1, 1, 0]
+    assert engine.subtree_end.tolist() == [5, 4, 3, 4, 5]
+
+
+def test_valuation_rolls_up_leaf_totals():
+    """子树汇总与逐节点计算一致"""
+    root = build_tree()
+    valuation = ValuationEngine(root).valuate()
+
+    expected_stock = 1500 * 15.2 + 10 * 1580.0
+    assert valuation.stock_value[0] == pytest.approx(expected_stock)
+    assert valuation.available_cash[0] == pytest.approx(1_000_100)
+    assert valuation.pending_amount[0] == pytest.approx(50)
+    assert valuation.futures_margin[0] == pytest.approx(2 * 4000 * 300 * 0.12)
+    assert valuation.stock_value[1] == pytest.approx(expected_stock)
+
+    leaf_b = root.children[0].children[1]
+    assert valuation.summary(leaf_b) == pytest.approx(leaf_b.get_account_summary())
+
+
+def test_valuation_with_price_vector():
+    """价格变化只需传入新的价格向量"""
+    engine = ValuationEngine(build_tree())
+    prices = np.array([20.0 if code == "000001.SZ" else 1600.0 for code in engine.codes])
+
+    valuation = engine.valuate(prices)
+
+    assert valuation.stock_value[0] == pytest.approx(1500 * 20.0 + 10 * 1600.0)